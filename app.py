@@ -1,8 +1,8 @@
-"""app.py – Kai Streamlit UI with JSON conversation logging + auto‑push
+"""app.py – Kai Streamlit UI with JSONL conversation logging + auto‑push
 -----------------------------------------------------------------------------
-* 1‑day‑per‑file JSON logs (conversations/conversation_YYYYMMDD.json)
-* After each user↔assistant exchange, the updated log file is git‑add / commit / push
-  via core.git_ops.commit_and_push_log().
+* 1‑day‑per‑file append‑only JSONL logs (conversations/conversation_YYYYMMDD.jsonl)
+* After each user↔assistant exchange, the updated log file is queued for a
+  batched background git‑add / commit / push via core.git_ops.commit_and_push_log().
 """
 from __future__ import annotations
 
@@ -10,19 +10,20 @@ import json
 import os
 import sys
 import traceback
-from datetime import date, datetime
+from datetime import date
 from pathlib import Path
 from textwrap import dedent
-from zoneinfo import ZoneInfo
 import yaml, pandas as pd
 import streamlit as st
 
 # ────────────────────────────────────────────────────────────────────────────
 # Kai modules
 # ────────────────────────────────────────────────────────────────────────────
-from core.git_ops import commit_and_push_log  # ← NEW: auto‑push helper
-from core.minutes_utils import generate_daily_minutes, safe_push_minutes
-from utils.render_minutes import render_md
+from core import conversation_log, llm_client, prompt_builder, search_index
+from core.git_ops import commit_and_push_log, log_commit_status  # ← NEW: auto‑push helper
+from core.history_window import HistoryWindow
+from core.minutes_utils import generate_daily_minutes, safe_push_minutes, minutes_path as minutes_file, MinutesDeltaError
+from utils.render_minutes import render_md, load_minutes, write_year_index
 
 # ────────────────────────────────────────────────────────────────────────────
 # Paths & basic setup
@@ -65,38 +66,28 @@ def get_openai_api_key():
 
 openai_api_key = get_openai_api_key()
 
-if not openai_api_key:
+if llm_client.backend_name() == "fake":
+    pass  # ローカルスタブ（KAI_LLM_BACKEND=fake）はキー不要
+elif not openai_api_key:
     # この場所だけはstreamlitで出す
     if st is not None:
         st.error("❌ OpenAI API キーが見つかりません。")
     else:
         raise RuntimeError("OpenAI APIキーが見つかりません。")
 else:
-    import openai
-    openai.api_key = openai_api_key
+    llm_client.configure(api_key=openai_api_key)
 
 # ────────────────────────────────────────────────────────────────────────────
-# Conversation‑log helpers (JSON, 1‑day‑per‑file)
+# Conversation‑log helpers (JSONL, 1‑day‑per‑file, append‑only)
 # ────────────────────────────────────────────────────────────────────────────
-_JST = ZoneInfo("Asia/Tokyo")
 
 def _today_log_path() -> Path:
     """Return Path for today's conversation log."""
-    today = datetime.now(_JST).strftime("%Y%m%d")
-    return CONV_DIR / f"conversation_{today}.json"
+    return conversation_log.log_path_for(conv_dir=CONV_DIR)
 
 def _append_log(role: str, content: str) -> None:
-    """Append a single message to today's JSON log."""
-    log_path = _today_log_path()
-    now_iso = datetime.now(_JST).isoformat(timespec="seconds")
-    if log_path.exists():
-        with log_path.open(encoding="utf-8") as fp:
-            data = json.load(fp)
-    else:
-        data = {"log_id": datetime.now(_JST).strftime("%Y%m%d"), "messages": []}
-    data["messages"].append({"role": role, "content": content, "ts": now_iso})
-    with log_path.open("w", encoding="utf-8") as fp:
-        json.dump(data, fp, ensure_ascii=False, indent=2)
+    """Append a single message to today's JSONL log (O(1) per turn)."""
+    conversation_log.append_message(role, content, path=_today_log_path())
 
 # ────────────────────────────────────────────────────────────────────────────
 # Small utils
@@ -121,23 +112,12 @@ def _extract_section(md_path: Path, headings: list[str]) -> str:
 # Prompt generator
 # ────────────────────────────────────────────────────────────────────────────
 
-def get_system_prompt() -> str:
-    rules = _read(DOCS / "base_os_rules.md")
-    dsl_readme_path = DSL_DIR / "README.md"
-    dsl_readme = dsl_readme_path.read_text(encoding="utf-8") if dsl_readme_path.exists() else ""
-    dsl_lines: list[str] = []
-    try:
-        for raw in (DSL_DIR / "integrated_dsl.jsonl").read_text(encoding="utf-8").splitlines():
-            item = json.loads(raw)
-            name, desc = item.get("name"), item.get("description")
-            if name and desc:
-                dsl_lines.append(f"- **{name}**: {desc}")
-    except FileNotFoundError:
-        pass
-    dsl_block = "\n".join([dsl_readme.strip()] + dsl_lines if dsl_readme else dsl_lines)
-    proj = _read(DOCS / "project_definition.md")
-    arch = _read(DOCS / "architecture_overview.md")
-    return "\n\n".join([rules, dsl_block, proj, arch])
+def get_system_prompt(query: str | None = None) -> str:
+    """System prompt (rules → DSL → project → architecture), cached per section by mtime/size.
+
+    With a query, only the doc sections / DSL entries relevant to it are included
+    (base_os_rules is always included in full)."""
+    return prompt_builder.get_system_prompt(query)
 
 # ────────────────────────────────────────────────────────────────────────────
 # Streamlit UI
@@ -147,6 +127,9 @@ st.title("Kai – Virtual Project Manager Chat")
 
 if "history" not in st.session_state:
     st.session_state["history"] = []
+if "history_window" not in st.session_state:
+    # 送信する履歴をトークン予算内に制限（KAI_HISTORY_TOKEN_BUDGET / KAI_HISTORY_MODE）
+    st.session_state["history_window"] = HistoryWindow()
 
 # 履歴表示（セッション全件を常時下スクロール表示）
 for msg in st.session_state["history"]:
@@ -159,25 +142,33 @@ if user_input:
     # 1) ログへ保存
     _append_log("user", user_input)
 
-    # 2) GPT へ問い合わせ
-    try:
-        system_prompt = get_system_prompt()
-        messages = [{"role": "system", "content": system_prompt}] + \
-                  st.session_state["history"] + \
-                  [{"role": "user", "content": user_input}]
-        response = openai.chat.completions.create(
-            model="gpt-4.1",
-            messages=messages,
-        )
-        assistant_reply = response.choices[0].message.content.strip()
-    except Exception as e:
-        st.error(f"❌ OpenAI 呼び出し失敗: {e}")
-        traceback.print_exc()
-        assistant_reply = "[ERROR]"
-
-    # 3) UI 表示
     st.chat_message("user").markdown(user_input)
-    st.chat_message("assistant").markdown(assistant_reply)
+
+    # 2) GPT へ問い合わせ（ストリーミング表示）
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        assistant_reply = ""
+        prompt_stats: dict = {}
+        try:
+            system_prompt = get_system_prompt(user_input)
+            messages, prompt_stats = st.session_state["history_window"].build_messages(
+                system_prompt, st.session_state["history"], user_input)
+            for delta in llm_client.stream_chat(messages, model="gpt-4.1"):
+                assistant_reply += delta
+                placeholder.markdown(assistant_reply + "▌")
+            assistant_reply = assistant_reply.strip()
+        except Exception as e:
+            st.error(f"❌ OpenAI 呼び出し失敗: {e}")
+            traceback.print_exc()
+            assistant_reply = assistant_reply or "[ERROR]"
+
+        # 3) UI 表示（確定版）
+        placeholder.markdown(assistant_reply)
+        if prompt_stats:
+            st.caption(f"prompt tokens: {prompt_stats['total_tokens']} "
+                       f"(system {prompt_stats['system_tokens']} / "
+                       f"history {prompt_stats['history_tokens']} [{prompt_stats['kept_messages']} msgs] / "
+                       f"user {prompt_stats['user_tokens']})")
 
     # 4) 履歴保存 & ログへ保存
     st.session_state["history"].extend([
@@ -186,9 +177,10 @@ if user_input:
     ])
     _append_log("assistant", assistant_reply)
 
-    # 5) Git push (conversation log only)
+    # 5) Git push (conversation log only) – バックグラウンドでバッチ commit / push
     try:
-        commit_and_push_log(_today_log_path())
+        conversation_log.flush(_today_log_path())
+        commit_and_push_log(_today_log_path(), messages=2)
     except Exception as e:
         st.warning(f"⚠️ Git push failed: {e}")
 
@@ -197,16 +189,47 @@ with st.sidebar:
     st.markdown("## 📑 議事録")
     sel_day = st.date_input("対象日を選択", value=date.today())
     if st.button("📝 minutes生成/再生成"):
-        minutes_path = generate_daily_minutes(sel_day, force=True)
-        st.success(f"minutes を再生成しました: {minutes_path.name}")
+        try:
+            minutes_path = generate_daily_minutes(sel_day, force=True)
+            st.success(f"minutes を再生成しました: {minutes_path.name}")
+        except MinutesDeltaError as e:
+            st.error(str(e))
+    if st.button("📚 年間インデックス生成"):
+        index_path = write_year_index(sel_day.year)
+        if index_path is None:
+            st.info(f"{sel_day.year} 年の議事録はまだありません")
+        else:
+            st.success(f"{sel_day.year} 年の議事録を {index_path.name} にまとめました")
+
+    st.markdown("## 🔍 過去の文脈を検索")
+    search_query = st.text_input("会話・議事録・docs を全文検索", key="search_query")
+    if search_query:
+        hits = search_index.search_context(search_query, limit=10)
+        if not hits:
+            st.caption("該当なし")
+        for hit in hits:
+            st.markdown(f"**{hit['title']}**  \n`{Path(hit['path']).name}` · {hit['source']}")
+            st.caption(hit["snippet"])
+
+    with st.expander("🔢 システムプロンプト内訳", expanded=False):
+        st.dataframe(pd.DataFrame(prompt_builder.section_stats())[["section", "chars", "tokens"]],
+                     hide_index=True, use_container_width=True)
+
+    st.markdown("## 🔄 Git 同期")
+    git_status = log_commit_status()
+    st.caption(f"未コミット: {git_status['queue_depth']} 件 / 最終 push: "
+               f"{git_status['last_push_at'] or '—'} "
+               f"({'OK' if git_status['last_push_ok'] else 'NG' if git_status['last_push_ok'] is False else '—'})")
+    if git_status["last_error"]:
+        st.warning(f"⚠️ {git_status['last_error']}")
 
 # --- メイン領域に minutes 表示 ---
 if "minutes" not in st.session_state:
     st.session_state["minutes"] = None
 
-minutes_path = Path(f"docs/minutes/{sel_day.year}/minutes_{sel_day:%Y%m%d}.yaml")
+minutes_path = minutes_file(sel_day)
 if minutes_path.exists():
-    minutes_yaml = yaml.safe_load(minutes_path.read_text())
+    minutes_yaml = load_minutes(minutes_path)   # 内容が変わらない限り再解析しない
     st.session_state["minutes"] = minutes_yaml
 
     st.markdown(render_md(minutes_path), unsafe_allow_html=True)
@@ -227,4 +250,4 @@ if minutes_path.exists():
 # ────────────────────────────────────────────────────────────────────────────
 # Footer / debug info (optional)
 # ────────────────────────────────────────────────────────────────────────────
-st.caption("version: 2025-05-19 JSON‑log + auto‑push enabled")
+st.caption("version: 2025-05-19 JSONL‑log + auto‑push enabled")
@@ -0,0 +1,249 @@
+# core/ast_index.py – Python ファイルの共有 AST インデックス
+"""
+各スキャナ（discover_capabilities / code_analysis / extract_capabilities /
+check_capability_overlap / gen_master_snapshot / extract_inventory /
+low_confidence_extractor / decorator_inserter）が使う共通の解析結果。
+
+* 1 ファイル 1 回だけ ast.parse し、次を記録する
+  - functions : 名前・引数・シグネチャ・デコレータ・@kai_capability のキーワード・
+                docstring・ソース範囲（lineno / col_offset / end_lineno / end_col_offset）
+  - classes   : 名前・メソッド・デコレータ・docstring・ソース範囲
+  - constants : トップレベルのリテラル代入
+  functions / classes の "order" は ast.walk 順の通し番号（走査順を再現したいとき用）
+* 解析結果は .cache/ast_index.json に内容ハッシュ（sha256）をキーに保存する。
+  (mtime_ns, size) が同じファイルはハッシュ計算も省き、内容が同じなら再解析しない
+"""
+from __future__ import annotations
+
+import ast
+import atexit
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+INDEX_PATH: Path = Path(os.getenv("KAI_AST_INDEX_PATH", str(PROJECT_ROOT / ".cache" / "ast_index.json")))
+INDEX_VERSION = 1
+
+# ---------------------------------------------------------------------------
+# 解析
+# ---------------------------------------------------------------------------
+
+def _decorator_name(node: ast.expr) -> str:
+    if isinstance(node, ast.Call):
+        node = node.func
+    try:
+        return ast.unparse(node)
+    except Exception:
+        return getattr(node, "id", "")
+
+
+def _kai_capability(decorators: list[ast.expr]) -> dict | None:
+    for deco in decorators:
+        if isinstance(deco, ast.Call) and getattr(deco.func, "id", "") == "kai_capability":
+            meta = {}
+            for kw in deco.keywords:
+                try:
+                    meta[kw.arg] = ast.literal_eval(kw.value)
+                except ValueError:
+                    meta[kw.arg] = ast.unparse(kw.value)
+            return meta
+    return None
+
+
+def _span(node: ast.AST) -> dict:
+    return {"lineno": node.lineno, "col_offset": node.col_offset,
+            "end_lineno": getattr(node, "end_lineno", None),
+            "end_col_offset": getattr(node, "end_col_offset", None)}
+
+
+def _jsonable(value):
+    try:
+        json.dumps(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def analyze_source(source: str, filename: str = "<unknown>") -> dict:
+    """ソースを 1 回だけ解析して関数・クラス・定数をまとめて返す。"""
+    entry = {"loc": len(source.splitlines()), "error": None,
+             "functions": [], "classes": [], "constants": []}
+    try:
+        tree = ast.parse(source, filename=filename)
+    except (SyntaxError, ValueError) as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+        return entry
+
+    owner: dict[ast.AST, str] = {}
+    for order, node in enumerate(ast.walk(tree)):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            entry["functions"].append({
+                "name": node.name,
+                "order": order,
+                "is_async": isinstance(node, ast.AsyncFunctionDef),
+                "class": owner.get(node),
+                "args": [a.arg for a in node.args.args],
+                "signature": f"def {node.name}({ast.unparse(node.args)})",
+                "decorators": [_decorator_name(d) for d in node.decorator_list],
+                "kai_capability": _kai_capability(node.decorator_list),
+                "docstring": ast.get_docstring(node),
+                **_span(node),
+            })
+        elif isinstance(node, ast.ClassDef):
+            methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            for m in methods:
+                owner[m] = node.name
+            entry["classes"].append({
+                "name": node.name,
+                "order": order,
+                "methods": [m.name for m in methods if isinstance(m, ast.FunctionDef)],
+                "decorators": [_decorator_name(d) for d in node.decorator_list],
+                "docstring": ast.get_docstring(node),
+                **_span(node),
+            })
+
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        if not isinstance(node.value, (ast.Constant, ast.List, ast.Tuple)):
+            continue
+        try:
+            val = ast.literal_eval(node.value)
+        except ValueError:
+            continue
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                entry["constants"].append({"name": target.id, "lineno": node.lineno,
+                                           "value": _jsonable(val), "type": type(val).__name__})
+    return entry
+
+# ---------------------------------------------------------------------------
+# インデックス
+# ---------------------------------------------------------------------------
+
+class ASTIndex:
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else INDEX_PATH
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}   # sha256 → 解析結果
+        self._files: dict[str, list] = {}     # 絶対パス → [mtime_ns, size, sha256]
+        self._loaded = False
+        self._dirty = False
+        self.parsed = 0
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self._entries = data.get("entries", {})
+            self._files = data.get("files", {})
+
+    def get(self, file_path, *, strict: bool = False) -> dict:
+        """ファイルの解析結果を返す（未変更なら保存済みのものを再利用）。
+
+        strict=True なら構文エラーのファイルで SyntaxError を送出する。
+        """
+        p = Path(file_path).resolve()
+        st = p.stat()
+        key = str(p)
+        with self._lock:
+            self._load()
+            known = self._files.get(key)
+            if known and known[0] == st.st_mtime_ns and known[1] == st.st_size and known[2] in self._entries:
+                entry = self._entries[known[2]]
+            else:
+                data = p.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()
+                entry = self._entries.get(digest)
+                if entry is None:
+                    entry = analyze_source(data.decode("utf-8"), filename=str(file_path))
+                    self._entries[digest] = entry
+                    self.parsed += 1
+                self._files[key] = [st.st_mtime_ns, st.st_size, digest]
+                self._dirty = True
+        if strict and entry["error"]:
+            raise SyntaxError(f"{file_path}: {entry['error']}")
+        return entry
+
+    def sha256(self, file_path) -> str:
+        """get() 済みファイルの内容ハッシュ"""
+        self.get(file_path)
+        return self._files[str(Path(file_path).resolve())][2]
+
+    def save(self) -> None:
+        """参照されているエントリだけを残して保存する。"""
+        with self._lock:
+            if not self._dirty:
+                return
+            live = {f[2] for f in self._files.values()}
+            self._entries = {h: e for h, e in self._entries.items() if h in live}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"version": INDEX_VERSION, "files": self._files,
+                                       "entries": self._entries}, ensure_ascii=False),
+                           encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+# ---------------------------------------------------------------------------
+# 既定インデックスと問い合わせ API
+# ---------------------------------------------------------------------------
+
+_default_index: ASTIndex | None = None
+
+
+def get_index() -> ASTIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = ASTIndex()
+        atexit.register(_default_index.save)
+    return _default_index
+
+
+def file_info(path, *, strict: bool = False) -> dict:
+    return get_index().get(path, strict=strict)
+
+
+def functions(path, *, strict: bool = False, include_async: bool = False) -> list[dict]:
+    """関数定義（メソッド含む、ast.walk 順）。既定では async def を除く（従来の各スキャナと同じ）"""
+    return [f for f in file_info(path, strict=strict)["functions"] if include_async or not f["is_async"]]
+
+
+def classes(path, *, strict: bool = False) -> list[dict]:
+    return file_info(path, strict=strict)["classes"]
+
+
+def constants(path, *, strict: bool = False) -> list[dict]:
+    return file_info(path, strict=strict)["constants"]
+
+
+def definitions(path, *, strict: bool = False) -> list[dict]:
+    """関数（async 除く）とクラスを ast.walk 順に混ぜて返す。各要素に "kind" を付ける。"""
+    info = file_info(path, strict=strict)
+    items = [{"kind": "function", **f} for f in info["functions"] if not f["is_async"]]
+    items += [{"kind": "class", **c} for c in info["classes"]]
+    return sorted(items, key=lambda d: d["order"])
+
+
+def find_function(path, name: str, *, include_async: bool = False) -> dict | None:
+    return next((f for f in functions(path, strict=True, include_async=include_async)
+                 if f["name"] == name), None)
+
+
+def source_segment(source: str, node: dict) -> str:
+    """記録済みのソース範囲で切り出す（ast.get_source_segment と同じ結果）"""
+    lines = source.splitlines(keepends=True)
+    start, end = node["lineno"] - 1, node["end_lineno"] - 1
+    if start == end:
+        return lines[start].encode()[node["col_offset"]:node["end_col_offset"]].decode()
+    first = lines[start].encode()[node["col_offset"]:].decode()
+    last = lines[end].encode()[:node["end_col_offset"]].decode()
+    return "".join([first, *lines[start + 1:end], last])
@@ -4,12 +4,11 @@ import json
 import os
 import re
 from typing import Dict, List, Any
-from openai import OpenAI 
 
 from dotenv import load_dotenv
 load_dotenv()
 
-client = OpenAI()  # .envから自動でAPIキー取得
+from core import llm_client  # .envから自動でAPIキー取得
 
 def generate_suggestions(diff_result: Dict[str, List[Dict[str, Any]]]) -> str:
     """
@@ -124,17 +123,16 @@ def generate_needed_capabilities(role: str = "project_manager") -> Dict[str, Any
 {{"role": "{role}", "required_capabilities": ["能力ID1", "能力ID2", ...]}}
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[
+    content = llm_client.chat(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": "Kaiの基本機能に必要なcapability IDを列挙してください。"}
         ],
-        temperature=0.2
+        model="gpt-4.1",
+        temperature=0.2,
+        tag="needed_capabilities",
     )
 
-    content = response.choices[0].message.content
-
     # コメントと末尾カンマを削除することでJSONとしてパース可能にする
     content_cleaned = re.sub(r'//.*', '', content)           # 行コメント削除
     content_cleaned = re.sub(r',\s*]', ']', content_cleaned) # 末尾カンマ削除
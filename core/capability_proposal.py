@@ -2,7 +2,8 @@
 
 import os
 import json
-from openai import OpenAI
+
+from core import llm_client
 
 def generate_capability_patch(cap_id: str, spec: str, model="gpt-4.1"):
     """
@@ -30,17 +31,16 @@ Kaiにおける `capabilities.json` の1件は以下のような構造です：
 この形式に合わせて、Kaiに登録すべき能力定義を1件だけ出力してください。
 """
 
-    client = OpenAI()
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
+    content = llm_client.chat(
+        [
             {"role": "system", "content": "あなたはKaiの能力定義支援を行うAIです。"},
             {"role": "user", "content": prompt}
-        ]
+        ],
+        model=model,
+        tag="capability_proposal",
     )
 
     # 応答がJSON形式前提。パースして返す
-    content = response.choices[0].message.content
     try:
         return json.loads(content)
     except json.JSONDecodeError:
@@ -0,0 +1,201 @@
+# core/conversation_log.py – 追記専用 JSONL 会話ログ
+"""
+会話ログを 1 メッセージ 1 行の JSONL で保存・読み込みするユーティリティ。
+
+* 書き込み: conversations/conversation_YYYYMMDD.jsonl へ 1 行追記（1 ターン O(1) I/O）
+* fsync はバッチ化（FSYNC_EVERY 件ごと / FSYNC_INTERVAL 秒経過ごと / 終了時）
+* ファイル単位ロック（プロセス内 threading.Lock + プロセス間 fcntl.flock）
+* 読み込み: 旧形式 conversation_YYYYMMDD.json（{"log_id", "messages": [...]}) も透過的に扱う
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator
+from zoneinfo import ZoneInfo
+
+try:
+    import fcntl
+except ImportError:  # Windows では flock 無し（プロセス内ロックのみ）
+    fcntl = None
+
+# ---------------------------------------------------------------------------
+# 定数
+# ---------------------------------------------------------------------------
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+CONV_DIR: Path = PROJECT_ROOT / "conversations"
+LOG_SUFFIX = ".jsonl"
+LEGACY_SUFFIX = ".json"
+
+FSYNC_EVERY: int = int(os.getenv("KAI_LOG_FSYNC_EVERY", "8"))
+FSYNC_INTERVAL: float = float(os.getenv("KAI_LOG_FSYNC_INTERVAL", "2.0"))
+
+_JST = ZoneInfo("Asia/Tokyo")
+
+_locks: dict[Path, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_unsynced: dict[Path, int] = {}
+_last_sync: dict[Path, float] = {}
+
+# ---------------------------------------------------------------------------
+# パス
+# ---------------------------------------------------------------------------
+
+def _day_key(day: date | str | None) -> str:
+    if day is None:
+        return datetime.now(_JST).strftime("%Y%m%d")
+    if isinstance(day, str):
+        return day.replace("-", "")
+    return day.strftime("%Y%m%d")
+
+
+def log_path_for(day: date | str | None = None, conv_dir: Path = CONV_DIR) -> Path:
+    """指定日（省略時は JST の今日）の JSONL ログパスを返す。"""
+    return Path(conv_dir) / f"conversation_{_day_key(day)}{LOG_SUFFIX}"
+
+
+def day_log_files(day: date | str, conv_dir: Path = CONV_DIR) -> list[Path]:
+    """指定日のログファイルを古い順（旧 JSON → JSONL）で返す。
+
+    conversations/conversation_YYYYMMDD.* に加え、
+    conversations/YYYY/MM/DD/conversation_*.* 配下も対象にする。
+    """
+    key = _day_key(day)
+    conv_dir = Path(conv_dir)
+    files = [conv_dir / f"conversation_{key}{LEGACY_SUFFIX}",
+             conv_dir / f"conversation_{key}{LOG_SUFFIX}"]
+    nested = conv_dir / key[:4] / key[4:6] / key[6:]
+    if nested.is_dir():
+        files += sorted(nested.glob(f"conversation_*{LEGACY_SUFFIX}"))
+        files += sorted(nested.glob(f"conversation_*{LOG_SUFFIX}"))
+    return [f for f in files if f.is_file()]
+
+
+def list_log_files(conv_dir: Path = CONV_DIR) -> list[Path]:
+    """conversations/ 直下の会話ログ（旧 JSON / JSONL 両方）を名前順で返す。"""
+    conv_dir = Path(conv_dir)
+    files = list(conv_dir.glob(f"conversation_*{LEGACY_SUFFIX}"))
+    files += conv_dir.glob(f"conversation_*{LOG_SUFFIX}")
+    return sorted(files, key=lambda p: p.name)
+
+# ---------------------------------------------------------------------------
+# 書き込み
+# ---------------------------------------------------------------------------
+
+def _lock_for(path: Path) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def _locked_append(path: Path):
+    """ファイル単位の排他ロックを取った追記ハンドルを返す。"""
+    with _lock_for(path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as fp:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield fp
+            finally:
+                fp.flush()
+                if fcntl is not None:
+                    fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+
+def _ends_with_newline(path: Path) -> bool:
+    """空ファイルか、最後のバイトが改行なら True（書きかけの行が残っていない）"""
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def append_message(role: str, content: str, *, ts: str | None = None,
+                   path: Path | None = None) -> dict:
+    """1 メッセージを JSONL ログへ追記し、書き込んだレコードを返す。"""
+    path = Path(path) if path else log_path_for()
+    rec = {
+        "role": role,
+        "content": content,
+        "ts": ts or datetime.now(_JST).isoformat(timespec="seconds"),
+    }
+    line = json.dumps(rec, ensure_ascii=False) + "\n"
+    with _locked_append(path) as fp:
+        # 途中で落ちて末尾行が改行で終わっていなければ、新しい行と繋がらないよう改行を補う
+        if not _ends_with_newline(path):
+            line = "\n" + line
+        fp.write(line)
+        fp.flush()
+        now = time.monotonic()
+        _unsynced[path] = _unsynced.get(path, 0) + 1
+        if (_unsynced[path] >= FSYNC_EVERY
+                or now - _last_sync.get(path, 0.0) >= FSYNC_INTERVAL):
+            os.fsync(fp.fileno())
+            _unsynced[path] = 0
+            _last_sync[path] = now
+    return rec
+
+
+def flush(path: Path | None = None) -> None:
+    """未 fsync の追記をディスクへ確定させる（省略時は全ファイル）。"""
+    targets = [Path(path)] if path else [p for p, n in list(_unsynced.items()) if n]
+    for p in targets:
+        if not p.exists():
+            continue
+        with _locked_append(p) as fp:
+            os.fsync(fp.fileno())
+            _unsynced[p] = 0
+            _last_sync[p] = time.monotonic()
+
+
+atexit.register(flush)
+
+# ---------------------------------------------------------------------------
+# 読み込み
+# ---------------------------------------------------------------------------
+
+def iter_messages(path: Path | str) -> Iterator[dict]:
+    """ログ 1 ファイルのメッセージを順に返す（JSONL / 旧 JSON 両対応）。
+
+    JSONL の壊れた行（書き込み途中の末尾行など）は読み飛ばす。
+    """
+    path = Path(path)
+    if not path.exists():
+        return
+    if path.suffix == LEGACY_SUFFIX:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        yield from data.get("messages", [])
+        return
+    with path.open(encoding="utf-8") as fp:
+        for line in fp:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(rec, dict) and "role" in rec and "content" in rec:
+                yield rec
+
+
+def load_messages(path: Path | str) -> list[dict]:
+    return list(iter_messages(path))
+
+
+def iter_day_messages(day: date | str, conv_dir: Path = CONV_DIR) -> Iterator[dict]:
+    """指定日の全メッセージを時系列順に返す。"""
+    for f in day_log_files(day, conv_dir):
+        yield from iter_messages(f)
+
+
+def load_day_messages(day: date | str, conv_dir: Path = CONV_DIR) -> list[dict]:
+    return list(iter_day_messages(day, conv_dir))
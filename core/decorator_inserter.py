@@ -6,10 +6,11 @@ Kai用デコレータ挿入ユーティリティ
 - 元ファイルを破壊しないよう行単位で編集
 """
 
-import ast
 import pathlib
 from typing import Dict
 
+from core import ast_index
+
 
 def insert_kai_decorator(cap: Dict, *, dry_run=False) -> bool | str:
     file_path = pathlib.Path(cap["filepath"])
@@ -17,17 +18,12 @@ def insert_kai_decorator(cap: Dict, *, dry_run=False) -> bool | str:
         raise FileNotFoundError(file_path)
 
     source_lines = file_path.read_text(encoding="utf-8").splitlines()
-    tree = ast.parse("\n".join(source_lines))
 
-    target = next(
-        (n for n in ast.walk(tree)
-         if isinstance(n, ast.FunctionDef) and n.name == cap["name"]),
-        None
-    )
+    target = ast_index.find_function(file_path, cap["name"])
     if not target:
         raise ValueError(f"関数 `{cap['name']}` が {file_path} に見つかりません")
 
-    idx = target.lineno - 1
+    idx = target["lineno"] - 1
 
     # すでに直前に同じ装飾があるならスキップ
     if "@kai_capability" in source_lines[idx - 1]:
@@ -4,10 +4,9 @@ import os
 import subprocess
 from datetime import datetime
 
-import openai
-
 from dotenv import load_dotenv
 
+from core import llm_client
 from core.log_utils import messages_to_text
 from core.capabilities_registry import kai_capability
 
@@ -17,9 +16,8 @@ load_dotenv()  # ← ここで .env を読み込む
 # OpenAIクライアント初期化（より堅牢に）
 # ───────────────────────────────
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and llm_client.backend_name() != "fake":
     raise RuntimeError("❗ OPENAI_API_KEY is not set in the environment. Please check your .env file.")
-# client = OpenAI(api_key=api_key)
 
 # ───────────────────────────────
 # パス設定
@@ -75,15 +73,15 @@ def propose_doc_update(doc_name: str, conversation_text: str, model="gpt-4.1") -
 {current_doc}
 """
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
+    return llm_client.chat(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=0.0
+        model=model,
+        temperature=0.0,
+        tag="propose_doc_update",
     )
-    return response.choices[0].message.content
 
 @kai_capability(
     id="update_doc_with_gpt",
@@ -114,8 +112,8 @@ def update_doc_with_gpt(doc_name: str, conversation_text: str, auto_approve=Fals
     apply_update(doc_name, proposal, auto_approve=True)
 
 import difflib
-import json
 from core.capabilities_registry import kai_capability  # 未追加ならファイル上部に追加
+from core.patch_journal import PatchJournal
 
 @kai_capability(
     id="apply_update",
@@ -126,7 +124,7 @@ from core.capabilities_registry import kai_capability  # 未追加ならファ
 )
 def apply_update(doc_name: str, new_content: str, auto_approve=False):
     """
-    GPTが生成したMarkdown内容をファイルに反映し、Gitコミット＋patch_log.jsonに差分履歴を記録する
+    GPTが生成したMarkdown内容をファイルに反映し、Gitコミット＋patch_log.jsonlに差分履歴を記録する
     """
     target_path = os.path.join(DOCS_DIR, doc_name)
     if not os.path.exists(target_path):
@@ -166,31 +164,17 @@ def apply_update(doc_name: str, new_content: str, auto_approve=False):
         f.write(new_content)
     print(f"※ ファイルを更新しました: {target_path}")
 
-    # patch_log.json に履歴を追記
-    patch_log_path = os.path.join(DOCS_DIR, "patch_log.json")
+    # patch_log.jsonl に履歴を 1 行追記（旧 patch_log.json は初回に移行）
+    patch_log_path = os.path.join(DOCS_DIR, "patch_log.jsonl")
     patch_entry = {
         "file": doc_name,
         "datetime": datetime.utcnow().isoformat() + "Z",
         "diff": diff_text
     }
+    PatchJournal(patch_log_path, legacy_path=os.path.join(DOCS_DIR, "patch_log.json"),
+                 time_field="datetime").append(patch_entry)
 
-    try:
-        if os.path.exists(patch_log_path):
-            with open(patch_log_path, "r", encoding="utf-8") as f:
-                patch_log = json.load(f)
-                if not isinstance(patch_log, list):
-                    patch_log = []
-        else:
-            patch_log = []
-    except Exception:
-        patch_log = []
-
-    patch_log.append(patch_entry)
-
-    with open(patch_log_path, "w", encoding="utf-8") as f:
-        json.dump(patch_log, f, ensure_ascii=False, indent=2)
-
-    print(f"✅ {doc_name} を修正し、差分を patch_log.json に記録しました")
+    print(f"✅ {doc_name} を修正し、差分を patch_log.jsonl に記録しました")
 
     # Gitコミット
     commit_msg = f"update: {doc_name} via GPT apply_update ({datetime.now().strftime('%Y-%m-%d')})"
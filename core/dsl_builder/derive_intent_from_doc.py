@@ -18,11 +18,11 @@ from datetime import datetime
   4. confidence=0.4, status フィールド付きで下書きを生成
 
 依存:
-  - openai>=1.10.0,<2.0.0  (requirements.txt に合わせる)
-  - OPENAI_API_KEY 環境変数が必要
+  - core.llm_client（openai>=1.10.0,<2.0.0）
+  - OPENAI_API_KEY 環境変数が必要（KAI_LLM_BACKEND=fake の場合は不要）
 """
 
-from openai import OpenAI  # openai-python v1.x
+from core import llm_client
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent.parent
 DOCS = ROOT / "docs"
@@ -52,7 +52,7 @@ def regex_extract(md_text: str):
             "status": "ok",
         }
 
-def gpt_extract(md_text: str, client: OpenAI):
+def gpt_extract(md_text: str):
     prompt = textwrap.dedent(f"""
     あなたはソフトウェアPMです。次の Markdown 定義書から Kai/VPM が実装すべき capability 情報を JSON Lines で抽出してください。
     各行のフィールドは: id, inferred_purpose, enabled (bool), requires_confirm (bool), status(ok|missing|conflict)。
@@ -64,12 +64,14 @@ def gpt_extract(md_text: str, client: OpenAI):
     例: {{"id":"task_scheduler","inferred_purpose":"タスクをスケジュール実行","enabled":true,"requires_confirm":false,"status":"ok"}}
     """)
     try:
-        rsp = client.chat.completions.create(
+        content = llm_client.chat(
+            [{"role": "user", "content": prompt}],
             model=GPT_MODEL,
-            messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
+            tag="derive_intent",
+            cache=True,
         )
-        lines = rsp.choices[0].message.content.strip().splitlines()
+        lines = content.strip().splitlines()
         for l in lines:
             try:
                 rec = json.loads(l)
@@ -94,9 +96,8 @@ def load_old_cap_json():
 
 def main():
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not api_key and llm_client.backend_name() != "fake":
         raise RuntimeError("OPENAI_API_KEY not set")
-    client = OpenAI(api_key=api_key)
 
     records: dict[str, dict] = {}
 
@@ -105,7 +106,7 @@ def main():
             continue
         md_text = md_path.read_text(encoding="utf-8")
         # 1) GPT 抽出
-        for rec in gpt_extract(md_text, client):
+        for rec in gpt_extract(md_text):
             rec.setdefault("observed_state", {})["sha256"] = sha2568(md_path)
             rec["resource"] = f"intent://{md_path.relative_to(ROOT)}#{rec['id']}"
             rec["dsl_version"] = "0.1"
@@ -5,14 +5,35 @@ SCHEMA_PATH = ROOT / "schemas" / "dsl_v0.1.json"
 IDEMP_FILE  = ROOT / ".dsl" / "applied_keys.json"    # ← 追加
 
 # ────────────────────────────────
+_store = None
+
+def get_store():
+    """integrated_dsl.jsonl のインデックス付きストア（プロセス内で共有）"""
+    global _store
+    if _store is None:
+        from core.dsl_store import DSLStore
+        _store = DSLStore(DSL_PATH, validate=validate_dsl, on_compact=_record_applied_keys)
+    return _store
+
 def load_dsl(path=DSL_PATH):
+    if path == DSL_PATH:
+        return get_store().records()   # 未 compaction のジャーナル分も反映済み
     if not path.exists():
         return []
     return [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
 
+def upsert_record(rec):
+    """1 レコードだけ検証してジャーナルへ追記（全体の再書き込み無し）"""
+    get_store().upsert(rec)
+
 def idempotency_key(rec):
     return hashlib.sha256((rec["resource"] + rec["id"]).encode()).hexdigest()
 
+def content_hash(rec):
+    """applied_keys.json に記録する内容ハッシュ"""
+    from core.dsl_store import content_hash as _content_hash
+    return _content_hash(rec)
+
 # ─── Idempotency 用ヘルパ ───────
 def load_applied_keys():
     if IDEMP_FILE.exists():
@@ -22,46 +43,141 @@ def load_applied_keys():
 def save_applied_keys(keys: dict):
     IDEMP_FILE.parent.mkdir(exist_ok=True)
     json.dump(keys, open(IDEMP_FILE, "w", encoding="utf-8"), indent=2, ensure_ascii=False)
+
+SCHEMA_KEY = "__schema__"   # applied_keys.json 内で、記録時のスキーマハッシュを持つ予約キー
+
+def current_applied_keys(keys=None):
+    """記録時とスキーマが同じなら applied_keys をそのまま、変わっていれば空（全件再検証）で返す"""
+    keys = load_applied_keys() if keys is None else keys
+    if keys.get(SCHEMA_KEY) != schema_hash():
+        return {SCHEMA_KEY: schema_hash()}
+    return keys
+
+def _record_applied_keys(records):
+    # compaction 時にジャーナル分の冪等キーをまとめて反映
+    keys = current_applied_keys()
+    for rec in records:
+        keys[idempotency_key(rec)] = content_hash(rec)
+    save_applied_keys(keys)
 # ────────────────────────────────
 
-def validate_dsl(dsl):
+class DSLValidationError(ValueError):
+    """スキーマ違反をまとめて報告する。errors = [(resource, message), ...]"""
+    def __init__(self, errors):
+        self.errors = errors
+        lines = [f"{res}: {msg}" for res, msg in errors]
+        super().__init__(f"{len(errors)} schema error(s)\n" + "\n".join(lines))
+
+_validator_cache = {}   # {"key": (mtime_ns, size), "validator": ...}
+_schema_hash_cache = {}   # {"key": (mtime_ns, size), "hash": ...}
+
+def get_validator():
+    """コンパイル済みバリデータ（スキーマファイルが変わった時だけ作り直す）"""
     import jsonschema
-    schema = json.load(open(SCHEMA_PATH))
+    st = SCHEMA_PATH.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    if _validator_cache.get("key") != key:
+        schema = json.loads(SCHEMA_PATH.read_text(encoding="utf-8"))
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        _validator_cache.update(key=key, validator=cls(schema))
+    return _validator_cache["validator"]
+
+def schema_hash():
+    """スキーマファイルの内容ハッシュ（applied_keys.json の有効性判定用）"""
+    st = SCHEMA_PATH.stat()
+    key = (st.st_mtime_ns, st.st_size)
+    if _schema_hash_cache.get("key") != key:
+        _schema_hash_cache.update(key=key, hash=hashlib.sha256(SCHEMA_PATH.read_bytes()).hexdigest())
+    return _schema_hash_cache["hash"]
+
+def validate_dsl(dsl, applied_keys=None):
+    """全レコードを検証し、違反はまとめて DSLValidationError で送出する。
+
+    applied_keys を渡すと、内容ハッシュが記録済みのもの（検証済み）はスキップする。
+    applied_keys を記録したときからスキーマが変わっていれば、スキップせず全件を検証する。
+    検証したレコード数を返す。
+    """
+    validator = get_validator()
+    if applied_keys is not None:
+        applied_keys = current_applied_keys(applied_keys)
+    errors, checked = [], 0
     for rec in dsl:
-        jsonschema.validate(rec, schema)
+        if applied_keys is not None and _is_applied(rec, applied_keys):
+            continue
+        checked += 1
+        for err in validator.iter_errors(rec):
+            path = "/".join(str(p) for p in err.absolute_path)
+            errors.append((rec.get("resource", "?"), f"{path}: {err.message}" if path else err.message))
+    if errors:
+        raise DSLValidationError(errors)
+    return checked
+
+def _is_applied(rec, applied_keys):
+    try:
+        return applied_keys.get(idempotency_key(rec)) == content_hash(rec)
+    except (KeyError, TypeError):
+        return False   # resource / id 欠落はスキーマ検証に回す
 
-def plan(new_dsl):
-    cur = {r["resource"]: r for r in load_dsl()}
-    diff = []
+def field_diff(old, new):
+    """{field: {"old": ..., "new": ...}}（欠落フィールドは None）"""
+    return {k: {"old": old.get(k), "new": new.get(k)}
+            for k in sorted(old.keys() | new.keys()) if old.get(k) != new.get(k)}
+
+def plan(new_dsl, base=None):
+    """現在の DSL（または base）に対する差分を resource 単位で分類する。
+
+    戻り値: {"add": [resource], "modify": {resource: field_diff}, "delete": [resource], "unchanged": 件数}
+    base の内容ハッシュはストアのハッシュインデックス（永続化済み）を使うので、
+    新しい側のハッシュ計算 1 回ずつで済む。
+    """
+    if base is None:
+        store = get_store()
+        base_hashes, lookup = store.hash_index(), store.get
+    else:
+        base_by_res = {r["resource"]: r for r in base}
+        base_hashes = {res: content_hash(r) for res, r in base_by_res.items()}
+        lookup = base_by_res.get
+
+    result = {"add": [], "modify": {}, "delete": [], "unchanged": 0}
+    seen = set()
     for rec in new_dsl:
-        if rec != cur.get(rec["resource"]):
-            diff.append(rec["resource"])
-    return diff
+        res = rec["resource"]
+        seen.add(res)
+        old_hash = base_hashes.get(res)
+        if old_hash is None:
+            result["add"].append(res)
+        elif old_hash == content_hash(rec):
+            result["unchanged"] += 1
+        else:
+            result["modify"][res] = field_diff(lookup(res), rec)
+    result["delete"] = [res for res in base_hashes if res not in seen]
+    return result
 
-def apply(new_dsl):
-    validate_dsl(new_dsl)
+def plan_changes(result):
+    """plan() の結果から変更のある resource を列挙"""
+    return result["add"] + list(result["modify"]) + result["delete"]
 
-    # 冪等キー履歴ロード
-    applied_path = ROOT / ".dsl" / "applied_keys.json"
-    applied_keys = json.load(open(applied_path)) if applied_path.exists() else {}
+def apply(new_dsl):
+    # 冪等キー履歴ロード（スキーマが変わっていれば空からやり直す）
+    applied_keys = current_applied_keys()
 
-    updated = 0
+    # 以前と “まったく同じ内容” のものは検証済みなのでスキップ
+    changed = []
     for rec in new_dsl:
-        key = idempotency_key(rec)
-        # 以前と “まったく同じ内容” ならスキップ
-        if applied_keys.get(key) == hashlib.sha1(json.dumps(rec, sort_keys=True).encode()).hexdigest():
-            continue
-        applied_keys[key] = hashlib.sha1(json.dumps(rec, sort_keys=True).encode()).hexdigest()
-        updated += 1
+        if not _is_applied(rec, applied_keys):
+            changed.append(rec)
+    validate_dsl(changed)
+
+    for rec in changed:
+        applied_keys[idempotency_key(rec)] = content_hash(rec)
+    updated = len(changed)
 
-    # ファイル保存
-    DSL_PATH.parent.mkdir(exist_ok=True)
-    DSL_PATH.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in new_dsl))
+    # ファイル保存（ジャーナルも畳み込まれる）
+    get_store().replace_all(new_dsl)
 
     # 履歴更新
-    applied_path.parent.mkdir(exist_ok=True)
-    with open(applied_path, "w", encoding="utf-8") as f:
-        json.dump(applied_keys, f, ensure_ascii=False, indent=2)
+    save_applied_keys(applied_keys)
 
     return f"Applied {updated} updated record(s)"
 
@@ -74,7 +190,7 @@ if __name__ == "__main__":
 
     if args.plan:
         new = [json.loads(l) for l in open(args.plan, encoding="utf-8")]
-        print(plan(new))
+        print(json.dumps(plan(new), ensure_ascii=False, indent=2))
     elif args.apply:
         new = [json.loads(l) for l in open(args.apply, encoding="utf-8")]
         print(apply(new))
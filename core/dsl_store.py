@@ -0,0 +1,307 @@
+# core/dsl_store.py – インデックス付き DSL ストア
+"""
+integrated_dsl.jsonl をメモリ上に保持し、1 レコード単位で更新できるストア。
+
+* 主キーは resource（一意）。id は重複し得るので id → [resource] の副インデックスを持つ
+* 単一レコード更新は .dsl/dsl_journal.jsonl へ 1 行追記するだけ（全体の再読込・再書き込み無し）
+* ジャーナルが compact_every 行を超えたら integrated_dsl.jsonl へ書き戻して空にする（compaction）
+* 他プロセスの変更は refresh() で検知:
+  - スナップショット（jsonl）の (mtime_ns, size) が変われば全再読込
+  - ジャーナルが伸びただけなら追記分だけを再生
+* integrated_dsl.jsonl は従来どおりのインポート / エクスポート形式
+* ジャーナルはローカルの書き込み途中の状態なので git 管理外（.gitignore）。
+  このプロセスが追記したジャーナルは終了時に compaction し、integrated_dsl.jsonl
+  （git・生ファイルの読み手が見る側）に残さない
+* hash_index() は resource → 内容ハッシュ。スナップショット分は .dsl/dsl_hash_index.json に
+  保存し、同じスナップショットなら次回以降ハッシュ計算を省く（dsl_engine.plan 用）
+"""
+from __future__ import annotations
+
+import atexit
+import copy
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+
+ROOT = Path(__file__).resolve().parent.parent
+DSL_PATH = ROOT / "dsl" / "integrated_dsl.jsonl"
+JOURNAL_PATH = ROOT / ".dsl" / "dsl_journal.jsonl"
+HASH_INDEX_PATH = ROOT / ".dsl" / "dsl_hash_index.json"
+COMPACT_EVERY = int(os.getenv("KAI_DSL_COMPACT_EVERY", "200"))
+
+
+def _stat_key(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class DuplicateResourceError(ValueError):
+    """replace_all に同じ resource のレコードが複数含まれていた。resources = 重複した resource"""
+    def __init__(self, resources: list[str]):
+        self.resources = resources
+        super().__init__(f"{len(resources)} duplicate resource(s): " + ", ".join(resources))
+
+
+def content_hash(rec: dict) -> str:
+    """レコード内容のハッシュ（.dsl/applied_keys.json と同じ形式）"""
+    return hashlib.sha1(json.dumps(rec, sort_keys=True).encode()).hexdigest()
+
+
+class DSLStore:
+    def __init__(self, path: Path = DSL_PATH, journal_path: Path = JOURNAL_PATH,
+                 validate: Callable[[list[dict]], None] | None = None,
+                 compact_every: int = COMPACT_EVERY,
+                 on_compact: Callable[[list[dict]], None] | None = None,
+                 hash_index_path: Path | None = None):
+        self.path = Path(path)
+        self.journal_path = Path(journal_path)
+        self.hash_index_path = Path(hash_index_path) if hash_index_path else \
+            self.journal_path.with_name("dsl_hash_index.json")
+        self.validate = validate
+        self.compact_every = compact_every
+        self.on_compact = on_compact
+        self._lock = threading.RLock()
+        self._records: dict[str, dict] = {}
+        self._by_id: dict[str, list[str]] = {}
+        self._hashes: dict[str, str] = {}
+        self._save_hashes = False
+        self._snapshot_key: tuple | None = ()
+        self._journal_offset = 0
+        self._journal_lines = 0
+        self._wrote_journal = False
+        atexit.register(self._compact_at_exit)
+
+    # ── 読み込み ───────────────────────────────
+    def refresh(self) -> None:
+        """ディスク上の変更を取り込む（変更が無ければ stat 2 回のみ）。"""
+        with self._lock:
+            snap_key = _stat_key(self.path)
+            if snap_key != self._snapshot_key:
+                self._load_snapshot()
+                self._snapshot_key = snap_key
+                self._load_hash_index()
+                self._journal_offset = 0
+                self._journal_lines = 0
+            self._replay_journal()
+
+    def _load_snapshot(self) -> None:
+        self._records, self._by_id, self._hashes = {}, {}, {}
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    self._put(json.loads(line))
+
+    def _replay_journal(self) -> None:
+        jkey = _stat_key(self.journal_path)
+        if jkey is None:
+            self._journal_offset = self._journal_lines = 0
+            return
+        if jkey[1] < self._journal_offset:  # 他プロセスが compaction した
+            self._load_snapshot()
+            self._snapshot_key = _stat_key(self.path)
+            self._load_hash_index()
+            self._journal_offset = self._journal_lines = 0
+        if jkey[1] == self._journal_offset:
+            return
+        with self.journal_path.open("rb") as f:
+            f.seek(self._journal_offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 書き込み途中の行は次回に回す
+                self._journal_offset += len(raw)
+                self._journal_lines += 1
+                self._apply_op(json.loads(raw))
+
+    def _apply_op(self, op: dict) -> None:
+        if op["op"] == "upsert":
+            self._put(op["rec"])
+        elif op["op"] == "delete":
+            self._remove(op["resource"])
+
+    def _put(self, rec: dict) -> None:
+        # resource 無しの行（手書きの説明行など）も順序を保って保持する
+        res = rec.get("resource") or f"#{len(self._records)}"
+        old = self._records.get(res)
+        if old is not None and old.get("id") != rec.get("id"):
+            self._unindex(res, old.get("id"))
+        self._records[res] = rec
+        self._hashes.pop(res, None)
+        ids = self._by_id.setdefault(rec.get("id"), [])
+        if res not in ids:
+            ids.append(res)
+
+    def _remove(self, resource: str) -> None:
+        old = self._records.pop(resource, None)
+        self._hashes.pop(resource, None)
+        if old is not None:
+            self._unindex(resource, old.get("id"))
+
+    def _unindex(self, resource: str, rid: str | None) -> None:
+        ids = self._by_id.get(rid, [])
+        if resource in ids:
+            ids.remove(resource)
+        if not ids:
+            self._by_id.pop(rid, None)
+
+    # ── 参照 ─────────────────────────────────
+    def records(self) -> list[dict]:
+        """全レコード（コピー）をファイル順で返す。"""
+        self.refresh()
+        with self._lock:
+            return copy.deepcopy(list(self._records.values()))
+
+    def get(self, resource: str) -> dict | None:
+        self.refresh()
+        with self._lock:
+            rec = self._records.get(resource)
+            return copy.deepcopy(rec) if rec is not None else None
+
+    def find_by_id(self, rid: str) -> list[dict]:
+        self.refresh()
+        with self._lock:
+            return [copy.deepcopy(self._records[r]) for r in self._by_id.get(rid, [])]
+
+    def filter(self, pred: Callable[[dict], bool]) -> list[dict]:
+        self.refresh()
+        with self._lock:
+            return [copy.deepcopy(r) for r in self._records.values() if pred(r)]
+
+    def hash_index(self) -> dict[str, str]:
+        """resource → content_hash。未計算の分だけ計算する。"""
+        self.refresh()
+        with self._lock:
+            for res, rec in self._records.items():
+                if res not in self._hashes:
+                    self._hashes[res] = content_hash(rec)
+            if self._save_hashes and self._journal_lines == 0:
+                self._dump_hash_index()
+            return dict(self._hashes)
+
+    def _load_hash_index(self) -> None:
+        # スナップショットと同じ stat で保存されたものだけを信用する
+        try:
+            saved = json.loads(self.hash_index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            saved = {}
+        if saved.get("snapshot") == list(self._snapshot_key or ()) and self._snapshot_key:
+            hashes = saved.get("hashes", {})
+            self._hashes = {r: h for r, h in hashes.items() if r in self._records}
+            self._save_hashes = False
+        else:
+            self._save_hashes = True
+
+    def _dump_hash_index(self) -> None:
+        if not self._snapshot_key:
+            return
+        self.hash_index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.hash_index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"snapshot": list(self._snapshot_key), "hashes": self._hashes}),
+                       encoding="utf-8")
+        os.replace(tmp, self.hash_index_path)
+        self._save_hashes = False
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._records)
+
+    # ── 更新 ─────────────────────────────────
+    def _append_journal(self, op: dict) -> None:
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(op, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.journal_path.open("ab") as f:
+            f.write(line)
+        self._journal_offset += len(line)
+        self._journal_lines += 1
+        self._wrote_journal = True
+
+    def upsert(self, rec: dict) -> None:
+        """1 レコードを検証して追加 / 置換する（resource がキー）。"""
+        if self.validate:
+            self.validate([rec])
+        with self._lock:
+            self.refresh()
+            rec = copy.deepcopy(rec)
+            self._append_journal({"op": "upsert", "rec": rec})
+            self._put(rec)
+            self._maybe_compact()
+
+    def delete(self, resource: str) -> bool:
+        with self._lock:
+            self.refresh()
+            if resource not in self._records:
+                return False
+            self._append_journal({"op": "delete", "resource": resource})
+            self._remove(resource)
+            self._maybe_compact()
+            return True
+
+    def replace_all(self, records: Iterable[dict]) -> None:
+        """全レコードを置き換えてスナップショットを書き直す（dsl_engine.apply 用）。
+
+        同じ resource が複数あれば何も書かずに DuplicateResourceError を送出する。
+        """
+        records = [copy.deepcopy(r) for r in records]
+        counts: dict[str, int] = {}
+        for rec in records:
+            if rec.get("resource"):
+                counts[rec["resource"]] = counts.get(rec["resource"], 0) + 1
+        dups = [res for res, n in counts.items() if n > 1]
+        if dups:
+            raise DuplicateResourceError(dups)
+        with self._lock:
+            self._records, self._by_id, self._hashes = {}, {}, {}
+            for rec in records:
+                self._put(rec)
+            self._write_snapshot()
+
+    def _maybe_compact(self) -> None:
+        if self.compact_every and self._journal_lines >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """ジャーナルをスナップショットへ畳み込み、ジャーナルを空にする。"""
+        with self._lock:
+            self.refresh()
+            if self.on_compact:
+                self.on_compact(list(self._records.values()))
+            self._write_snapshot()
+
+    def _compact_at_exit(self) -> None:
+        if self._wrote_journal and self.journal_path.exists():
+            try:
+                self.compact()
+            except Exception as e:   # 終了処理では落とさない（ジャーナルは次回の読み込みで再生される）
+                print(f"⚠️ DSL ジャーナルの compaction に失敗しました: {e}", flush=True)
+
+    def _write_snapshot(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in self._records.values()),
+                       encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.journal_path.unlink(missing_ok=True)
+        self._wrote_journal = False
+        self._snapshot_key = _stat_key(self.path)
+        self._journal_offset = self._journal_lines = 0
+        self._save_hashes = True   # 次の hash_index() で保存
+
+    # ── インポート / エクスポート ─────────────────
+    def export_jsonl(self, out: Path) -> int:
+        recs = self.records()
+        Path(out).write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in recs), encoding="utf-8")
+        return len(recs)
+
+    def import_jsonl(self, src: Path) -> int:
+        recs = [json.loads(l) for l in Path(src).read_text(encoding="utf-8").splitlines() if l.strip()]
+        if self.validate:
+            self.validate(recs)
+        self.replace_all(recs)
+        return len(recs)
@@ -1,14 +1,165 @@
+# core/enforcement.py – kai_rules.json に基づくルール違反チェック
+"""
+data/kai_rules.json のルールをコンパイルして保持し、操作ごとに違反を判定する。
+
+* ルールは初回に 1 度だけ読み込み、ファイルの (mtime_ns, size) が変わったら読み直す
+  （確認は RULES_CHECK_INTERVAL 秒に 1 回の stat のみ）
+* "applies_to" の action ごとにルールを索引化し、該当 action のルールだけを評価する
+  （"applies_to" が無く "when" だけあるルールは全 action で評価）
+* 条件は JSON で宣言する。"when" の書式:
+
+    {"doc_type": "ondemand"}                          # 値が等しい
+    {"approved": {"truthy": false}}                   # 真偽
+    {"modified_docs": {"gt": 1, "default": 0}}        # eq / ne / in / not_in / gt / gte / lt / lte / exists
+    {"any": [{...}, {...}]} / {"all": [...]} / {"not": {...}}
+
+  "when" の無いルールは指針（説明のみ）として扱い、違反判定には使わない。
+"""
 import json
 import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
 from core.capabilities_registry import kai_capability
 
-RULES_PATH = "data/kai_rules.json"
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+RULES_PATH = str(PROJECT_ROOT / "data" / "kai_rules.json")
+RULES_CHECK_INTERVAL = float(os.getenv("KAI_RULES_CHECK_INTERVAL", "1.0"))   # 秒
+
+_MISSING = object()
+
+# ---------------------------------------------------------------------------
+# 条件のコンパイル
+# ---------------------------------------------------------------------------
+
+def _compare(op: str, expected) -> Callable[[object], bool]:
+    def safe(fn):
+        def check(v):
+            try:
+                return v is not _MISSING and v is not None and fn(v)
+            except TypeError:
+                return False
+        return check
+
+    ops = {
+        "eq": lambda v: v is not _MISSING and v == expected,
+        "ne": lambda v: v is _MISSING or v != expected,
+        "in": lambda v: v is not _MISSING and v in expected,
+        "not_in": lambda v: v is _MISSING or v not in expected,
+        "gt": safe(lambda v: v > expected),
+        "gte": safe(lambda v: v >= expected),
+        "lt": safe(lambda v: v < expected),
+        "lte": safe(lambda v: v <= expected),
+        "truthy": lambda v: bool(v is not _MISSING and v) == bool(expected),
+        "exists": lambda v: (v is not _MISSING) == bool(expected),
+    }
+    if op not in ops:
+        raise ValueError(f"未知の条件演算子です: {op}")
+    return ops[op]
+
+
+def compile_condition(cond: dict) -> Callable[[dict], bool]:
+    """"when" 節を ctx → bool の関数に変換する（全条件の AND）"""
+    checks: list[Callable[[dict], bool]] = []
+    for key, spec in cond.items():
+        if key == "all":
+            subs = [compile_condition(c) for c in spec]
+            checks.append(lambda ctx, subs=subs: all(s(ctx) for s in subs))
+        elif key == "any":
+            subs = [compile_condition(c) for c in spec]
+            checks.append(lambda ctx, subs=subs: any(s(ctx) for s in subs))
+        elif key == "not":
+            sub = compile_condition(spec)
+            checks.append(lambda ctx, sub=sub: not sub(ctx))
+        else:
+            if not isinstance(spec, dict):
+                spec = {"eq": spec}
+            default = spec.get("default", _MISSING)
+            preds = [_compare(op, v) for op, v in spec.items() if op != "default"]
+            checks.append(lambda ctx, key=key, preds=preds, default=default:
+                          all(p(ctx.get(key, default)) for p in preds))
+    return lambda ctx: all(c(ctx) for c in checks)
+
+# ---------------------------------------------------------------------------
+# ルールエンジン
+# ---------------------------------------------------------------------------
+
+class RuleEngine:
+    def __init__(self, path: str = RULES_PATH, check_interval: float = RULES_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._key: tuple | None = None
+        self._checked_at = 0.0
+        self._data: dict = {}
+        self._by_action: dict[str, list[tuple[dict, Callable]]] = {}
+        self._wildcard: list[tuple[dict, Callable]] = []
+        self.loads = 0
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._key is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Rules file not found: {self.path}")
+        key = (st.st_mtime_ns, st.st_size)
+        if key == self._key:
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        by_action: dict[str, list] = {}
+        wildcard: list = []
+        for rule in data.get("rules", []):
+            when = rule.get("when")
+            if when is None:
+                continue
+            entry = (rule, compile_condition(when))
+            targets = rule.get("applies_to")
+            if not targets:
+                wildcard.append(entry)
+                continue
+            for action in ([targets] if isinstance(targets, str) else targets):
+                by_action.setdefault(action, []).append(entry)
+        self._data, self._by_action, self._wildcard = data, by_action, wildcard
+        self._key = key
+        self.loads += 1
+
+    def rules(self) -> list[dict]:
+        with self._lock:
+            self._refresh()
+            return [dict(r) for r in self._data.get("rules", [])]
+
+    def parameters(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return json.loads(json.dumps(self._data.get("parameters", {})))
+
+    def check(self, action_context: dict) -> list[dict]:
+        with self._lock:
+            self._refresh()
+            candidates = self._by_action.get(action_context.get("action"), []) + self._wildcard
+        return [dict(rule) for rule, pred in candidates if pred(action_context)]
+
+
+_engine = RuleEngine()
+
+
+def get_engine() -> RuleEngine:
+    return _engine
+
 
 def load_rules():
-    if not os.path.exists(RULES_PATH):
-        raise FileNotFoundError(f"Rules file not found: {RULES_PATH}")
-    with open(RULES_PATH, encoding="utf-8") as f:
-        return json.load(f).get("rules", [])
+    return _engine.rules()
+
+
+def load_parameters() -> dict:
+    """kai_rules.json の "parameters"（ondemand の上限など）"""
+    return _engine.parameters()
 
 @kai_capability(
     id="enforce_rules",
@@ -29,29 +180,4 @@ def enforce_rules(action_context: dict) -> list:
 
     Returns: 違反したルールの一覧（空リストなら問題なし）
     """
-    rules = load_rules()
-    violations = []
-
-    for rule in rules:
-        rid = rule.get("id")
-        desc = rule.get("description", "")
-        scope = rule.get("scope")
-
-        # 例：特定ルールに対する簡易チェック（拡張可）
-        if rid == "kai-on-demand-doc-block":
-            if action_context.get("action") in ["propose_doc_update", "apply_update"] and \
-               action_context.get("doc_type") == "ondemand":
-                violations.append(rule)
-
-        elif rid == "kai-update-propose-approval":
-            if action_context.get("action") == "apply_update" and not action_context.get("approved", False):
-                violations.append(rule)
-
-        elif rid == "kai-single-doc-single-commit":
-            if action_context.get("action") == "try_git_commit" and \
-               action_context.get("modified_docs", 0) > 1:
-                violations.append(rule)
-
-        # TODO: 追加ルールチェック（将来）
-
-    return violations
+    return _engine.check(action_context)
@@ -0,0 +1,223 @@
+# core/fs_walker.py – 共通ファイルツリー走査
+"""
+structure_scanner / file_catalog / master_snapshot / extract_inventory が共有する走査器。
+
+* os.scandir ベース。除外ディレクトリには降りない（走査後に捨てるのではなく、降りる前に刈る）
+* 除外ルール:
+  - skip_dirs            : ディレクトリ名で除外（既定 {".git"}）
+  - ignore_files         : .gitignore / .dslignore 形式（gitwildmatch）をコンパイル済み正規表現で判定
+  - whitelist            : data/dir_whitelist.json 形式の前方一致リスト（"" は全体）
+* workers > 0 ならトップレベルのサブツリーをスレッドプールで並列に走査する
+  （出力順は逐次走査と同じ）
+* WalkEntry に stat 結果を持たせるので、呼び出し側で再度 stat する必要はない
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator
+
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+WHITELIST_PATH: Path = PROJECT_ROOT / "data" / "dir_whitelist.json"
+DEFAULT_SKIP_DIRS = frozenset({".git"})
+
+
+@dataclass
+class WalkEntry:
+    path: str            # 絶対パス
+    rel: str             # root からの相対パス（"/" 区切り）
+    name: str
+    is_dir: bool
+    stat: os.stat_result
+
+# ---------------------------------------------------------------------------
+# gitignore 形式のマッチャ
+# ---------------------------------------------------------------------------
+
+def _translate(pattern: str) -> str:
+    """gitwildmatch パターン（先頭 / と末尾 / は除去済み）を正規表現に変換"""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                i += 2
+                if i < n and pattern[i] == "/":
+                    out.append("(?:.*/)?")      # "**/" は 0 個以上のディレクトリ
+                    i += 1
+                else:
+                    out.append(".*")
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = pattern.find("]", i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreMatcher:
+    """.gitignore 形式のルール集合。後に書かれたルールが優先（! で再包含）。
+
+    ディレクトリはマッチした時点で刈り込むので、"dir/" 形式のルールは
+    ディレクトリ判定（is_dir=True）にのみ適用する。
+    """
+
+    def __init__(self, lines: Iterable[str] = ()):
+        self._rules: list[tuple[re.Pattern, bool, bool]] = []   # (regex, negate, dir_only)
+        for raw in lines:
+            line = raw.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            body = _translate(line.lstrip("/"))
+            prefix = "" if anchored else "(?:.*/)?"
+            self._rules.append((re.compile(f"^{prefix}{body}$"), negate, dir_only))
+        # 否定ルールが無ければ 1 本の正規表現にまとめる
+        self._combined: tuple[re.Pattern | None, re.Pattern | None] | None = None
+        if not any(neg for _, neg, _ in self._rules):
+            def join(rules):
+                return re.compile("|".join(f"(?:{r.pattern})" for r in rules)) if rules else None
+            self._combined = (join([r for r, _, d in self._rules if not d]),
+                              join([r for r, _, d in self._rules if d]))
+
+    @classmethod
+    def from_files(cls, paths: Iterable[Path]) -> "IgnoreMatcher":
+        lines: list[str] = []
+        for p in paths:
+            try:
+                lines += Path(p).read_text(encoding="utf-8").splitlines()
+            except FileNotFoundError:
+                continue
+        return cls(lines)
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def match(self, rel: str, is_dir: bool = False) -> bool:
+        if is_dir:
+            rel += "/"   # "dir/**" 形式のルールで中身ごと刈り込めるように
+        if self._combined is not None:
+            plain, dirs = self._combined
+            return bool((plain is not None and (plain.match(rel) or (is_dir and plain.match(rel[:-1]))))
+                        or (is_dir and dirs is not None and dirs.match(rel[:-1])))
+        ignored = False
+        for regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel) or (is_dir and regex.match(rel[:-1])):
+                ignored = not negate
+        return ignored
+
+
+def load_whitelist(path: Path = WHITELIST_PATH) -> list[str] | None:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+# ---------------------------------------------------------------------------
+# 走査
+# ---------------------------------------------------------------------------
+
+class Walker:
+    def __init__(self, root: str | Path = PROJECT_ROOT, *,
+                 skip_dirs: Iterable[str] = DEFAULT_SKIP_DIRS,
+                 ignore_files: Iterable[str] = (),
+                 whitelist: list[str] | None = None,
+                 include_dirs: bool = False,
+                 workers: int = 0):
+        self.root = os.path.abspath(root)
+        self.skip_dirs = frozenset(skip_dirs)
+        self.ignore = IgnoreMatcher.from_files(Path(self.root) / f for f in ignore_files)
+        self.whitelist = [w.strip("/") for w in whitelist] if whitelist is not None else None
+        self.include_dirs = include_dirs
+        self.workers = workers
+
+    def _dir_allowed(self, rel: str) -> bool:
+        if self.whitelist is None:
+            return True
+        # ホワイトリスト配下か、ホワイトリストへ向かう途中のディレクトリ
+        return any(w == "" or rel == w or rel.startswith(w + "/") or w.startswith(rel + "/")
+                   for w in self.whitelist)
+
+    def _file_allowed(self, rel: str) -> bool:
+        if self.whitelist is None:
+            return True
+        return any(w == "" or rel.startswith(w + "/") for w in self.whitelist)
+
+    def _list(self, path: str, rel: str) -> tuple[list[WalkEntry], list[WalkEntry]]:
+        """1 階層分を (ファイル, ディレクトリ) に分けて返す（除外済み）"""
+        files: list[WalkEntry] = []
+        dirs: list[WalkEntry] = []
+        try:
+            it = os.scandir(path)
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            return files, dirs
+        with it:
+            for entry in it:
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name in self.skip_dirs or not self._dir_allowed(child):
+                            continue
+                        if self.ignore and self.ignore.match(child, is_dir=True):
+                            continue
+                        dirs.append(WalkEntry(entry.path, child, entry.name, True,
+                                              entry.stat(follow_symlinks=False)))
+                    else:
+                        if not self._file_allowed(child):
+                            continue
+                        if self.ignore and self.ignore.match(child):
+                            continue
+                        files.append(WalkEntry(entry.path, child, entry.name, False, entry.stat()))
+                except (FileNotFoundError, PermissionError):
+                    continue   # 走査中に消えたファイル
+        return files, dirs
+
+    def _scan(self, path: str, rel: str) -> Iterator[WalkEntry]:
+        files, dirs = self._list(path, rel)
+        yield from files
+        for d in dirs:
+            if self.include_dirs:
+                yield d
+            yield from self._scan(d.path, d.rel)
+
+    def __iter__(self) -> Iterator[WalkEntry]:
+        if self.workers <= 0:
+            yield from self._scan(self.root, "")
+            return
+        # ルート直下だけ逐次に読み、各サブツリーは並列に走査して元の順で返す
+        files, dirs = self._list(self.root, "")
+        yield from files
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(lambda d=d: list(self._scan(d.path, d.rel))) for d in dirs]
+            for d, fut in zip(dirs, futures):
+                if self.include_dirs:
+                    yield d
+                yield from fut.result()
+
+
+def walk(root: str | Path = PROJECT_ROOT, **kwargs) -> Iterator[WalkEntry]:
+    """Walker(root, **kwargs) を走査するショートカット"""
+    return iter(Walker(root, **kwargs))
@@ -2,20 +2,31 @@
 """
 ▶ 更新概要
 * conversations/*.md → conversations/*.json へ完全移行
+* conversations/*.jsonl（追記専用ログ）にも対応
 * check_unprocessed_logs() / push_all_important_files() の glob 修正
 * append 用のラッパー commit_and_push_log() を追加（1 会話1 push）
+* commit_and_push_log() をバックグラウンドのバッチコミットキュー経由に変更
+  （COMMIT_WINDOW 秒 / COMMIT_MAX_MESSAGES 件ごとに 1 commit + 1 push、push はバックオフ付きリトライ）
+* master_snapshot.json の再生成はプロセス内・バックグラウンド（debounce 付き）で行う
+* git を操作する処理はすべて GIT_LOCK で直列化する（index.lock の競合を防ぐ）
 
 Kai Bot が安全に git pull / add / commit / push を行うユーティリティをまとめる。
 既存 capability ID などは温存。
 """
 from __future__ import annotations
 
+import atexit
 import json
 import os
 import subprocess, sys
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
+from typing import Callable
 from core.capabilities_registry import kai_capability
-from core.snapshot_utils import regenerate_master_snapshot
+from core.conversation_log import list_log_files
+from core.snapshot_utils import regenerate_master_snapshot, wait_for_snapshot
 
 # ---------------------------------------------------------------------------
 # 定数
@@ -27,6 +38,16 @@ FLAG_PATH: Path = PROJECT_ROOT / "check_flags" / "processed_logs.json"
 # GitHub Personal Access Token (環境変数に設定)
 github_token: str = os.getenv("GITHUB_TOKEN", "")
 
+# 会話ログのバッチコミット設定
+COMMIT_WINDOW: float = float(os.getenv("KAI_COMMIT_WINDOW", "30"))        # 秒
+COMMIT_MAX_MESSAGES: int = int(os.getenv("KAI_COMMIT_MAX_MESSAGES", "10"))
+PUSH_MAX_RETRIES: int = int(os.getenv("KAI_PUSH_MAX_RETRIES", "4"))
+PUSH_BACKOFF: float = float(os.getenv("KAI_PUSH_BACKOFF", "2.0"))          # 秒（指数バックオフの基数）
+
+# プロセス内の git 操作（pull / add / commit / push）を直列化するロック。
+# check_unprocessed_logs() → try_git_commit() のように入れ子で呼ばれるので RLock
+GIT_LOCK = threading.RLock()
+
 # ---------------------------------------------------------------------------
 # Git Pull – セーフモード
 # ---------------------------------------------------------------------------
@@ -38,12 +59,17 @@ github_token: str = os.getenv("GITHUB_TOKEN", "")
 )
 def try_git_pull_safe() -> None:
     """安全に git pull --rebase する。"""
+    with GIT_LOCK:
+        _git_pull_safe()
+
+
+def _git_pull_safe() -> None:
     try:
         subprocess.run(["git", "stash", "--include-untracked"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         subprocess.run(["git", "pull", "--rebase", "origin", "main"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         subprocess.run(["git", "stash", "pop"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print("✅ Git pull 完了", flush=True)
-        regenerate_master_snapshot()
+        regenerate_master_snapshot(background=True)
     except subprocess.CalledProcessError as e:
         print("❌ Git pull 失敗:", e, flush=True)
 
@@ -58,6 +84,11 @@ def try_git_pull_safe() -> None:
 )
 def try_git_commit(file_path: str) -> None:
     """指定ファイルを add → commit → push する汎用関数"""
+    with GIT_LOCK:
+        _git_commit_file(file_path)
+
+
+def _git_commit_file(file_path: str) -> None:
     full_path = Path(file_path).resolve()
     if not full_path.exists():
         print(f"❌ ファイルが存在しません: {full_path}", flush=True)
@@ -73,7 +104,7 @@ def try_git_commit(file_path: str) -> None:
         print("❌ git add エラー:", result.stderr, flush=True)
         return
 
-    regenerate_master_snapshot()
+    regenerate_master_snapshot(background=True)
 
     subprocess.run(["git", "commit", "-m", f"Update {full_path.name}"], check=True)
     subprocess.run(["git", "push", f"https://{github_token}@github.com/HirakuArai/vpm-ariade.git"], check=True)
@@ -82,9 +113,247 @@ def try_git_commit(file_path: str) -> None:
 # 会話ログ 1 ファイルを即時 push（新規）
 # ---------------------------------------------------------------------------
 
-def commit_and_push_log(log_path: str) -> None:
-    """JSON 会話ログファイルを 1 会話ごとに即 push するヘルパ"""
-    try_git_commit(log_path)
+def commit_and_push_log(log_path: str, *, messages: int = 1, sync: bool = False) -> None:
+    """会話ログをバッチコミットキューへ積むヘルパ（即時 return）。
+
+    sync=True の場合は従来どおりその場で add → commit → push する。
+    """
+    if sync:
+        try_git_commit(log_path)
+        return
+    get_log_commit_queue().enqueue(log_path, messages=messages)
+
+# ---------------------------------------------------------------------------
+# 会話ログ バッチコミットキュー
+# ---------------------------------------------------------------------------
+
+def _remote_url() -> str:
+    return f"https://{github_token}@github.com/HirakuArai/vpm-ariade.git"
+
+
+def _commit_paths(paths: list[Path], message: str) -> bool:
+    """paths を add → snapshot 再生成 → commit する。コミットしたら True。"""
+    subprocess.run(["git", "config", "--global", "user.name", "Kai Bot"], check=True)
+    subprocess.run(["git", "config", "--global", "user.email", "kai@example.com"], check=True)
+    subprocess.run(["git", "add", "--", *map(str, paths)], check=True)
+    regenerate_master_snapshot(background=True)
+    staged = subprocess.run(["git", "diff", "--cached", "--quiet"])
+    if staged.returncode == 0:
+        return False
+    subprocess.run(["git", "commit", "-m", message], check=True)
+    return True
+
+
+def _push() -> None:
+    subprocess.run(["git", "push", _remote_url()], check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class LogCommitQueue:
+    """会話ログの変更を溜めて、まとめて commit / push するバックグラウンドワーカ。
+
+    * 最初の enqueue から window 秒経過、または max_messages 件到達でバッチを確定
+    * 1 バッチにつき 1 commit + 1 push。push 失敗は指数バックオフでリトライし、
+      それでも失敗した場合は次のバッチで再 push する
+    * commit に失敗したバッチは捨てずに pending に戻し、window 秒後に再試行する
+    * status() でキュー深さと最終 push 状態を返す（UI 表示用）
+    """
+
+    def __init__(self, window: float = COMMIT_WINDOW, max_messages: int = COMMIT_MAX_MESSAGES,
+                 max_retries: int = PUSH_MAX_RETRIES, backoff: float = PUSH_BACKOFF,
+                 commit_fn: Callable[[list[Path], str], bool] = _commit_paths,
+                 push_fn: Callable[[], None] = _push):
+        self.window = window
+        self.max_messages = max_messages
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._commit_fn = commit_fn
+        self._push_fn = push_fn
+
+        self._cond = threading.Condition()
+        self._pending: dict[Path, int] = {}
+        self._first_at: float | None = None
+        self._flush_requested = False
+        self._busy = False
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+
+        self._hold_until = 0.0   # commit 失敗後はこの時刻まで（flush 以外では）再試行しない
+
+        self._unpushed = False
+        self.batches = 0
+        self.commit_failures = 0
+        self.last_push_at: str | None = None
+        self.last_push_ok: bool | None = None
+        self.last_error: str | None = None
+
+    # ── producer 側 ─────────────────────────────
+    def enqueue(self, path: str | Path, messages: int = 1) -> None:
+        path = Path(path).resolve()
+        with self._cond:
+            self._pending[path] = self._pending.get(path, 0) + messages
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """溜まっている変更を即座にコミットさせ、完了まで待つ。
+
+        commit と push まで済めば True。commit / push の失敗・タイムアウトは False
+        （push 失敗時の詳細は status() の last_push_ok / last_error）。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._pending and not self._busy and not self._unpushed:
+                return True
+            failures = self.commit_failures
+            self._flush_requested = True
+            self._ensure_worker()
+            self._cond.notify_all()
+            while self._pending or self._busy or self._flush_requested:
+                if self.commit_failures != failures:
+                    return False   # commit に失敗（変更は pending に残っている）
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._unpushed   # commit できても push できていなければリモートには無い
+
+    def stop(self, flush: bool = True, timeout: float | None = None) -> None:
+        if flush:
+            self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "queue_depth": sum(self._pending.values()),
+                "pending_files": sorted(p.name for p in self._pending),
+                "busy": self._busy,
+                "unpushed": self._unpushed,
+                "batches": self.batches,
+                "last_push_at": self.last_push_at,
+                "last_push_ok": self.last_push_ok,
+                "last_error": self.last_error,
+            }
+
+    # ── worker 側 ───────────────────────────────
+    def _ensure_worker(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="kai-log-commit", daemon=True)
+            self._thread.start()
+
+    def _batch_ready(self) -> bool:
+        if self._flush_requested:
+            return True
+        if not self._pending:
+            return False
+        if time.monotonic() < self._hold_until:
+            return False
+        if sum(self._pending.values()) >= self.max_messages:
+            return True
+        return time.monotonic() - self._first_at >= self.window
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and not self._batch_ready():
+                    timeout = None
+                    if self._first_at is not None:
+                        timeout = max(0.0, self.window - (time.monotonic() - self._first_at))
+                    self._cond.wait(timeout)
+                if self._stopped and not self._pending:
+                    return
+                batch = self._pending
+                self._pending = {}
+                self._first_at = None
+                self._busy = True
+
+            ok = False
+            try:
+                ok = self._process(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    if not self._pending:
+                        self._flush_requested = False
+                    self._cond.notify_all()
+                    if self._stopped and not ok:
+                        return   # 終了時に commit できない変更は作業ツリーに残す
+
+    def _process(self, batch: dict[Path, int]) -> bool:
+        """バッチを commit / push する。commit に失敗したらバッチを戻して False。"""
+        if batch:
+            n_msgs = sum(batch.values())
+            names = ", ".join(sorted(p.name for p in batch))
+            try:
+                with GIT_LOCK:
+                    committed = self._commit_fn(list(batch), f"Update conversation logs ({n_msgs} messages: {names})")
+            except Exception as e:
+                self.last_error = f"commit: {e}"
+                print("❌ 会話ログのコミット失敗（次のウィンドウで再試行）:", e, flush=True)
+                self._requeue(batch)
+                return False
+            if committed:
+                self._unpushed = True
+                self.batches += 1
+        if self._unpushed:
+            self._push_with_retry()
+        return True
+
+    def _requeue(self, batch: dict[Path, int]) -> None:
+        """コミットできなかったバッチを pending に戻し、window 秒後に再試行させる"""
+        with self._cond:
+            for path, n in batch.items():
+                self._pending[path] = self._pending.get(path, 0) + n
+            self._first_at = time.monotonic()
+            self._hold_until = self._first_at + self.window
+            self._flush_requested = False
+            self.commit_failures += 1
+
+    def _push_with_retry(self) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with GIT_LOCK:
+                    self._push_fn()
+            except Exception as e:
+                self.last_error = f"push: {e}"
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+                    continue
+                self.last_push_ok = False
+                self.last_push_at = datetime.now().isoformat(timespec="seconds")
+                print("❌ 会話ログの push 失敗（次バッチで再試行）:", e, flush=True)
+                return
+            self._unpushed = False
+            self.last_push_ok = True
+            self.last_push_at = datetime.now().isoformat(timespec="seconds")
+            self.last_error = None
+            print("✅ 会話ログを push しました", flush=True)
+            return
+
+
+_log_commit_queue: LogCommitQueue | None = None
+_queue_guard = threading.Lock()
+
+
+def get_log_commit_queue() -> LogCommitQueue:
+    """プロセス共有の LogCommitQueue を返す（初回呼び出し時に生成）。"""
+    global _log_commit_queue
+    with _queue_guard:
+        if _log_commit_queue is None:
+            _log_commit_queue = LogCommitQueue()
+            atexit.register(_log_commit_queue.stop, True, 60)
+        return _log_commit_queue
+
+
+def log_commit_status() -> dict:
+    """UI 表示用: バッチコミットキューの状態を返す。"""
+    return get_log_commit_queue().status()
 
 # ---------------------------------------------------------------------------
 # 未処理ログチェック (JSON 版)
@@ -99,12 +368,17 @@ def commit_and_push_log(log_path: str) -> None:
 )
 def check_unprocessed_logs() -> None:
     print(" check_unprocessed_logs() 開始", flush=True)
+    with GIT_LOCK:
+        _check_unprocessed_logs()
+
+
+def _check_unprocessed_logs() -> None:
     try:
         flags: dict[str, str] = {}
         if FLAG_PATH.exists():
             flags = json.loads(FLAG_PATH.read_text(encoding="utf-8"))
 
-        files = sorted(f.name for f in CONV_DIR.glob("conversation_*.json"))
+        files = [f.name for f in list_log_files(CONV_DIR)]
         updated = False
 
         for file in files:
@@ -133,15 +407,23 @@ def check_unprocessed_logs() -> None:
     requires_confirm=True,
 )
 def push_all_important_files() -> None:
+    with GIT_LOCK:
+        _push_all_important_files()
+
+
+def _push_all_important_files() -> None:
     try:
         subprocess.run(["git", "config", "--global", "user.name", "Kai Bot"], check=True)
         subprocess.run(["git", "config", "--global", "user.email", "kai@example.com"], check=True)
 
+        wait_for_snapshot(timeout=60)   # output/master_snapshot.json を最新にしてから add
+
         include_paths = [
             "data/*.json",
             "data/structure_snapshot.json",
             "output/*.json",
             "conversations/*.json",  # ← md → json
+            "conversations/*.jsonl",
             "logs/*.log",
             "docs/*.md",
             "core/**/*.py",
@@ -0,0 +1,120 @@
+# core/history_window.py – 会話履歴のトークン予算管理
+"""
+チャット 1 リクエストに載せる会話履歴をトークン予算内に収める。
+
+* mode="trim"    : 予算を超えた古いターンを捨てる
+* mode="summary" : 捨てたターンをローリング要約（system メッセージ 1 件）に置き換える。
+                   要約はインスタンスにキャッシュし、新たに溢れた分だけ追加要約する
+* トークン数は core.token_utils（scripts/check_tokens.py と同じ tiktoken 方式）で数える
+* build_messages() はリクエストごとのトークン内訳も返す
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Callable
+
+from core.token_utils import count_tokens
+
+HISTORY_TOKEN_BUDGET: int = int(os.getenv("KAI_HISTORY_TOKEN_BUDGET", "6000"))
+HISTORY_MODE: str = os.getenv("KAI_HISTORY_MODE", "trim")
+SUMMARY_MODEL: str = os.getenv("KAI_SUMMARY_MODEL", "gpt-4o-mini")
+
+SUMMARY_PREFIX = "これまでの会話の要約:\n"
+
+SUMMARY_PROMPT = """あなたは会話ログの要約係です。
+既存の要約と新しい会話を統合し、決定事項・未解決の質問・前提条件を落とさずに
+日本語の箇条書きで簡潔に要約してください。
+
+[既存の要約]
+{summary}
+
+[新しい会話]
+{conversation}
+"""
+
+# 1 メッセージあたりのフォーマット上のオーバーヘッド（token_utils.count_message_tokens と同じ）
+_MSG_OVERHEAD = 4
+
+
+def llm_summarize(messages: list[dict], previous: str) -> str:
+    """既定の要約器: llm_client 経由で要約を更新する。"""
+    from core import llm_client
+    from core.log_utils import messages_to_text
+    prompt = SUMMARY_PROMPT.format(summary=previous or "（なし）",
+                                   conversation=messages_to_text(messages))
+    return llm_client.chat([{"role": "user", "content": prompt}],
+                           model=SUMMARY_MODEL, temperature=0).strip()
+
+
+@dataclass
+class HistoryWindow:
+    budget: int = HISTORY_TOKEN_BUDGET
+    mode: str = HISTORY_MODE
+    summarizer: Callable[[list[dict], str], str] = llm_summarize
+    min_recent: int = 2  # 予算に関わらず残す直近メッセージ数
+
+    summary: str = ""
+    summarized_upto: int = 0  # history[:summarized_upto] は要約済み
+    _tokens: list[int] = field(default_factory=list, repr=False)
+
+    def _message_tokens(self, history: list[dict]) -> list[int]:
+        # 履歴は末尾追記のみなので、位置ごとのトークン数をキャッシュして差分だけ数える
+        if len(history) < len(self._tokens):
+            self._tokens = []
+        for m in history[len(self._tokens):]:
+            self._tokens.append(count_tokens(m.get("content") or "") + _MSG_OVERHEAD)
+        return self._tokens
+
+    def _cut_index(self, history: list[dict], budget: int) -> int:
+        """予算内に収まる最古の位置（user 発言の境界）を返す。"""
+        tokens = self._message_tokens(history)
+        used, cut = 0, len(history)
+        for i in range(len(history) - 1, -1, -1):
+            if used + tokens[i] > budget and len(history) - i > self.min_recent:
+                break
+            used += tokens[i]
+            cut = i
+        # assistant 発言から始まらないよう user 境界まで進める
+        while cut < len(history) - self.min_recent and history[cut].get("role") != "user":
+            cut += 1
+        return cut
+
+    def select(self, history: list[dict]) -> list[dict]:
+        """予算内に収めた履歴（summary モードなら先頭に要約メッセージ）を返す。"""
+        budget = self.budget
+        if self.mode == "summary" and self.summary:
+            budget -= count_tokens(SUMMARY_PREFIX + self.summary) + _MSG_OVERHEAD
+        cut = self._cut_index(history, max(budget, 0))
+
+        if self.mode != "summary":
+            return list(history[cut:])
+
+        if cut > self.summarized_upto:
+            self.summary = self.summarizer(history[self.summarized_upto:cut], self.summary)
+            self.summarized_upto = cut
+        kept = history[max(cut, self.summarized_upto):]
+        if not self.summary:
+            return list(kept)
+        return [{"role": "system", "content": SUMMARY_PREFIX + self.summary}] + list(kept)
+
+    def build_messages(self, system_prompt: str, history: list[dict],
+                       user_input: str) -> tuple[list[dict], dict]:
+        """chat.completions 用 messages と、そのトークン内訳を返す。"""
+        window = self.select(history)
+        system_tokens = count_tokens(system_prompt) + _MSG_OVERHEAD
+        history_tokens = sum(count_tokens(m["content"]) + _MSG_OVERHEAD for m in window)
+        user_tokens = count_tokens(user_input) + _MSG_OVERHEAD
+        messages = [{"role": "system", "content": system_prompt}] + window + \
+                   [{"role": "user", "content": user_input}]
+        stats = {
+            "system_tokens": system_tokens,
+            "history_tokens": history_tokens,
+            "user_tokens": user_tokens,
+            "total_tokens": system_tokens + history_tokens + user_tokens + 2,
+            "history_budget": self.budget,
+            "kept_messages": len(window) - (1 if window and window[0]["role"] == "system" else 0),
+            "dropped_messages": len(history) - len([m for m in window if m["role"] != "system"]),
+            "summarized": bool(self.summary) and self.mode == "summary",
+        }
+        return messages, stats
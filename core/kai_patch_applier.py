@@ -1,7 +1,7 @@
 from core.markdown_utils import extract_code_from_markdown
 from core.code_rewriter import replace_function_in_source
 from core.git_ops import try_git_commit
-from core.patch_log import log_patch
+from core.patch_log import log_patch, LOG_PATH as PATCH_LOG_PATH
 import os
 
 from core.capabilities_registry import kai_capability
@@ -34,7 +34,7 @@ def apply_gpt_patch(markdown_text: str, fn_name: str, source_path: str = "app.py
 
         if auto_commit:
             try_git_commit(source_path)
-            if os.path.exists("patch_history.json"):
-                try_git_commit("patch_history.json")
+            if os.path.exists(PATCH_LOG_PATH):
+                try_git_commit(PATCH_LOG_PATH)
 
     return success
@@ -0,0 +1,131 @@
+# core/llm_cache.py – LLM 応答のコンテンツアドレス型キャッシュ
+"""
+決定的（temperature 0 / 低温度）な LLM 呼び出しの応答をディスクにキャッシュする。
+
+* キー   : sha256(backend, model, messages, params)
+* 保存先 : .cache/llm_cache.sqlite3（KAI_LLM_CACHE_DIR で変更可）
+* 容量   : KAI_LLM_CACHE_MAX_BYTES を超えたら最終アクセスが古い順に削除（LRU）
+* 期限   : KAI_LLM_CACHE_TTL 秒を過ぎたエントリはミス扱いで削除
+* バイパス: KAI_LLM_CACHE_BYPASS=1 で読み出しをスキップ（書き込みは行い、結果を更新する）
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+CACHE_DIR: Path = Path(os.getenv("KAI_LLM_CACHE_DIR", str(PROJECT_ROOT / ".cache")))
+CACHE_MAX_BYTES: int = int(os.getenv("KAI_LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL: float = float(os.getenv("KAI_LLM_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+def bypass_enabled() -> bool:
+    return os.getenv("KAI_LLM_CACHE_BYPASS", "") not in ("", "0", "false", "False")
+
+
+def cache_key(backend: str, model: str, messages: list[dict], params: dict) -> str:
+    payload = json.dumps({"backend": backend, "model": model, "messages": messages, "params": params},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: Path | None = None, max_bytes: int = CACHE_MAX_BYTES, ttl: float = CACHE_TTL):
+        self.path = Path(path) if path else CACHE_DIR / "llm_cache.sqlite3"
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created REAL NOT NULL,
+                                accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO responses (key, value, size, created, accessed) "
+                       "VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now))
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        if self.ttl:
+            db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 最終アクセスの古い順に、上限の 90% を下回るまで削除
+        target = int(self.max_bytes * 0.9)
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= target:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses,
+                "path": str(self.path)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM responses")
+            self._db().commit()
+
+
+_default_cache: LLMCache | None = None
+
+
+def get_cache() -> LLMCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LLMCache()
+    return _default_cache
+
+
+def set_cache(cache: LLMCache | None) -> None:
+    """既定キャッシュを差し替える（テスト用）。"""
+    global _default_cache
+    _default_cache = cache
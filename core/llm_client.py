@@ -0,0 +1,305 @@
+# core/llm_client.py – LLM 呼び出しの共通レイヤ
+"""
+Kai から LLM を呼ぶときの唯一の窓口。
+
+* OpenAIBackend  : openai-python v1.x の chat.completions（ストリーミング対応）。
+                   httpx のコネクションプールを共有し、タイムアウトを設定する
+* FakeLLMBackend : ネットワーク不要の決定的スタブ（オフラインでのテスト・ベンチマーク用）
+* 環境変数 KAI_LLM_BACKEND=fake でスタブに切り替わる（既定は openai）
+* 一時的なエラー（429 / 5xx / 接続・タイムアウト）は指数バックオフでリトライ
+* 呼び出しごとのレイテンシ・トークン数を metrics に記録（metrics_summary() で集計）
+* chat(..., cache=True) で応答をディスクキャッシュ（core.llm_cache）から返す
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Callable, Iterator
+
+from core import llm_cache
+from core.token_utils import count_message_tokens, count_tokens
+
+DEFAULT_MODEL = "gpt-4.1"
+
+LLM_TIMEOUT: float = float(os.getenv("KAI_LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES: int = int(os.getenv("KAI_LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF: float = float(os.getenv("KAI_LLM_BACKOFF", "1.0"))
+LLM_MAX_CONNECTIONS: int = int(os.getenv("KAI_LLM_MAX_CONNECTIONS", "10"))
+
+_RETRYABLE_STATUS = {408, 409, 429}
+_RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError",
+                     "InternalServerError", "ConnectError", "ReadTimeout", "TimeoutException"}
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class OpenAIBackend:
+    name = "openai"
+
+    def __init__(self, api_key: str | None = None, timeout: float = LLM_TIMEOUT):
+        import httpx
+        from openai import OpenAI
+        # 1 プロセス 1 クライアント: keep-alive 接続を使い回す（リトライはこのモジュールで行う）
+        self.http_client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_CONNECTIONS),
+        )
+        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"),
+                             http_client=self.http_client, timeout=timeout, max_retries=0)
+
+    def complete(self, messages: list[dict], model: str, **params) -> tuple[str, dict]:
+        resp = self.client.chat.completions.create(model=model, messages=messages, **params)
+        usage = getattr(resp, "usage", None)
+        tokens = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+        }
+        return resp.choices[0].message.content or "", tokens
+
+    def stream(self, messages: list[dict], model: str, **params) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=model, messages=messages, stream=True, **params)
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+class FakeLLMBackend:
+    """決定的な応答を返すスタブ。同じ入力には常に同じ出力を返す。
+
+    既定では最後の user メッセージをエコーする。responder(messages, model) を渡せば
+    任意の固定応答（JSON など）を返せる。stream は chunk_size 文字ずつ、
+    delay 秒間隔（KAI_FAKE_LLM_DELAY）で返す。
+    """
+    name = "fake"
+
+    def __init__(self, chunk_size: int = 8, delay: float | None = None,
+                 responder: Callable[[list[dict], str], str] | None = None):
+        self.chunk_size = chunk_size
+        self.delay = float(os.getenv("KAI_FAKE_LLM_DELAY", "0")) if delay is None else delay
+        self.responder = responder
+        self.calls = 0
+
+    def reply_for(self, messages: list[dict], model: str) -> str:
+        if self.responder:
+            return self.responder(messages, model)
+        last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        return f"[fake:{model}] {last_user}"
+
+    def complete(self, messages: list[dict], model: str, **params) -> tuple[str, dict]:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        text = self.reply_for(messages, model)
+        return text, {"prompt_tokens": count_message_tokens(messages),
+                      "completion_tokens": count_tokens(text)}
+
+    def stream(self, messages: list[dict], model: str, **params) -> Iterator[str]:
+        self.calls += 1
+        text = self.reply_for(messages, model)
+        for i in range(0, len(text), self.chunk_size):
+            if self.delay:
+                time.sleep(self.delay)
+            yield text[i:i + self.chunk_size]
+
+
+_BACKENDS = {"openai": OpenAIBackend, "fake": FakeLLMBackend}
+_backend = None
+_backend_lock = threading.Lock()
+_api_key: str | None = None
+
+
+def configure(api_key: str | None = None, backend: str | None = None) -> None:
+    """API キー / バックエンドを設定し、次回 get_backend() で作り直させる。
+
+    設定に変化が無ければ何もしない（Streamlit の rerun ごとに呼んでよい）。
+    """
+    global _backend, _api_key
+    if api_key == _api_key and (backend is None or backend == backend_name()):
+        return
+    _api_key = api_key
+    if backend:
+        os.environ["KAI_LLM_BACKEND"] = backend
+    _backend = None
+
+
+def set_backend(backend) -> None:
+    """任意のバックエンドインスタンスを差し込む（テスト用）。"""
+    global _backend
+    _backend = backend
+
+
+def backend_name() -> str:
+    return os.getenv("KAI_LLM_BACKEND", "openai").lower()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = backend_name()
+            if name not in _BACKENDS:
+                raise ValueError(f"未知の LLM バックエンドです: {name}")
+            _backend = OpenAIBackend(_api_key) if name == "openai" else _BACKENDS[name]()
+        return _backend
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+@dataclass
+class CallRecord:
+    tag: str
+    backend: str
+    model: str
+    latency_ms: float
+    prompt_tokens: int | None
+    completion_tokens: int | None
+    retries: int
+    ok: bool
+    stream: bool = False
+    cached: bool = False
+
+
+_metrics: deque[CallRecord] = deque(maxlen=int(os.getenv("KAI_LLM_METRICS_SIZE", "1000")))
+
+
+def recent_calls(n: int | None = None) -> list[dict]:
+    calls = list(_metrics)
+    return [asdict(c) for c in (calls[-n:] if n else calls)]
+
+
+def metrics_summary() -> dict:
+    """タグ別の呼び出し回数・平均/最大レイテンシ・トークン合計"""
+    summary: dict[str, dict] = {}
+    for c in list(_metrics):
+        s = summary.setdefault(c.tag, {"calls": 0, "cache_hits": 0, "errors": 0, "retries": 0,
+                                       "total_ms": 0.0, "max_ms": 0.0,
+                                       "prompt_tokens": 0, "completion_tokens": 0})
+        s["calls"] += 1
+        s["cache_hits"] += 1 if c.cached else 0
+        s["errors"] += 0 if c.ok else 1
+        s["retries"] += c.retries
+        s["total_ms"] += c.latency_ms
+        s["max_ms"] = max(s["max_ms"], c.latency_ms)
+        s["prompt_tokens"] += c.prompt_tokens or 0
+        s["completion_tokens"] += c.completion_tokens or 0
+    for s in summary.values():
+        s["avg_ms"] = round(s["total_ms"] / s["calls"], 1)
+    return summary
+
+
+def reset_metrics() -> None:
+    _metrics.clear()
+
+# ---------------------------------------------------------------------------
+# リトライ
+# ---------------------------------------------------------------------------
+
+def _is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int) and (status in _RETRYABLE_STATUS or status >= 500):
+        return True
+    return type(exc).__name__ in _RETRYABLE_ERRORS
+
+
+def _sleep_backoff(attempt: int) -> None:
+    if LLM_BACKOFF:
+        time.sleep(LLM_BACKOFF * (2 ** attempt))
+
+# ---------------------------------------------------------------------------
+# 呼び出し API
+# ---------------------------------------------------------------------------
+
+def chat(messages: list[dict], model: str = DEFAULT_MODEL, *, tag: str = "default",
+         max_retries: int | None = None, cache: bool = False, **params) -> str:
+    """chat.completions を 1 回呼んで応答テキストを返す（リトライ・計測付き）。
+
+    params は temperature / max_tokens など chat.completions.create にそのまま渡す。
+    cache=True の場合、同じ (backend, model, messages, params) の応答をキャッシュから返す。
+    決定的な呼び出し（temperature 0 / 低温度）にのみ使うこと。
+    """
+    backend = get_backend()
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    start = time.perf_counter()
+
+    key = None
+    if cache:
+        key = llm_cache.cache_key(backend.name, model, messages, params)
+        if not llm_cache.bypass_enabled():
+            hit = llm_cache.get_cache().get(key)
+            if hit is not None:
+                _metrics.append(CallRecord(tag, backend.name, model, (time.perf_counter() - start) * 1000,
+                                           0, 0, 0, True, cached=True))
+                return hit
+
+    attempt = 0
+    while True:
+        try:
+            text, usage = backend.complete(messages, model, **params)
+            break
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                _metrics.append(CallRecord(tag, backend.name, model,
+                                           (time.perf_counter() - start) * 1000,
+                                           None, None, attempt, False))
+                raise
+            _sleep_backoff(attempt)
+            attempt += 1
+    _metrics.append(CallRecord(tag, backend.name, model, (time.perf_counter() - start) * 1000,
+                               usage.get("prompt_tokens"), usage.get("completion_tokens"),
+                               attempt, True))
+    if key is not None:
+        llm_cache.get_cache().put(key, text)
+    return text
+
+
+def stream_chat(messages: list[dict], model: str = DEFAULT_MODEL, *, tag: str = "chat",
+                max_retries: int | None = None, **params) -> Iterator[str]:
+    """応答を差分テキスト（delta）単位で順に返す。
+
+    最初の delta を受け取る前のエラーのみリトライする。
+    """
+    backend = get_backend()
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    start = time.perf_counter()
+    attempt, parts, ok = 0, [], False
+    try:
+        while True:
+            try:
+                for delta in backend.stream(messages, model, **params):
+                    parts.append(delta)
+                    yield delta
+                ok = True
+                return
+            except Exception as e:
+                if parts or attempt >= max_retries or not _is_retryable(e):
+                    raise
+                _sleep_backoff(attempt)
+                attempt += 1
+    finally:
+        _metrics.append(CallRecord(tag, backend.name, model, (time.perf_counter() - start) * 1000,
+                                   count_message_tokens(messages), count_tokens("".join(parts)),
+                                   attempt, ok, stream=True))
+
+
+def stream_reply(messages: list[dict], on_delta: Callable[[str], None] | None = None,
+                 model: str = DEFAULT_MODEL, **params) -> str:
+    """ストリーミングで応答を受け取り、受信のたびに on_delta(ここまでの全文) を呼ぶ。
+
+    完了後に全文を返す。
+    """
+    buf: list[str] = []
+    for delta in stream_chat(messages, model=model, **params):
+        buf.append(delta)
+        if on_delta:
+            on_delta("".join(buf))
+    return "".join(buf)
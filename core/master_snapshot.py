@@ -0,0 +1,238 @@
+# core/master_snapshot.py – master_snapshot.json の生成（プロセス内 API）
+"""
+output/master_snapshot.json（リポジトリ内ファイルの md5 / サイズ / AST 概要 / frontmatter）を作る。
+
+* build_snapshot(previous) : (size, mtime_ns, inode) が前回と同じファイルは前回の結果を再利用し、
+                             変更分だけをスレッドプールで処理する
+* MasterSnapshot           : 前回結果をメモリに保持し続ける生成器。regenerate() は同期、
+                             request() はデバウンス付きのバックグラウンド再生成
+* scripts/gen_master_snapshot.py は CLI ラッパ
+"""
+import os
+import json
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+from core import ast_index
+from core.fs_walker import Walker, load_whitelist
+
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+REPO_ROOT = str(PROJECT_ROOT)
+OUTPUT_PATH = str(PROJECT_ROOT / "output" / "master_snapshot.json")
+SNAPSHOT_DEBOUNCE: float = float(os.getenv("KAI_SNAPSHOT_DEBOUNCE", "2.0"))   # 秒
+DIR_WHITELIST = ["", "core/", "scripts/", "docs/"]  # data/dir_whitelist.json が無いときの既定
+SKIP_DIRS = {".git", ".venv"}
+READ_CHUNK = 1024 * 1024
+WORKERS = int(os.getenv("KAI_SNAPSHOT_WORKERS", str(min(8, (os.cpu_count() or 1) + 4))))
+
+
+def md5_of_file(path):
+    hash_md5 = hashlib.md5()
+    buf = bytearray(READ_CHUNK)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(buf):
+            hash_md5.update(view[:n])
+    return hash_md5.hexdigest()
+
+
+def extract_ast_info(path):
+    try:
+        info = ast_index.file_info(path)
+        if info["error"]:
+            return {"error": info["error"]}
+        functions = []
+        for fn in info["functions"]:
+            if fn["is_async"]:
+                continue
+            functions.append({
+                "name": fn["name"],
+                "signature": fn["signature"],
+                "capability": next((d for d in fn["decorators"] if d.startswith("kai_")), None),
+                "loc": info["loc"]
+            })
+        return {"functions": functions}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def extract_frontmatter(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        if not lines or not lines[0].strip() == "---":
+            return None
+        end = next(i for i, line in enumerate(lines[1:], start=1) if line.strip() == "---")
+        yaml_block = "".join(lines[1:end])
+        return yaml.safe_load(yaml_block)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+_SELF_OUTPUTS = {os.path.relpath(p, REPO_ROOT)
+                 for p in (OUTPUT_PATH, OUTPUT_PATH + ".tmp", str(ast_index.INDEX_PATH))}
+
+
+def iter_snapshot_files():
+    """(full_path, rel_path, stat) を走査順で返す（.gitignore と dir_whitelist.json を適用）"""
+    whitelist = load_whitelist() or DIR_WHITELIST
+    walker = Walker(REPO_ROOT, skip_dirs=SKIP_DIRS, ignore_files=(".gitignore",), whitelist=whitelist)
+    for f in walker:
+        if f.rel in _SELF_OUTPUTS:
+            continue  # 自分自身の出力を含めると毎回差分になる
+        if ".git" in f.rel or ".venv" in f.rel:
+            continue
+        yield f.path, f.rel, f.stat
+
+
+def build_record(full_path, rel_path, st):
+    record = {
+        "path": rel_path,
+        "md5": md5_of_file(full_path),
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "mtime_ns": st.st_mtime_ns,
+        "inode": st.st_ino,
+    }
+
+    if full_path.endswith(".py"):
+        record["ast"] = extract_ast_info(full_path)
+    elif full_path.endswith(".md") or full_path.endswith(".json"):
+        fm = extract_frontmatter(full_path)
+        if fm:
+            record["frontmatter"] = fm
+    return record
+
+
+def _unchanged(prev, st):
+    return (prev is not None and prev.get("size") == st.st_size
+            and prev.get("mtime_ns") == st.st_mtime_ns and prev.get("inode") == st.st_ino)
+
+
+def load_previous_snapshot(path=OUTPUT_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {r["path"]: r for r in json.load(f)}
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def build_snapshot(previous=None, workers=WORKERS):
+    """previous（path → record）と (size, mtime_ns, inode) が同じファイルは再利用し、
+    変更されたファイルだけを並列に処理する。(snapshot, 再処理した件数) を返す。"""
+    previous = previous or {}
+    snapshot, todo = [], []
+    for full_path, rel_path, st in iter_snapshot_files():
+        prev = previous.get(rel_path)
+        if _unchanged(prev, st):
+            snapshot.append(prev)
+        else:
+            snapshot.append(None)
+            todo.append((len(snapshot) - 1, full_path, rel_path, st))
+
+    if len(todo) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            records = list(pool.map(lambda t: build_record(*t[1:]), todo))
+    else:
+        records = [build_record(*t[1:]) for t in todo]
+    for (i, *_), record in zip(todo, records):
+        snapshot[i] = record
+    ast_index.get_index().save()
+    return snapshot, len(todo)
+
+
+def write_snapshot(snapshot, path=OUTPUT_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class MasterSnapshot:
+    """前回の結果をメモリに保持したまま再生成を繰り返す生成器（スレッドセーフ）。
+
+    regenerate() はその場で差分更新する。request() は delay 秒以内の要求をまとめて
+    バックグラウンドで 1 回だけ再生成する（呼び出し側はブロックしない）。
+    """
+
+    def __init__(self, output_path=OUTPUT_PATH, debounce: float = SNAPSHOT_DEBOUNCE):
+        self.output_path = str(output_path)
+        self.debounce = debounce
+        self._records: dict | None = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._due: float | None = None
+        self._running = False
+        self._thread: threading.Thread | None = None
+        self.runs = 0
+        self.last_changed: int | None = None
+        self.last_duration_ms: float | None = None
+        self.last_error: str | None = None
+
+    def regenerate(self, incremental: bool = True) -> list:
+        with self._lock:
+            start = time.perf_counter()
+            if not incremental or self._records is None:
+                self._records = load_previous_snapshot(self.output_path) if incremental else {}
+            previous = self._records
+            snapshot, changed = build_snapshot(previous)
+            if changed or len(snapshot) != len(previous) or not os.path.exists(self.output_path):
+                write_snapshot(snapshot, self.output_path)
+            self._records = {r["path"]: r for r in snapshot}
+            self.runs += 1
+            self.last_changed = changed
+            self.last_duration_ms = (time.perf_counter() - start) * 1000
+            return snapshot
+
+    # ── バックグラウンド（デバウンス） ─────────────
+    def request(self, delay: float | None = None) -> None:
+        """delay 秒後に再生成を予約する。予約済みなら期限を延ばして 1 回にまとめる。"""
+        with self._cond:
+            self._due = time.monotonic() + (self.debounce if delay is None else delay)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="kai-master-snapshot", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._due is None:
+                    self._cond.wait()
+                while (wait := self._due - time.monotonic()) > 0:
+                    self._cond.wait(wait)
+                self._due = None
+                self._running = True
+            try:
+                self.regenerate()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                with self._cond:
+                    self._running = False
+                    self._cond.notify_all()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """予約・実行中の再生成が終わるまで待つ。終わっていれば True。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._due is not None or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def status(self) -> dict:
+        with self._cond:
+            pending, running = self._due is not None, self._running
+        return {"pending": pending, "running": running, "runs": self.runs,
+                "last_changed": self.last_changed, "last_duration_ms": self.last_duration_ms,
+                "last_error": self.last_error}
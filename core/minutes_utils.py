@@ -1,9 +1,36 @@
 # core/minutes_utils.py
+"""
+日次議事録（docs/minutes/YYYY/minutes_YYYYMMDD.yaml）の生成。
+
+* 差分生成: 前回どこまで要約したか（メッセージ数・最後のメッセージの指紋・ログ全体の
+  ハッシュ）を YAML の隣の minutes_YYYYMMDD.state.json に記録し、再生成時は新しい
+  メッセージと前回の YAML だけを送る。LLM は追加・変更分だけを YAML で返し、
+  merge_minutes() で前回の議事録に統合する。ログが前回から変わっていなければ何もしない
+* ログが書き換えられていた・前回の YAML が読めない・full=True のときは全体から作り直す
+* 差分応答が YAML の mapping として読めなければ MinutesDeltaError。確定済みのステータスを
+  失わないよう、議事録も状態ファイルも書き換えない
+* backfill_minutes(): 期間内の各日を上限付きのスレッドプールで生成し、最後に 1 回だけコミットする
+* 長い日は map-reduce: メッセージを MINUTES_CHUNK_TOKENS 以内のチャンクに分けて
+  並列に要約（map）し、部分議事録を 1 つの schema v2 YAML にまとめる（reduce）。
+  待ち時間は最も遅いチャンク + reduce で決まり、切り捨てによる取りこぼしも無い
+"""
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import date
-import yaml, json, subprocess
-from openai import OpenAI
+from datetime import date, timedelta
+import hashlib, os, yaml, json, subprocess
+from core import llm_client
+from core.conversation_log import load_day_messages
+from core.token_utils import count_tokens
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+MINUTES_DIR = PROJECT_ROOT / "docs" / "minutes"
+LOCKED_STATUSES = ("CONFIRMED", "CANCELLED")   # 人が確定したステータスは差分で上書きしない
+MINUTES_MODEL = "gpt-4.1"
+MINUTES_CHUNK_TOKENS = int(os.getenv("KAI_MINUTES_CHUNK_TOKENS", "12000"))   # 1 プロンプトに入れるログの上限
+MINUTES_WORKERS = int(os.getenv("KAI_MINUTES_WORKERS", "4"))
+BACKFILL_WORKERS = int(os.getenv("KAI_MINUTES_BACKFILL_WORKERS", "3"))   # 同時に生成する日数
+MAX_REDUCE_ROUNDS = int(os.getenv("KAI_MINUTES_MAX_REDUCE_ROUNDS", "4"))   # 超えたら残りを 1 回でまとめる
 
 PROMPT_TMPL = """You are Kai's Minutes Assistant.
 Output valid YAML (schema v2). Summarise decisions only.
@@ -13,31 +40,346 @@ Output valid YAML (schema v2). Summarise decisions only.
 </conversation>
 """
 
+DELTA_PROMPT_TMPL = """You are Kai's Minutes Assistant.
+<minutes> holds today's minutes so far (YAML, schema v2); <conversation> holds only
+the messages added since they were written.
+Output valid YAML (schema v2) containing ONLY what the new messages add or change:
+new themes, new decisions, and existing decisions (keep their id) whose fields changed.
+Output {{}} if nothing changed. Summarise decisions only.
+
+<minutes>
+{minutes_yaml}
+</minutes>
+
+<conversation>
+{log_text}
+</conversation>
+"""
+
+CHUNK_PROMPT_TMPL = """You are Kai's Minutes Assistant.
+<conversation> is part {part} of {parts} of one day's conversation.
+Output valid YAML (schema v2) for this part only. Summarise decisions only.
+
+<conversation>
+{log_text}
+</conversation>
+"""
+
+REDUCE_PROMPT_TMPL = """You are Kai's Minutes Assistant.
+<partials> holds minutes (YAML, schema v2) written for consecutive parts of one day's
+conversation, in order. Merge them into one valid YAML document (schema v2):
+combine duplicate themes and decisions, number decision ids sequentially and keep
+the latest status of each decision. Summarise decisions only.
+
+<partials>
+{partials}
+</partials>
+"""
+
+DELTA_REDUCE_PROMPT_TMPL = """You are Kai's Minutes Assistant.
+<minutes> holds today's minutes so far (YAML, schema v2); <partials> holds minutes
+written for consecutive parts of the messages added since, in order.
+Output valid YAML (schema v2) containing ONLY what the partials add or change:
+new themes, new decisions, and existing decisions (keep their id) whose fields changed.
+Output {{}} if nothing changed. Summarise decisions only.
+
+<minutes>
+{minutes_yaml}
+</minutes>
+
+<partials>
+{partials}
+</partials>
+"""
+
+def minutes_path(day: date, minutes_dir: Path = MINUTES_DIR) -> Path:
+    return Path(minutes_dir) / f"{day.year}" / f"minutes_{day:%Y%m%d}.yaml"
+
 def concat_daily_logs(day: date) -> str:
-    day_dir = Path("conversations") / f"{day:%Y/%m/%d}"
-    logs = []
-    for f in sorted(day_dir.glob("conversation_*.json")):
-        logs.extend(json.loads(f.read_text())["messages"])
-    return json.dumps({"messages": logs}, ensure_ascii=False)
-
-def generate_daily_minutes(day: date, force=True) -> Path:
-    out = Path(f"docs/minutes/{day.year}/minutes_{day:%Y%m%d}.yaml")
-    if out.exists() and not force:
-        return out
+    return _dump_messages(load_day_messages(day))
+
+# ---------------------------------------------------------------------------
+# 要約済み位置の記録
+# ---------------------------------------------------------------------------
+
+def _fingerprint(msg: dict) -> str:
+    raw = json.dumps([msg.get("role"), msg.get("ts"), msg.get("content")], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _digest(messages: list[dict]) -> str:
+    return hashlib.sha1(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _state_path(day: date, state_dir: Path) -> Path:
+    return Path(state_dir) / f"minutes_{day:%Y%m%d}.state.json"
+
+def _load_state(day: date, state_dir: Path) -> dict:
+    try:
+        return json.loads(_state_path(day, state_dir).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_state(day: date, state_dir: Path, messages: list[dict]) -> None:
+    path = _state_path(day, state_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state = {"count": len(messages), "last": _fingerprint(messages[-1]) if messages else None,
+             "digest": _digest(messages)}
+    path.write_text(json.dumps(state), encoding="utf-8")
 
-    log_text = concat_daily_logs(day)
-    client = OpenAI()
-    resp = client.chat.completions.create(
-        model="gpt-4.1",
+def _resume_point(messages: list[dict], state: dict) -> int:
+    """要約済みメッセージ数。ログが前回の続きでなければ 0（全体から作り直す）"""
+    count = state.get("count") or 0
+    if not count or count > len(messages):
+        return 0
+    return count if _fingerprint(messages[count - 1]) == state.get("last") else 0
+
+# ---------------------------------------------------------------------------
+# YAML の統合
+# ---------------------------------------------------------------------------
+
+def _parse_yaml(text: str):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return yaml.safe_load(text)
+
+def _merge_decisions(old: list, new: list) -> list:
+    merged = [dict(d) for d in old]
+    by_id = {d.get("id"): d for d in merged if isinstance(d, dict) and d.get("id") is not None}
+    for d in new:
+        if not isinstance(d, dict):
+            continue
+        cur = by_id.get(d.get("id"))
+        if cur is None:
+            merged.append(dict(d))
+            if d.get("id") is not None:
+                by_id[d["id"]] = merged[-1]
+            continue
+        locked = cur.get("status") in LOCKED_STATUSES
+        cur.update({k: v for k, v in d.items() if not (locked and k == "status")})
+    return merged
+
+def merge_minutes(previous: dict, delta: dict) -> dict:
+    """前回の議事録に差分を統合する。
+
+    decisions は id で上書き・追加（CONFIRMED / CANCELLED は維持）、
+    その他のリストは重複を除いて追加、dict は再帰的に統合、スカラーは差分で上書き。
+    """
+    result = dict(previous or {})
+    for key, val in (delta or {}).items():
+        cur = result.get(key)
+        if key == "decisions" and isinstance(val, list):
+            result[key] = _merge_decisions(cur or [], val)
+        elif isinstance(val, list) and isinstance(cur, list):
+            result[key] = cur + [v for v in val if v not in cur]
+        elif isinstance(val, dict) and isinstance(cur, dict):
+            result[key] = merge_minutes(cur, val)
+        else:
+            result[key] = val
+    return result
+
+# ---------------------------------------------------------------------------
+# チャンク分割と map-reduce
+# ---------------------------------------------------------------------------
+
+def _dump_messages(messages: list[dict]) -> str:
+    return json.dumps({"messages": messages}, ensure_ascii=False)
+
+def _split_message(msg: dict, max_tokens: int) -> list[dict]:
+    """1 件で上限を超えるメッセージは本文を分割する（切り捨てはしない）"""
+    content = msg.get("content") or ""
+    tokens = count_tokens(content)
+    if tokens <= max_tokens:
+        return [msg]
+    step = max(1, len(content) * max_tokens // tokens)
+    return [{**msg, "content": content[i:i + step]} for i in range(0, len(content), step)]
+
+def _pack(items: list, cost, max_tokens: int) -> list[list]:
+    groups, cur, used = [], [], 0
+    for item in items:
+        c = cost(item)
+        if cur and used + c > max_tokens:
+            groups.append(cur)
+            cur, used = [], 0
+        cur.append(item)
+        used += c
+    if cur:
+        groups.append(cur)
+    return groups
+
+def _pack_for_reduce(partials: list[str], max_tokens: int) -> list[list[str]]:
+    """reduce 用のグループ分け。1 件だけのグループは隣に寄せ、各ラウンドで件数が必ず半分以下になるようにする"""
+    groups = _pack(partials, count_tokens, max_tokens)
+    if len(groups) <= 1:
+        return groups
+    merged: list[list[str]] = []
+    for g in groups:
+        if len(g) == 1 and merged:
+            merged[-1].extend(g)
+        elif merged and len(merged[-1]) == 1:
+            merged[-1].extend(g)
+        else:
+            merged.append(list(g))
+    return merged
+
+def chunk_messages(messages: list[dict], max_tokens: int | None = None) -> list[list[dict]]:
+    """メッセージを時系列順のまま、1 チャンク max_tokens 以内に分ける"""
+    max_tokens = max_tokens or MINUTES_CHUNK_TOKENS
+    pieces = [p for m in messages for p in _split_message(m, max_tokens)]
+    return _pack(pieces, lambda m: count_tokens(json.dumps(m, ensure_ascii=False)), max_tokens)
+
+def _chat(prompt: str, tag: str) -> str:
+    return llm_client.chat(
+        [{"role": "system", "content": prompt}],
+        model=MINUTES_MODEL,
         temperature=0,
-        messages=[{"role": "system",
-                   "content": PROMPT_TMPL.format(log_text=log_text)}]
+        tag=tag,
+        cache=True,
     )
+
+def _map(fn, items: list, workers: int) -> list:
+    if len(items) == 1 or workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+def summarize_messages(messages: list[dict], previous: dict | None = None, *,
+                       max_tokens: int | None = None, workers: int | None = None) -> str:
+    """メッセージを schema v2 の YAML テキストに要約する。
+
+    previous を渡すと、その議事録に対する追加・変更分だけを返す。
+    上限に収まらなければチャンクごとに並列で要約し、reduce でまとめる。
+    """
+    max_tokens = max_tokens or MINUTES_CHUNK_TOKENS
+    workers = MINUTES_WORKERS if workers is None else workers
+    prev_yaml = yaml.safe_dump(previous, sort_keys=False, allow_unicode=True) if previous is not None else None
+
+    chunks = chunk_messages(messages, max_tokens)
+    if len(chunks) <= 1:
+        if prev_yaml is None:
+            return _chat(PROMPT_TMPL.format(log_text=_dump_messages(messages)), "daily_minutes")
+        return _chat(DELTA_PROMPT_TMPL.format(minutes_yaml=prev_yaml, log_text=_dump_messages(messages)),
+                     "daily_minutes_delta")
+
+    # map: チャンクごとの部分議事録
+    partials = _map(lambda item: _chat(CHUNK_PROMPT_TMPL.format(part=item[0] + 1, parts=len(chunks),
+                                                                log_text=_dump_messages(item[1])),
+                                       "daily_minutes_map"),
+                    list(enumerate(chunks)), workers)
+
+    # reduce: 部分議事録が上限を超える間はグループごとにまとめる。
+    # 各グループは 2 件以上なので 1 ラウンドごとに件数は半分以下になる。要約が縮まなくても
+    # MAX_REDUCE_ROUNDS で打ち切り、残りは上限を超えても最後の 1 回にまとめて渡す
+    def joined(group):
+        return "\n---\n".join(group)
+    groups = _pack_for_reduce(partials, max_tokens)
+    rounds = 0
+    while len(groups) > 1 and rounds < MAX_REDUCE_ROUNDS:
+        partials = _map(lambda g: _chat(REDUCE_PROMPT_TMPL.format(partials=joined(g)), "daily_minutes_reduce"),
+                        groups, workers)
+        groups = _pack_for_reduce(partials, max_tokens)
+        rounds += 1
+    if len(groups) > 1:
+        groups = [[p for g in groups for p in g]]
+    if prev_yaml is None:
+        return _chat(REDUCE_PROMPT_TMPL.format(partials=joined(groups[0])), "daily_minutes_reduce")
+    return _chat(DELTA_REDUCE_PROMPT_TMPL.format(minutes_yaml=prev_yaml, partials=joined(groups[0])),
+                 "daily_minutes_reduce")
+
+# ---------------------------------------------------------------------------
+# 生成
+# ---------------------------------------------------------------------------
+
+class MinutesDeltaError(ValueError):
+    """差分応答が読めなかった。既存の議事録と状態には手を付けていない"""
+    def __init__(self, day: date, reason: str):
+        self.day = day
+        super().__init__(f"{day:%Y-%m-%d} の差分議事録を統合できませんでした（{reason}）。"
+                         "既存の議事録はそのままです。full=True で作り直せます")
+
+def _generate(day: date, *, full: bool, minutes_dir: Path, state_dir: Path | None) -> tuple[Path, str]:
+    """議事録を生成し (パス, 結果) を返す。結果は "skipped" / "incremental" / "full" / "no_logs"。"""
+    out = minutes_path(day, minutes_dir)
+    state_dir = state_dir or out.parent
+    messages = load_day_messages(day)
+    state = _load_state(day, state_dir)
+    if out.exists() and not full and state.get("digest") == _digest(messages):
+        return out, "skipped"   # 前回からログが変わっていない
+
+    start = 0
+    previous = None
+    if out.exists() and not full:
+        start = _resume_point(messages, state)
+        if start:
+            try:
+                previous = yaml.safe_load(out.read_text(encoding="utf-8"))
+            except yaml.YAMLError:
+                previous = None
+            if not isinstance(previous, dict):
+                start = 0
+    if start and start == len(messages):
+        _save_state(day, state_dir, messages)
+        return out, "skipped"   # 新しいメッセージなし
+
+    merged = None
+    if start:
+        minutes_yaml = summarize_messages(messages[start:], previous)
+        try:
+            delta = _parse_yaml(minutes_yaml)
+        except yaml.YAMLError as e:
+            raise MinutesDeltaError(day, f"YAML として読めません: {e}") from e
+        if delta is None:
+            delta = {}   # 空応答は「変更なし」
+        if not isinstance(delta, dict):
+            raise MinutesDeltaError(day, f"mapping ではありません: {type(delta).__name__}")
+        merged = merge_minutes(previous, delta)
+
     out.parent.mkdir(parents=True, exist_ok=True)
-    out.write_text(resp.choices[0].message.content, encoding="utf-8")
-    return out
+    if merged is not None:
+        out.write_text(yaml.safe_dump(merged, sort_keys=False, allow_unicode=True), encoding="utf-8")
+    else:
+        # 初回・ログの書き換え・前回の YAML が読めない・full=True の場合は全体から作り直す
+        out.write_text(summarize_messages(messages), encoding="utf-8")
+    _save_state(day, state_dir, messages)
+    return out, "incremental" if merged is not None else "full"
+
+def generate_daily_minutes(day: date, force=True, *, full: bool = False,
+                           minutes_dir: Path = MINUTES_DIR, state_dir: Path | None = None) -> Path:
+    """議事録を生成する。既存の議事録があれば前回以降のメッセージだけを要約して統合する。
+
+    full=True なら当日のログ全体から作り直す。state_dir の既定は YAML と同じディレクトリ。
+    差分応答が読めなければ MinutesDeltaError（人が確定したステータスを消さないよう、
+    全体の作り直しには切り替えない）。
+    """
+    out = minutes_path(day, minutes_dir)
+    if out.exists() and not force:
+        return out
+    return _generate(day, full=full, minutes_dir=minutes_dir, state_dir=state_dir)[0]
+
+def backfill_minutes(start: date, end: date, *, full: bool = False, workers: int | None = None,
+                     minutes_dir: Path = MINUTES_DIR, state_dir: Path | None = None) -> dict[date, str]:
+    """start〜end（両端含む）の議事録をまとめて生成し、日ごとの結果を返す。
+
+    ログの無い日は "no_logs"、前回からログが変わっていない日は "skipped"、
+    失敗した日は "error: ..."。コミットは呼び出し側で 1 回だけ行う。
+    """
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    workers = BACKFILL_WORKERS if workers is None else workers
+
+    def run(day):
+        if not load_day_messages(day):
+            return "no_logs"
+        try:
+            return _generate(day, full=full, minutes_dir=minutes_dir, state_dir=state_dir)[1]
+        except Exception as e:
+            return f"error: {e}"
+
+    return dict(zip(days, _map(run, days, workers)))
 
-def safe_push_minutes(msg: str):
-    subprocess.run(["git", "add", "docs/minutes"], check=True)
-    subprocess.run(["git", "commit", "-m", msg], check=True)
-    subprocess.run(["git", "push", "origin", "feat/minutes-ui"], check=True)
+def safe_push_minutes(msg: str, push: bool = True):
+    from core.git_ops import GIT_LOCK   # 会話ログのバッチコミットと同時に git を触らない
+    with GIT_LOCK:
+        subprocess.run(["git", "add", "docs/minutes"], check=True)
+        subprocess.run(["git", "commit", "-m", msg], check=True)
+        if push:
+            subprocess.run(["git", "push", "origin", "feat/minutes-ui"], check=True)
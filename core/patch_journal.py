@@ -0,0 +1,264 @@
+# core/patch_journal.py – 追記専用パッチ履歴（JSONL + SQLite 索引）
+"""
+patch_history / docs/patch_log の共通ストア。
+
+* 書き込み: 1 パッチ 1 行を JSONL に追記するだけ（履歴が伸びても O(1)）
+* 読み込み: ファイル末尾からブロック単位で逆順に読むので、新しい順のページングに
+  全件読み込み・ソートが要らない
+* 索引（任意）: .cache/ 配下の SQLite に (offset, length, ts, function, file) を持ち、
+  関数名・ファイル名・日時での絞り込みとページングを本文を読まずに行う。
+  索引は JSONL から導出されるキャッシュで、未索引の末尾だけを都度取り込む。
+  索引済み部分のハッシュが変わっていれば（git で書き換えられた等）作り直す
+* 旧形式（JSON 配列ファイル）があれば初回に時刻順で JSONL へ移行する
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator
+
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+INDEX_DIR: Path = PROJECT_ROOT / ".cache"
+READ_BLOCK = 64 * 1024
+
+
+def _reverse_lines(path: Path, end: int | None = None) -> Iterator[tuple[int, bytes]]:
+    """(offset, 行) をファイル末尾から順に返す"""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        tail = b""
+        while pos > 0:
+            size = min(READ_BLOCK, pos)
+            pos -= size
+            f.seek(pos)
+            buf = f.read(size) + tail
+            lines = buf.split(b"\n")
+            tail = lines.pop(0)          # 先頭は行の途中かもしれないので次のブロックへ持ち越す
+            offset = pos + len(tail) + 1
+            found = []
+            for line in lines:
+                found.append((offset, line))
+                offset += len(line) + 1
+            for off, line in reversed(found):
+                if line.strip():
+                    yield off, line
+        if tail.strip():
+            yield 0, tail
+
+
+class PatchJournal:
+    def __init__(self, path: str | Path, *, legacy_path: str | Path | None = None,
+                 time_field: str = "timestamp", index: bool = True,
+                 index_path: str | Path | None = None):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.time_field = time_field
+        self.index_path = Path(index_path) if index_path else \
+            INDEX_DIR / f"patch_index_{self.path.stem}.sqlite3"
+        self.use_index = index
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._migrated = False
+
+    # ── 旧形式からの移行 ───────────────────────────
+    def _migrate(self) -> None:
+        if self._migrated:
+            return
+        self._migrated = True
+        if self.path.exists() or not self.legacy_path or not self.legacy_path.exists():
+            return
+        try:
+            records = json.loads(self.legacy_path.read_text(encoding="utf-8"))
+        except ValueError:
+            records = []
+        if not isinstance(records, list):
+            records = []
+        records.sort(key=lambda r: r.get(self.time_field, ""))   # 移行時の 1 回だけ
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self.legacy_path.unlink()
+
+    # ── 書き込み ─────────────────────────────────
+    def append(self, record: dict) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._migrate()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(line)
+
+    # ── 逆順読み出し（索引なし） ─────────────────────
+    def iter_newest(self) -> Iterator[tuple[int, dict]]:
+        """(offset, record) を新しい順に返す"""
+        with self._lock:
+            self._migrate()
+        if not self.path.exists():
+            return
+        for offset, line in _reverse_lines(self.path):
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                continue   # 書きかけ・破損行は読み飛ばす
+
+    def read_at(self, offset: int) -> dict:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    # ── 索引 ─────────────────────────────────────
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.index_path), timeout=10, check_same_thread=False)
+            conn.execute("""CREATE TABLE IF NOT EXISTS patches (
+                                offset INTEGER PRIMARY KEY,
+                                length INTEGER NOT NULL,
+                                ts TEXT, function TEXT, file TEXT)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ts ON patches(ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_function ON patches(function, ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_file ON patches(file, ts)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            self._conn = conn
+        return self._conn
+
+    def _prefix_hash(self, upto: int):
+        """先頭 upto バイトの sha1（続きを update できるようハッシュオブジェクトで返す）"""
+        h = hashlib.sha1()
+        with open(self.path, "rb") as f:
+            remaining = upto
+            while remaining > 0:
+                block = f.read(min(READ_BLOCK, remaining))
+                if not block:
+                    break
+                h.update(block)
+                remaining -= len(block)
+        return h
+
+    def sync_index(self) -> int:
+        """JSONL の未索引部分を取り込む。取り込んだ件数を返す。
+
+        索引済み部分（先頭 indexed_upto バイト）のハッシュも持ち、git pull / rebase などで
+        途中の行が書き換わっていたら索引を作り直す。ファイルの (mtime_ns, size) が
+        前回と同じなら何も読まない。
+        """
+        with self._lock:
+            self._migrate()
+            db = self._db()
+            meta = dict(db.execute("SELECT key, value FROM meta").fetchall())
+            upto = meta.get("indexed_upto") or 0
+            if not self.path.exists():
+                st_key, size = None, 0
+            else:
+                st = self.path.stat()
+                st_key, size = f"{st.st_mtime_ns}:{st.st_size}", st.st_size
+            if st_key is not None and st_key == meta.get("indexed_stat"):
+                return 0
+            h = self._prefix_hash(upto) if 0 < upto <= size else None
+            if size < upto or (h is not None and h.hexdigest() != meta.get("indexed_hash")):
+                db.execute("DELETE FROM patches")   # 作り直された・書き換えられた → 索引も作り直す
+                upto, h = 0, None
+            h = h or hashlib.sha1()
+            added = 0
+            offset = upto
+            if size > upto:
+                with open(self.path, "rb") as f:
+                    f.seek(upto)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break             # 書き込み途中の行は次回
+                        try:
+                            rec = json.loads(line)
+                            db.execute("INSERT OR REPLACE INTO patches VALUES (?, ?, ?, ?, ?)",
+                                       (offset, len(line), rec.get(self.time_field),
+                                        rec.get("function"), rec.get("file")))
+                            added += 1
+                        except ValueError:
+                            pass
+                        h.update(line)
+                        offset += len(line)
+            db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                           [("indexed_upto", offset), ("indexed_hash", h.hexdigest()),
+                            ("indexed_stat", st_key)])
+            db.commit()
+            return added
+
+    def _where(self, function, file, since, until) -> tuple[str, list]:
+        clauses, args = [], []
+        for col, val in (("function", function), ("file", file)):
+            if val:
+                clauses.append(f"{col} = ?")
+                args.append(val)
+        if since:
+            clauses.append("ts >= ?")
+            args.append(since)
+        if until:
+            clauses.append("ts < ?")
+            args.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def entries(self, page: int = 0, per_page: int = 20, *, function: str | None = None,
+                file: str | None = None, since: str | None = None, until: str | None = None) -> list[dict]:
+        """新しい順 1 ページ分の索引エントリ（offset / ts / function / file、本文なし）"""
+        self.sync_index()
+        where, args = self._where(function, file, since, until)
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT offset, ts, function, file FROM patches{where} "
+                f"ORDER BY ts DESC, offset DESC LIMIT ? OFFSET ?",
+                (*args, per_page, page * per_page)).fetchall()
+        return [{"offset": o, "ts": ts, "function": fn, "file": fl} for o, ts, fn, fl in rows]
+
+    def count(self, *, function: str | None = None, file: str | None = None,
+              since: str | None = None, until: str | None = None) -> int:
+        if not self.use_index:
+            return sum(1 for _ in self._filtered(function, file, since, until))
+        self.sync_index()
+        where, args = self._where(function, file, since, until)
+        with self._lock:
+            return self._db().execute(f"SELECT COUNT(*) FROM patches{where}", args).fetchone()[0]
+
+    def distinct(self, column: str) -> list[str]:
+        """索引にある function / file の一覧（フィルタの選択肢用）"""
+        if column not in ("function", "file"):
+            raise ValueError(f"未知の列です: {column}")
+        self.sync_index()
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT DISTINCT {column} FROM patches WHERE {column} IS NOT NULL ORDER BY {column}").fetchall()
+        return [r[0] for r in rows]
+
+    # ── ページング ───────────────────────────────
+    def _filtered(self, function, file, since, until) -> Iterator[tuple[int, dict]]:
+        for offset, rec in self.iter_newest():
+            ts = rec.get(self.time_field) or ""
+            if function and rec.get("function") != function:
+                continue
+            if file and rec.get("file") != file:
+                continue
+            if since and ts < since:
+                continue
+            if until and ts >= until:
+                continue
+            yield offset, rec
+
+    def page(self, page: int = 0, per_page: int = 20, **filters) -> list[dict]:
+        """新しい順 1 ページ分のレコード本体。索引があれば該当行だけを読む。"""
+        if self.use_index:
+            return [self.read_at(e["offset"]) for e in self.entries(page, per_page, **filters)]
+        out = []
+        start = page * per_page
+        for i, (_, rec) in enumerate(self._filtered(filters.get("function"), filters.get("file"),
+                                                    filters.get("since"), filters.get("until"))):
+            if i >= start + per_page:
+                break
+            if i >= start:
+                out.append(rec)
+        return out
@@ -1,13 +1,28 @@
 # core/patch_log.py
+"""関数パッチ履歴（patch_history.jsonl、1 パッチ 1 行の追記専用）の記録・表示"""
 
 import os
-import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 import streamlit as st  # show_patch_log用に必要
 
 from core.capabilities_registry import kai_capability
+from core.patch_journal import PatchJournal
 
-LOG_PATH = "patch_history.json"
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOG_PATH = str(PROJECT_ROOT / "patch_history.jsonl")
+LEGACY_LOG_PATH = str(PROJECT_ROOT / "patch_history.json")   # 旧形式（初回アクセス時に移行）
+PAGE_SIZE = 20
+
+_journals: dict = {}
+
+
+def get_journal(log_path=LOG_PATH) -> PatchJournal:
+    log_path = str(log_path)
+    if log_path not in _journals:
+        legacy = LEGACY_LOG_PATH if log_path == LOG_PATH else None
+        _journals[log_path] = PatchJournal(log_path, legacy_path=legacy, time_field="timestamp")
+    return _journals[log_path]
 
 @kai_capability(
     id="log_patch",
@@ -17,7 +32,7 @@ LOG_PATH = "patch_history.json"
     enabled=True
 )
 def log_patch(fn_name: str, user_instruction: str, markdown_diff: str):
-    """関数修正履歴をpatch_history.jsonに保存する"""
+    """関数修正履歴をpatch_history.jsonlに1行追記する"""
     record = {
         "timestamp": datetime.now().isoformat(),
         "function": fn_name,
@@ -26,24 +41,7 @@ def log_patch(fn_name: str, user_instruction: str, markdown_diff: str):
     }
 
     try:
-        logs_dir = os.path.dirname(LOG_PATH)
-        if logs_dir:
-            os.makedirs(logs_dir, exist_ok=True)
-
-        if not os.path.exists(LOG_PATH):
-            with open(LOG_PATH, "w", encoding="utf-8") as f:
-                json.dump([record], f, ensure_ascii=False, indent=2)
-        else:
-            with open(LOG_PATH, "r", encoding="utf-8") as f:
-                try:
-                    history = json.load(f)
-                except json.JSONDecodeError:
-                    history = []
-
-            history.append(record)
-            with open(LOG_PATH, "w", encoding="utf-8") as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-
+        get_journal().append(record)
         print(f"📝 パッチ履歴を {LOG_PATH} に保存しました。", flush=True)
 
     except Exception as e:
@@ -56,13 +54,17 @@ def log_patch(fn_name: str, user_instruction: str, markdown_diff: str):
     requires_confirm=False,
     enabled=True
 )
-def load_patch_history(log_path=LOG_PATH):
-    """patch_history.jsonから履歴を読み込む"""
-    if not os.path.exists(log_path):
-        return []
+def load_patch_history(log_path=LOG_PATH, *, page=0, per_page=None, function=None, since=None, until=None):
+    """patch_history.jsonlから履歴を新しい順に読み込む
+
+    per_page を指定するとそのページだけを読む（末尾から逆順に読むので全件は読まない）。
+    since / until は ISO 形式の日時文字列（until は含まない）。
+    """
     try:
-        with open(log_path, encoding="utf-8") as f:
-            return json.load(f)
+        journal = get_journal(log_path)
+        if per_page is None:
+            return [rec for _, rec in journal._filtered(function, None, since, until)]
+        return journal.page(page, per_page, function=function, since=since, until=until)
     except Exception as e:
         print(f"❌ 履歴読み込みに失敗しました: {e}", flush=True)
         return []
@@ -75,40 +77,52 @@ def load_patch_history(log_path=LOG_PATH):
     enabled=True
 )
 def show_patch_log():
-    """patch_history.jsonから履歴をStreamlitで表示する"""
-    st.subheader("📘 修正履歴ログ（ドキュメント）")
-    patch_log_path = LOG_PATH
+    """patch_history.jsonlから履歴をStreamlitで表示する（新しい順・ページ単位）
 
-    if not os.path.exists(patch_log_path):
-        st.info("修正履歴はまだありません。")
-        return
+    一覧は索引（offset / 日時 / 関数名）だけで描画し、指示・差分の本文は
+    各エントリで「本文を読み込む」を押したときにその 1 行だけを読む。
+    """
+    st.subheader("📘 修正履歴ログ（ドキュメント）")
+    journal = get_journal()
 
     try:
-        with open(patch_log_path, "r", encoding="utf-8") as f:
-            patch_logs = json.load(f)
+        functions = journal.distinct("function")
     except Exception as e:
         st.error(f"修正履歴の読み込み時にエラーが発生しました: {e}")
         return
 
-    if not patch_logs:
+    if not functions and not journal.count():
         st.info("修正履歴はまだありません。")
         return
 
-    # 新しい順に並べる
-    patch_logs_sorted = sorted(
-        patch_logs,
-        key=lambda x: x.get("timestamp", ""),
-        reverse=True
-    )
+    col_fn, col_date = st.columns(2)
+    fn = col_fn.selectbox("関数", ["（すべて）"] + functions, key="patch_log_function")
+    filters = {"function": None if fn == "（すべて）" else fn}
+    if col_date.checkbox("日付で絞り込む", key="patch_log_by_date"):
+        today = datetime.now().date()
+        picked = col_date.date_input("期間", value=(today - timedelta(days=30), today), key="patch_log_dates")
+        if isinstance(picked, (tuple, list)) and len(picked) == 2:
+            filters["since"] = picked[0].isoformat()
+            filters["until"] = (picked[1] + timedelta(days=1)).isoformat()
+
+    total = journal.count(**filters)
+    if not total:
+        st.info("条件に合う修正履歴はありません。")
+        return
+
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = st.number_input(f"ページ（全 {pages} ページ / {total} 件）", min_value=1, max_value=pages,
+                           value=1, step=1, key="patch_log_page") - 1
 
-    for log in patch_logs_sorted:
-        dt = log.get("timestamp", "日時不明")
-        fname = log.get("function", "関数名不明")
-        diff = log.get("diff", "")
-        instruction = log.get("instruction", "")
+    for entry in journal.entries(page, PAGE_SIZE, **filters):
+        dt = entry["ts"] or "日時不明"
+        fname = entry["function"] or "関数名不明"
 
         with st.expander(f"{dt} — {fname}", expanded=False):
+            if not st.checkbox("本文を読み込む", key=f"patch_log_body_{entry['offset']}"):
+                continue
+            log = journal.read_at(entry["offset"])
             st.write("**指示内容：**")
-            st.code(instruction, language="markdown")
+            st.code(log.get("instruction", ""), language="markdown")
             st.write("**差分内容：**")
-            st.code(diff, language="diff")
+            st.code(log.get("diff", ""), language="diff")
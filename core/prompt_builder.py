@@ -0,0 +1,339 @@
+# core/prompt_builder.py – システムプロンプト組み立て（セクション単位キャッシュ）
+"""
+Kai チャットのシステムプロンプトをセクションごとに組み立ててキャッシュする。
+
+* セクション = 入力ファイル群 + 組み立て関数
+* 入力ファイルの (mtime_ns, size) が変わったセクションだけ再構築する
+* section_stats() でセクション別の文字数・トークン数を返す（どこがコストを占めるかの確認用）
+* get_system_prompt(query) はユーザー発言に関係する部分だけを追加する（検索拡張）:
+  - data/always_files.json に載っている文書は常に全文。載っていない文書は前書きを常に含め、
+    "## " セクションを順位付けの対象にする
+  - DSL は README を常に含め、エントリ 1 件ずつを発言との BM25 スコア順に
+    KAI_PROMPT_RETRIEVAL_TOKENS（トークン）の予算内で選ぶ
+  - docs/ondemand/*.md は kai-on-demand-doc-block に従い、発言がファイル名（"roadmap.md" /
+    "roadmap"）で明示したときだけ含める。kai_rules.json の parameters.ondemand
+    （size_limit = 1 ファイルから入れるバイト数の上限、max_files_per_turn = 1 回に使う
+    ファイル数の上限）を超える分は入れない
+  - 分割結果と語の出現数はセクションの指紋（mtime_ns, size）が変わるまで再利用する
+  - query を渡さなければ従来どおり全文（オンデマンド文書は含めない）
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from core.dsl_store import DSLStore
+from core.enforcement import load_parameters
+from core.search_index import tokenize
+from core.token_utils import count_tokens
+
+# ---------------------------------------------------------------------------
+# パス
+# ---------------------------------------------------------------------------
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+DOCS = PROJECT_ROOT / "docs"
+DSL_DIR = PROJECT_ROOT / "dsl"
+ONDEMAND_DIR = DOCS / "ondemand"
+ALWAYS_FILES_PATH = PROJECT_ROOT / "data" / "always_files.json"
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("KAI_PROMPT_RETRIEVAL_TOKENS", "1500"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_SCORE_RATIO = 0.2   # 最上位スコアのこの割合に満たないチャンクは含めない
+
+# ---------------------------------------------------------------------------
+# セクション組み立て関数
+# ---------------------------------------------------------------------------
+
+def _read(path: Path) -> str:
+    return path.read_text(encoding="utf-8")
+
+
+def _build_dsl_block(readme_path: Path, dsl_path: Path, journal_path: Path) -> str:
+    dsl_readme = readme_path.read_text(encoding="utf-8") if readme_path.exists() else ""
+    dsl_lines: list[str] = []
+    # 未 compaction のジャーナル分も含めて読む
+    for item in DSLStore(dsl_path, journal_path).records():
+        name, desc = item.get("name"), item.get("description")
+        if name and desc:
+            dsl_lines.append(f"- **{name}**: {desc}")
+    return "\n".join([dsl_readme.strip()] + dsl_lines if dsl_readme else dsl_lines)
+
+# ---------------------------------------------------------------------------
+# 検索用の分割（(常に含める前書き, 候補チャンク) を返す）
+# ---------------------------------------------------------------------------
+
+def split_markdown(text: str) -> tuple[str, list[str]]:
+    """最初の "## " より前を前書き、以降を "## " セクションごとのチャンクにする"""
+    lead: list[str] = []
+    chunks: list[list[str]] = []
+    for line in text.splitlines():
+        if line.startswith("## "):
+            chunks.append([line])
+        elif chunks:
+            chunks[-1].append(line)
+        else:
+            lead.append(line)
+    return "\n".join(lead).strip(), [c for c in ("\n".join(c).strip() for c in chunks) if c]
+
+
+def split_ondemand(text: str) -> tuple[str, list[str]]:
+    """オンデマンド文書は前書きも候補チャンクにする（関係が無ければ何も含めない）"""
+    lead, chunks = split_markdown(text)
+    return "", ([lead] if lead else []) + chunks
+
+
+def split_dsl(text: str) -> tuple[str, list[str]]:
+    """README 部分を前書き、DSL エントリ 1 行を 1 チャンクにする"""
+    lead = [l for l in text.splitlines() if not l.startswith("- **")]
+    return "\n".join(lead).strip(), [l for l in text.splitlines() if l.startswith("- **")]
+
+
+@dataclass
+class Chunk:
+    section: str
+    index: int
+    text: str
+    terms: Counter
+    length: int
+    tokens: int | None = None
+
+    def token_count(self) -> int:
+        if self.tokens is None:
+            self.tokens = count_tokens(self.text)
+        return self.tokens
+
+
+@dataclass
+class PromptSection:
+    name: str
+    paths: list[Path]
+    build: Callable[..., str]
+    split: Callable[[str], tuple[str, list[str]]] | None = None   # None なら常に全文
+    ondemand: bool = False   # True なら query で選ばれたときだけ含める
+    # キャッシュ
+    fingerprint: tuple | None = None
+    text: str = ""
+    tokens: int | None = None
+    builds: int = 0
+    _split_cache: tuple[str, list[Chunk]] | None = field(default=None, repr=False)
+
+    def current_fingerprint(self) -> tuple:
+        fp = []
+        for p in self.paths:
+            try:
+                st = p.stat()
+                fp.append((str(p), st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                fp.append((str(p), None, None))
+        return tuple(fp)
+
+    def refresh(self) -> bool:
+        """入力が変わっていれば再構築する。再構築したら True。"""
+        fp = self.current_fingerprint()
+        if fp == self.fingerprint:
+            return False
+        self.text = self.build(*self.paths)
+        self.tokens = None
+        self._split_cache = None
+        self.fingerprint = fp
+        self.builds += 1
+        return True
+
+    def token_count(self) -> int:
+        if self.tokens is None:
+            self.tokens = count_tokens(self.text)
+        return self.tokens
+
+    def chunks(self) -> tuple[str, list[Chunk]]:
+        """(前書き, チャンク)。refresh() で内容が変わるまで再利用する"""
+        if self._split_cache is None:
+            lead, texts = self.split(self.text)
+            chunks = []
+            for i, t in enumerate(texts):
+                terms = Counter(tokenize(t))
+                chunks.append(Chunk(self.name, i, t, terms, sum(terms.values())))
+            self._split_cache = (lead, chunks)
+        return self._split_cache
+
+
+def load_always_files(path: Path = ALWAYS_FILES_PATH) -> set[str]:
+    """always_files.json のパス一覧（"docs/xxx.md" 形式）。読めなければ空"""
+    try:
+        return set(json.loads(path.read_text(encoding="utf-8")))
+    except (FileNotFoundError, ValueError):
+        return set()
+
+
+def default_sections(docs: Path = DOCS, dsl_dir: Path = DSL_DIR,
+                     always_files: set[str] | None = None) -> list[PromptSection]:
+    """既存 get_system_prompt() と同じ順序: rules → dsl → project → architecture
+
+    always_files（省略時は data/always_files.json）に載っている文書は分割しない（常に全文）。
+    """
+    always = load_always_files() if always_files is None else always_files
+
+    def doc(name: str, file: str) -> PromptSection:
+        return PromptSection(name, [docs / file], _read, None if f"docs/{file}" in always else split_markdown)
+
+    return [
+        doc("base_os_rules", "base_os_rules.md"),
+        PromptSection("dsl", [dsl_dir / "README.md", dsl_dir / "integrated_dsl.jsonl",
+                              dsl_dir.parent / ".dsl" / "dsl_journal.jsonl"], _build_dsl_block, split_dsl),
+        doc("project_definition", "project_definition.md"),
+        doc("architecture_overview", "architecture_overview.md"),
+    ]
+
+
+def ondemand_section(path: Path) -> PromptSection:
+    return PromptSection(f"ondemand/{path.name}", [path], _read, split_ondemand, ondemand=True)
+
+# ---------------------------------------------------------------------------
+# Builder
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SystemPromptBuilder:
+    sections: list[PromptSection] = field(default_factory=default_sections)
+    ondemand_dir: Path | None = ONDEMAND_DIR
+    separator: str = "\n\n"
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _prompt: str | None = field(default=None, repr=False)
+
+    last_retrieval: list[dict] = field(default_factory=list, repr=False)
+
+    def build(self, query: str | None = None, *, token_budget: int | None = None) -> str:
+        """システムプロンプトを返す。query があれば関係する部分だけを含める。"""
+        with self._lock:
+            changed = [s.refresh() for s in self.sections if not s.ondemand]
+            if any(changed) or self._prompt is None:
+                self._prompt = self.separator.join(s.text for s in self.sections if not s.ondemand)
+            if not query or not query.strip():
+                return self._prompt
+            self._sync_ondemand()
+            return self._build_retrieved(query, RETRIEVAL_TOKEN_BUDGET if token_budget is None else token_budget)
+
+    def _sync_ondemand(self) -> None:
+        """docs/ondemand/*.md の増減をセクションに反映し、変わったものだけ再構築する"""
+        if self.ondemand_dir is None:
+            return
+        paths = sorted(Path(self.ondemand_dir).glob("*.md"))
+        known = {s.paths[0]: s for s in self.sections if s.ondemand}
+        self.sections = [s for s in self.sections if not s.ondemand] + \
+                        [known.get(p) or ondemand_section(p) for p in paths]
+        for s in self.sections:
+            if s.ondemand:
+                s.refresh()
+
+    def _requested_ondemand(self, query: str) -> list[PromptSection]:
+        """発言がファイル名（拡張子あり / なし）で明示したオンデマンド文書"""
+        q = query.lower()
+        return [s for s in self.sections if s.ondemand
+                and (s.paths[0].name.lower() in q or s.paths[0].stem.lower() in q)]
+
+    def _rank(self, query: str) -> list[tuple[float, Chunk]]:
+        q_terms = set(tokenize(query))
+        chunks = [c for s in self.sections if s.split and not s.ondemand for c in s.chunks()[1]]
+        if not q_terms or not chunks:
+            return []
+        n = len(chunks)
+        avg_len = sum(c.length for c in chunks) / n or 1
+        df = {t: sum(1 for c in chunks if t in c.terms) for t in q_terms}
+        ranked = []
+        for c in chunks:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * c.length / avg_len)
+            score = sum(math.log(1 + (n - df[t] + 0.5) / (df[t] + 0.5)) * c.terms[t] * (BM25_K1 + 1)
+                        / (c.terms[t] + norm) for t in q_terms if c.terms.get(t))
+            if score > 0:
+                ranked.append((score, c))
+        ranked.sort(key=lambda x: x[0], reverse=True)
+        return [(score, c) for score, c in ranked if score >= ranked[0][0] * MIN_SCORE_RATIO]
+
+    def _build_retrieved(self, query: str, token_budget: int) -> str:
+        limits = load_parameters().get("ondemand", {})
+        size_limit = limits.get("size_limit")
+        max_files = limits.get("max_files_per_turn")
+
+        picked: dict[str, list[Chunk]] = {}
+        tokens = 0
+        self.last_retrieval = []
+        for score, c in self._rank(query):
+            if tokens + c.token_count() > token_budget:
+                continue
+            picked.setdefault(c.section, []).append(c)
+            tokens += c.token_count()
+            self.last_retrieval.append({"section": c.section, "chunk": c.index,
+                                        "score": round(score, 4), "tokens": c.token_count()})
+
+        # 明示されたオンデマンド文書は先頭から size_limit バイトまで（順位付けはしない）
+        requested = self._requested_ondemand(query)
+        for s in requested[:max_files] if max_files is not None else requested:
+            used = 0
+            for c in s.chunks()[1]:
+                size = len(c.text.encode("utf-8"))
+                if size_limit is not None and used + size > size_limit:
+                    break
+                used += size
+                picked.setdefault(s.name, []).append(c)
+                self.last_retrieval.append({"section": s.name, "chunk": c.index,
+                                            "score": None, "tokens": c.token_count()})
+
+        parts = []
+        for s in self.sections:
+            if not s.split:
+                parts.append(s.text)   # 必須セクションは常に全文
+                continue
+            if s.ondemand and s.name not in picked:
+                continue
+            lead, _ = s.chunks()
+            body = [c.text for c in sorted(picked.get(s.name, []), key=lambda c: c.index)]
+            text = "\n".join(p for p in [lead, *body] if p)
+            if text:
+                parts.append(text)
+        return self.separator.join(parts)
+
+    def section_stats(self) -> list[dict]:
+        """セクション別の文字数・トークン数（最新化してから集計）"""
+        self.build()
+        return [
+            {
+                "section": s.name,
+                "paths": [str(p.relative_to(PROJECT_ROOT)) if p.is_relative_to(PROJECT_ROOT) else str(p)
+                          for p in s.paths],
+                "chars": len(s.text),
+                "tokens": s.token_count(),
+                "builds": s.builds,
+            }
+            for s in self.sections
+        ]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            for s in self.sections:
+                s.fingerprint = None
+            self._prompt = None
+
+
+_default_builder = SystemPromptBuilder()
+
+
+def get_system_prompt(query: str | None = None) -> str:
+    """キャッシュ済みシステムプロンプトを返す（変更のあったセクションのみ再構築）。
+
+    query（ユーザー発言）を渡すと、必須ドキュメント以外は関係する部分だけを含める。
+    """
+    return _default_builder.build(query)
+
+
+def retrieval_stats() -> list[dict]:
+    """直近の get_system_prompt(query) で選ばれたチャンク（section / chunk / score / tokens）"""
+    return list(_default_builder.last_retrieval)
+
+
+def section_stats() -> list[dict]:
+    return _default_builder.section_stats()
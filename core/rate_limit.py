@@ -0,0 +1,60 @@
+# core/rate_limit.py – トークンバケット式レートリミッタ
+"""
+API のレート制限（RPM / TPM）を超えないよう、並列ワーカ間で共有して使う。
+
+    rpm = TokenBucket(rate=500 / 60, capacity=10)
+    rpm.acquire()          # 1 リクエスト分
+    tpm = TokenBucket(rate=200_000 / 60, capacity=20_000)
+    tpm.acquire(1200)      # 見積もりトークン数分
+"""
+from __future__ import annotations
+
+import threading
+import time
+
+
+class TokenBucket:
+    """rate [個/秒] で補充され、最大 capacity 個まで溜まるバケット（スレッドセーフ）。"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount: float, burst: float | None = None) -> "TokenBucket":
+        return cls(rate=amount / 60.0, capacity=burst)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return True
+            return False
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """amount 個取れるまで待つ。待った秒数を返す。
+
+        capacity を超える要求は capacity に丸める（永久に待たないため）。
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
@@ -0,0 +1,332 @@
+# core/search_index.py – 会話ログ・議事録・docs の全文検索インデックス
+"""
+conversations/（会話ログ）・docs/minutes/（議事録の decisions / themes）・docs/*.md を
+1 つの転置インデックス（.cache/search_index.sqlite3）にまとめ、ランキング付きで検索する。
+
+* 文書の単位: 会話 1 メッセージ / 議事録 1 決定事項（+ themes）/ Markdown 1 見出しセクション
+* トークン化: NFKC 正規化 + 小文字化のうえ、英数字は単語、それ以外（日本語など）は
+  文字 bigram（1 文字だけの並びは unigram）。分かち書き辞書は使わない。
+  索引側は日本語などの各文字の unigram も持つので、1 文字のクエリ（"会" など）も引ける
+* 増分更新: ファイルごとに (mtime_ns, size) を記録し、変わったファイルだけ索引し直す。
+  消えたファイルの文書は削除する。search() は REFRESH_INTERVAL 秒に 1 回だけ更新を確認する
+* 検索: クエリの全語を含む文書を BM25 で順位付けする（クエリ全体をそのまま含む文書は加点）。
+  最も出現の少ない語の postings から候補を絞るので、ファイル本体は読まない
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Iterator
+
+import yaml
+
+from core.capabilities_registry import kai_capability
+from core.conversation_log import CONV_DIR, iter_messages
+
+PROJECT_ROOT: Path = Path(__file__).resolve().parents[1]
+DOCS_DIR: Path = PROJECT_ROOT / "docs"
+MINUTES_DIR: Path = DOCS_DIR / "minutes"
+INDEX_PATH: Path = Path(os.getenv("KAI_SEARCH_INDEX_PATH", str(PROJECT_ROOT / ".cache" / "search_index.sqlite3")))
+REFRESH_INTERVAL = float(os.getenv("KAI_SEARCH_REFRESH_INTERVAL", "30"))   # 秒
+INDEX_VERSION = 2   # 2: 索引に文字 unigram を追加
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BOOST = 1.5
+SNIPPET_CHARS = 60
+
+_WORD = re.compile(r"[0-9a-z_]+")
+_RUN = re.compile(r"[0-9a-z_]+|[^\W0-9a-z_]+")
+
+# ---------------------------------------------------------------------------
+# トークン化
+# ---------------------------------------------------------------------------
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str, *, unigrams: bool = False) -> list[str]:
+    """英数字は単語、それ以外は文字 bigram に分解する。
+
+    unigrams=True なら 2 文字以上の並びの各文字も加える（索引用）。クエリ側は従来どおり
+    bigram だけなので、1 文字のクエリは unigram、2 文字以上は bigram に当たる。
+    """
+    terms: list[str] = []
+    for run in _RUN.findall(normalize(text)):
+        if _WORD.fullmatch(run):
+            terms.append(run)
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms += [run[i:i + 2] for i in range(len(run) - 1)]
+            if unigrams:
+                terms += list(run)
+    return terms
+
+# ---------------------------------------------------------------------------
+# 文書の抽出
+# ---------------------------------------------------------------------------
+
+def _conversation_docs(path: Path) -> Iterator[dict]:
+    day = re.sub(r"\D", "", path.stem)[:8]
+    for i, msg in enumerate(iter_messages(path)):
+        content = msg.get("content") or ""
+        if not isinstance(content, str) or not content.strip():
+            continue
+        yield {"source": "conversation", "locator": str(i),
+               "title": f"{msg.get('ts') or day} {msg.get('role', '')}", "body": content}
+
+
+def _minutes_docs(path: Path) -> Iterator[dict]:
+    try:
+        data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    except yaml.YAMLError:
+        return
+    if not isinstance(data, dict):
+        return
+    day = path.stem[-8:]
+    themes = data.get("themes") or []
+    if themes:
+        yield {"source": "minutes", "locator": "themes", "title": f"{day} themes",
+               "body": "\n".join(map(str, themes))}
+    for i, d in enumerate(data.get("decisions") or []):
+        if not isinstance(d, dict):
+            continue
+        body = "\n".join(str(d[k]) for k in ("title", "action", "rationale", "status") if d.get(k))
+        yield {"source": "minutes", "locator": str(d.get("id", i)),
+               "title": f"{day} {d.get('id', '')} {d.get('title', '')}".strip(), "body": body}
+
+
+def _markdown_docs(path: Path) -> Iterator[dict]:
+    """見出しごとのセクションに分ける（見出し前の本文は "" セクション）"""
+    heading, lines, n = path.stem, [], 0
+    for line in path.read_text(encoding="utf-8").splitlines() + ["# "]:
+        if line.startswith("#"):
+            if "".join(lines).strip():
+                yield {"source": "doc", "locator": str(n), "title": f"{path.name} / {heading}",
+                       "body": "\n".join(lines)}
+                n += 1
+            heading, lines = line.lstrip("#").strip(), []
+        else:
+            lines.append(line)
+
+
+def iter_source_files() -> Iterator[tuple[Path, str]]:
+    """(パス, 種別) を返す。会話ログは conversations/ 配下のネストも含む。"""
+    conv = Path(CONV_DIR)
+    if conv.is_dir():
+        for p in sorted(conv.rglob("conversation_*")):
+            if p.suffix in (".json", ".jsonl") and p.is_file():
+                yield p, "conversation"
+    if MINUTES_DIR.is_dir():
+        for p in sorted(MINUTES_DIR.rglob("minutes_*.yaml")):
+            yield p, "minutes"
+    if DOCS_DIR.is_dir():
+        for p in sorted(DOCS_DIR.glob("*.md")):
+            yield p, "doc"
+
+
+_EXTRACTORS = {"conversation": _conversation_docs, "minutes": _minutes_docs, "doc": _markdown_docs}
+
+# ---------------------------------------------------------------------------
+# インデックス
+# ---------------------------------------------------------------------------
+
+class SearchIndex:
+    def __init__(self, path: str | Path | None = None, sources=iter_source_files,
+                 refresh_interval: float = REFRESH_INTERVAL):
+        self.path = Path(path) if path else INDEX_PATH
+        self.sources = sources
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._checked_at: float | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if not row or row[0] != INDEX_VERSION:
+                conn.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS docs; "
+                                   "DROP TABLE IF EXISTS postings;")
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER);
+                CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, path TEXT NOT NULL,
+                    source TEXT, locator TEXT, title TEXT, body TEXT, length INTEGER);
+                CREATE INDEX IF NOT EXISTS idx_docs_path ON docs(path);
+                CREATE TABLE IF NOT EXISTS postings (term TEXT, doc_id INTEGER, tf INTEGER,
+                    PRIMARY KEY (term, doc_id)) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    # ── 更新 ───────────────────────────────────────
+    def _drop_file(self, db: sqlite3.Connection, path: str) -> None:
+        ids = [r[0] for r in db.execute("SELECT id FROM docs WHERE path = ?", (path,))]
+        db.executemany("DELETE FROM postings WHERE doc_id = ?", [(i,) for i in ids])
+        db.execute("DELETE FROM docs WHERE path = ?", (path,))
+        db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _index_file(self, db: sqlite3.Connection, path: Path, kind: str, st: os.stat_result) -> int:
+        key = str(path)
+        self._drop_file(db, key)
+        count = 0
+        for doc in _EXTRACTORS[kind](path):
+            text = doc["title"] + "\n" + doc["body"]
+            terms = Counter(tokenize(text, unigrams=True))
+            # 文書長は unigram を除いた語数（BM25 の長さ補正を従来どおりに保つ）
+            cur = db.execute("INSERT INTO docs (path, source, locator, title, body, length) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, doc["source"], doc["locator"], doc["title"], doc["body"],
+                              len(tokenize(text))))
+            db.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                           [(t, cur.lastrowid, tf) for t, tf in terms.items()])
+            count += 1
+        db.execute("INSERT INTO files VALUES (?, ?, ?)", (key, st.st_mtime_ns, st.st_size))
+        return count
+
+    def update(self) -> dict:
+        """変更されたファイルだけを索引し直す。{"indexed", "removed", "unchanged"} を返す。"""
+        stats = {"indexed": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            db = self._db()
+            known = {p: (m, s) for p, m, s in db.execute("SELECT path, mtime_ns, size FROM files")}
+            seen = set()
+            for path, kind in self.sources():
+                key = str(path)
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                seen.add(key)
+                if known.get(key) == (st.st_mtime_ns, st.st_size):
+                    stats["unchanged"] += 1
+                    continue
+                try:
+                    self._index_file(db, path, kind, st)
+                except (OSError, UnicodeDecodeError, ValueError):
+                    continue   # 読めないファイルは次回また試す
+                stats["indexed"] += 1
+            for key in set(known) - seen:
+                self._drop_file(db, key)
+                stats["removed"] += 1
+            db.commit()
+            self._checked_at = time.monotonic()
+        return stats
+
+    def _maybe_update(self) -> None:
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.refresh_interval:
+            self.update()
+
+    # ── 検索 ───────────────────────────────────────
+    @staticmethod
+    def _in(db: sqlite3.Connection, sql: str, head: tuple, ids) -> list[tuple]:
+        """"... IN ({ids})" を SQLite の変数上限に収まるよう分割して実行する"""
+        ids, rows = list(ids), []
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            rows += db.execute(sql.format(ids=",".join("?" * len(part))), (*head, *part)).fetchall()
+        return rows
+
+    def search(self, query: str, limit: int = 10, *, source: str | None = None) -> list[dict]:
+        """クエリの全語を含む文書を BM25 順に返す"""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        self._maybe_update()
+        with self._lock:
+            db = self._db()
+            n_docs, avg_len = db.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            if not n_docs:
+                return []
+            df = dict(self._in(db, "SELECT term, COUNT(*) FROM postings WHERE term IN ({ids}) GROUP BY term",
+                               (), terms))
+            if len(df) < len(terms):
+                return []   # 一度も出てこない語がある
+            # 最も珍しい語の postings を候補にし、残りの語は候補の中だけで引く
+            rarest = min(terms, key=df.__getitem__)
+            tfs: dict[int, dict[str, int]] = {d: {rarest: tf} for d, tf in db.execute(
+                "SELECT doc_id, tf FROM postings WHERE term = ?", (rarest,))}
+            for term in terms:
+                if term == rarest or not tfs:
+                    continue
+                hits = dict(self._in(db, "SELECT doc_id, tf FROM postings WHERE term = ? AND doc_id IN ({ids})",
+                                     (term,), tfs))
+                tfs = {d: {**v, term: hits[d]} for d, v in tfs.items() if d in hits}
+            meta = {d: (src, length) for d, src, length in
+                    self._in(db, "SELECT id, source, length FROM docs WHERE id IN ({ids})", (), tfs)}
+
+            scored = []
+            for doc_id, term_tfs in tfs.items():
+                src, length = meta[doc_id]
+                if source and src != source:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_len or 1))
+                score = sum(math.log(1 + (n_docs - df[t] + 0.5) / (df[t] + 0.5)) * tf * (BM25_K1 + 1) / (tf + norm)
+                            for t, tf in term_tfs.items())
+                scored.append((score, doc_id))
+            # 本文を読むのは上位候補だけ（クエリ全体を含めば加点して並べ直す）
+            scored = sorted(scored, reverse=True)[:max(limit * 5, 50)]
+            docs = {r[0]: r[1:] for r in self._in(
+                db, "SELECT id, path, source, locator, title, body FROM docs WHERE id IN ({ids})",
+                (), [d for _, d in scored])}
+
+        phrase = normalize(query).strip()
+        results = []
+        for score, doc_id in scored:
+            path, src, locator, title, body = docs[doc_id]
+            pos = normalize(body).find(phrase)
+            if pos >= 0:
+                score *= PHRASE_BOOST
+            results.append({"score": round(score, 4), "source": src, "path": path,
+                            "locator": locator, "title": title, "snippet": _snippet(body, pos)})
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:limit]
+
+
+def _snippet(body: str, pos: int) -> str:
+    start = max(0, pos - SNIPPET_CHARS // 2) if pos >= 0 else 0
+    text = body[start:start + SNIPPET_CHARS * 2].replace("\n", " ")
+    return ("…" if start else "") + text + ("…" if start + SNIPPET_CHARS * 2 < len(body) else "")
+
+
+_index: SearchIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SearchIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex()
+        return _index
+
+
+@kai_capability(
+    id="search_context",
+    name="過去の文脈の全文検索",
+    description="会話ログ・議事録の決定事項・docs/*.md を横断して全文検索し、関連度順に該当箇所を返します。",
+    requires_confirm=False,
+    enabled=True
+)
+def search_context(query: str, limit: int = 10, source: str | None = None) -> list[dict]:
+    """
+    過去の会話・議事録・ドキュメントから query に関連する箇所を探す。
+    - source: "conversation" / "minutes" / "doc" で絞り込み（省略時は全て）
+
+    Returns: [{"score", "source", "path", "locator", "title", "snippet"}, ...]
+    """
+    return get_index().search(query, limit, source=source)
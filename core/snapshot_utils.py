@@ -1,27 +1,52 @@
 # core/snapshot_utils.py
-# core/snapshot_utils.py – use current interpreter for snapshot generation
+# core/snapshot_utils.py – master_snapshot.json の再生成・読み込み
 """Utility: regenerate master_snapshot.json for Kai.
-This patch replaces hard‑coded 'python' with sys.executable so that the
-script runs inside the same virtual‑env (PyYAML import works).
+
+再生成はプロセス内で行う（core.master_snapshot）。前回結果をメモリに保持するので、
+変更の無いファイルは stat だけで済む。background=True なら debounce 付きで
+バックグラウンド実行し、呼び出し側をブロックしない。
 """
 from __future__ import annotations
 
+import atexit
 import os
-import subprocess
-import sys
 import json
 
-SNAPSHOT_PATH = "output/master_snapshot.json"
+from core.master_snapshot import OUTPUT_PATH, MasterSnapshot
+
+SNAPSHOT_PATH = OUTPUT_PATH
+
+_generator: MasterSnapshot | None = None
+
+
+def get_snapshot_generator() -> MasterSnapshot:
+    global _generator
+    if _generator is None:
+        _generator = MasterSnapshot()
+        atexit.register(_generator.wait, 30)   # 予約済みの再生成は終了前に済ませる
+    return _generator
 
-def regenerate_master_snapshot() -> None:
-    """Generate master_snapshot.json using the active Python interpreter."""
+
+def regenerate_master_snapshot(*, background: bool = False, delay: float | None = None) -> None:
+    """master_snapshot.json を差分更新する。
+
+    background=True なら delay 秒（既定 KAI_SNAPSHOT_DEBOUNCE）後にまとめて実行し、すぐ戻る。
+    """
+    gen = get_snapshot_generator()
+    if background:
+        gen.request(delay)
+        return
     print("🛠 Generating master_snapshot.json ...", flush=True)
+    gen.regenerate()
+
+
+def wait_for_snapshot(timeout: float | None = None) -> bool:
+    """バックグラウンド再生成が終わるまで待つ（master_snapshot.json を commit する前など）"""
+    return get_snapshot_generator().wait(timeout)
+
 
-    # Use the exact interpreter running this process to guarantee the same venv
-    subprocess.run(
-        [sys.executable, "scripts/gen_master_snapshot.py"],
-        check=True,
-    )
+def snapshot_status() -> dict:
+    return get_snapshot_generator().status()
 
 
 def load_master_snapshot():
@@ -4,19 +4,25 @@ import os
 import json
 from typing import List, Dict
 
+from core.fs_walker import Walker
+
+SKIP_DIRS = {".git", ".venv", "__pycache__"}
+
 
 def scan_project_structure(base_path: str = ".") -> Dict[str, List[str]]:
     """
     プロジェクトのディレクトリ構造と主要ファイル一覧を辞書形式で返す。
     """
-    structure = {}
-    for root, dirs, files in os.walk(base_path):
-        if any(skip in root for skip in [".venv", "__pycache__", ".git"]):
-            continue
-        rel_root = os.path.relpath(root, base_path)
-        if rel_root == ".":
-            rel_root = ""
-        structure[rel_root] = sorted(files)
+    structure = {"": []}
+    walker = Walker(base_path, skip_dirs=SKIP_DIRS, ignore_files=(".gitignore",), include_dirs=True)
+    for entry in walker:
+        if entry.is_dir:
+            structure[entry.rel] = []
+        else:
+            parent = entry.rel.rsplit("/", 1)[0] if "/" in entry.rel else ""
+            structure[parent].append(entry.name)
+    for files in structure.values():
+        files.sort()
     return structure
 
 
@@ -1,7 +1,7 @@
-import openai
 import os
 import json
 
+from core import llm_client
 from core.capabilities_registry import kai_capability
 
 DOCS_DIR = "docs"  # app.pyでも同じなので合わせます
@@ -18,14 +18,16 @@ def generate_tags(text: str) -> list[str]:
     system_prompt = "あなたはプロジェクト管理支援AIです。以下の内容を読んで、簡潔な日本語タグを最大3個生成してください。出力はリスト形式で。"
 
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
+        tags_text = llm_client.chat(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": text}
-            ]
-        )
-        tags_text = response.choices[0].message.content.strip()
+            ],
+            model="gpt-4.1",
+            temperature=0,
+            tag="generate_tags",
+            cache=True,
+        ).strip()
         tags = [tag.strip("・- ") for tag in tags_text.splitlines() if tag.strip()]
         return tags[:3]
     except Exception as e:
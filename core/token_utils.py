@@ -0,0 +1,43 @@
+# core/token_utils.py – トークン数カウント
+"""
+scripts/check_tokens.py と同じく tiktoken の encoding_for_model で数える。
+tiktoken が無い環境では文字数ベースの概算にフォールバックする。
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+DEFAULT_MODEL = "gpt-4"
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 未インストール時は概算
+    tiktoken = None
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _estimate(text: str) -> int:
+    # 概算: ASCII は約 4 文字 / token、それ以外（日本語など）は約 1 文字 / token
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """text のトークン数を返す。"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return _estimate(text)
+    return len(_encoding(model).encode(text))
+
+
+def count_message_tokens(messages: list[dict], model: str = DEFAULT_MODEL) -> int:
+    """chat.completions 用 messages の概算トークン数（1 メッセージあたり 4 token のオーバーヘッド込み）。"""
+    return sum(count_tokens(m.get("content") or "", model) + 4 for m in messages) + 2
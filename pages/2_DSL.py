@@ -1,23 +1,15 @@
 import streamlit as st
 import json
-from pathlib import Path
-
-# --- CONFIG --------------------------------------------------------------
-DSL_PATH = Path("dsl/integrated_dsl.jsonl")
 
 # --- UTILS --------------------------------------------------------------
 
 def load_dsl():
-    if DSL_PATH.exists():
-        return DSL_PATH.read_text(encoding="utf-8")
-    return ""
-
-def save_dsl(text: str):
-    DSL_PATH.parent.mkdir(exist_ok=True)
-    DSL_PATH.write_text(text, encoding="utf-8")
+    # 生ファイルではなくストアから読む（3_DSL_Review の未 compaction 分も含める）
+    from core import dsl_engine
+    return "\n".join(json.dumps(r, ensure_ascii=False) for r in dsl_engine.load_dsl())
 
-# dummy wrappers – will be swapped with real dsl_engine calls
-@st.cache_data(show_spinner=False)
+# 入力テキストでキャッシュすると apply 後に古い差分が出るので毎回計算する
+# （base 側のハッシュはストアに永続化されているので軽い）
 def plan_diff(new_text: str):
     from core import dsl_engine
     try:
@@ -45,7 +37,15 @@ if col1.button("Plan diff"):
     with st.spinner("Computing diff …"):
         diff = plan_diff(editor)
     st.write("### Diff")
-    st.json(diff)
+    if "error" in diff:
+        st.error(diff["error"])
+    else:
+        c = st.columns(4)
+        c[0].metric("add", len(diff["add"]))
+        c[1].metric("modify", len(diff["modify"]))
+        c[2].metric("delete", len(diff["delete"]))
+        c[3].metric("unchanged", diff["unchanged"])
+        st.json({k: diff[k] for k in ("add", "modify", "delete")})
 
 # Apply with decision id
 with st.expander("Apply changes", expanded=False):
@@ -55,8 +55,7 @@ with st.expander("Apply changes", expanded=False):
             st.error("decision_id is required")
         else:
             try:
-                msg = apply_dsl(editor, decision_id)
-                save_dsl(editor)
+                msg = apply_dsl(editor, decision_id)   # ストア経由で integrated_dsl.jsonl を書き直す
                 st.success(msg)
             except Exception as e:
                 st.error(f"Apply failed: {e}")
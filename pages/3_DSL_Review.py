@@ -16,8 +16,7 @@ st.title("🧠 DSL Purpose Review (integrated_dsl.jsonl)")
 # データロード
 # ------------------------------------------------------------------
 def load_low_conf_entries():
-    dsl = dsl_engine.load_dsl()
-    return [rec for rec in dsl if rec.get("confidence", 1.0) < 0.6]
+    return dsl_engine.get_store().filter(lambda rec: rec.get("confidence", 1.0) < 0.6)
 
 actions = {
     "save_and_next": "✅ 承認して次へ",
@@ -36,6 +35,8 @@ if not queue:
     st.stop()
 
 if idx >= len(queue):
+    # レビュー中の追記（ジャーナル）を integrated_dsl.jsonl へ畳み込む
+    dsl_engine.get_store().compact()
     st.success("🎉 全てのレビューが完了しました！")
     st.stop()
 
@@ -56,17 +57,13 @@ decision_id = st.text_input("decision_id (例: 20250511-review)")
 col1, col2 = st.columns(2)
 
 if col1.button(actions["save_and_next"]):
-    # 更新
-    full_dsl = dsl_engine.load_dsl()
-    for rec in full_dsl:
-        if rec["id"] == current["id"]:
-            rec["inferred_purpose"] = inferred
-            rec["confidence"] = confidence
-            if decision_id:
-                rec["decision_id"] = decision_id
-            break
-    # 保存 (冪等適用)
-    dsl_engine.apply(full_dsl)
+    # 更新（resource をキーに 1 レコードだけ書き込む）
+    rec = dsl_engine.get_store().get(current["resource"]) or current
+    rec["inferred_purpose"] = inferred
+    rec["confidence"] = confidence
+    if decision_id:
+        rec["decision_id"] = decision_id
+    dsl_engine.upsert_record(rec)
     # 次へ
     st.session_state.idx += 1
     st.experimental_rerun()
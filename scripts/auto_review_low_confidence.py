@@ -5,14 +5,28 @@ auto_review_low_confidence.py – integrated_dsl.jsonl の low-confidence 行を
 実行:
   python scripts/auto_review_low_confidence.py --mode heuristic
   python scripts/auto_review_low_confidence.py --mode gpt
+  python scripts/auto_review_low_confidence.py --mode gpt --no-cache   # 応答キャッシュを使わない
+  python scripts/auto_review_low_confidence.py --mode gpt --concurrency 8 --rpm 300
+
+gpt モードはスレッドプールで並列に問い合わせ、RPM / TPM のトークンバケットで
+レート制限を守る。結果は 1 件ごとに .dsl/auto_review_checkpoint.jsonl へ追記し、
+途中で落ちても再実行時に続きから再開する。最後に dsl_engine.apply を 1 回だけ呼び、
+反映が済んだらチェックポイントを消す。問い合わせに失敗した行は confidence を変えずに
+（0.6 未満のまま）残すので、次回の実行で再び対象になる。
 """
-import re, json, argparse, pathlib, hashlib, os, sys
-from core import dsl_engine
+import re, json, argparse, pathlib, hashlib, os, sys, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from core import dsl_engine, llm_client
+from core.rate_limit import TokenBucket
+from core.token_utils import count_tokens
 from dotenv import load_dotenv
 
 load_dotenv()  
 DSL_PATH = dsl_engine.DSL_PATH
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+CHECKPOINT_PATH = dsl_engine.ROOT / ".dsl" / "auto_review_checkpoint.jsonl"
+GPT_MAX_TOKENS = 60
 
 def infer_purpose_heuristic(rec_id: str) -> str:
     """関数 ID / ファイル名からざっくり推測"""
@@ -33,11 +47,9 @@ def infer_purpose_heuristic(rec_id: str) -> str:
         return "更新処理"
     return "目的不明"
 
-def infer_purpose_gpt(code_snippet: str, default: str) -> str:
-    """GPT-4o で 1 行 JSON を生成 {purpose:"...",confidence:0-1}"""
-    import openai, textwrap
-    openai.api_key = OPENAI_KEY
-    prompt = textwrap.dedent(f"""
+def build_prompt(code_snippet: str) -> str:
+    import textwrap
+    return textwrap.dedent(f"""
     あなたはソフトウェアアーキテクトです。
     次の Python コード片が何を目的とした関数か一言で要約し、日本語で返してください。
     返答は 30 文字以内で。
@@ -45,38 +57,122 @@ def infer_purpose_gpt(code_snippet: str, default: str) -> str:
     {code_snippet[:1200]}
     ---
     """)
+
+def ask_gpt_purpose(code_snippet: str) -> str:
+    return llm_client.chat(
+        [{"role":"user","content":build_prompt(code_snippet)}],
+        model="gpt-4o-mini",
+        temperature=0.2, max_tokens=GPT_MAX_TOKENS, tag="infer_purpose", cache=True).strip()
+
+# ─── チェックポイント ───────────
+def load_checkpoint(path: pathlib.Path = CHECKPOINT_PATH) -> dict[str, str]:
+    """前回までに確定した {id: purpose} を返す（壊れた末尾行は無視）。"""
+    done: dict[str, str] = {}
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+                done[item["id"]] = item["purpose"]
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return done
+
+class CheckpointWriter:
+    """結果を 1 件ずつ追記・flush する（複数スレッドから呼ばれる）。"""
+    def __init__(self, path: pathlib.Path = CHECKPOINT_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = path.open("a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, rid: str, purpose: str) -> None:
+        with self._lock:
+            self._fp.write(json.dumps({"id": rid, "purpose": purpose}, ensure_ascii=False) + "\n")
+            self._fp.flush()
+
+    def close(self) -> None:
+        self._fp.close()
+
+# ─── 並列 GPT レビュー ───────────
+def review_gpt_batch(targets: list[dict], concurrency: int = 4, rpm: float = 500,
+                     tpm: float = 200_000, checkpoint: pathlib.Path = CHECKPOINT_PATH) -> dict[str, str]:
+    """targets の inferred_purpose を並列に推定して {id: purpose} を返す。
+
+    チェックポイント済みの id は問い合わせない。失敗した行は結果にもチェックポイントにも
+    含めないので、呼び出し側はその行を未確定のまま残せる。
+    """
+    results = load_checkpoint(checkpoint)
+    todo = [rec for rec in targets if rec["id"] not in results]
+    if results:
+        print(f"↩️ チェックポイントから {len(results)} 件を再開します（残り {len(todo)} 件）")
+    if not todo:
+        return results
+
+    req_bucket = TokenBucket.per_minute(rpm, burst=max(1, concurrency))
+    tok_bucket = TokenBucket.per_minute(tpm, burst=max(tpm / 10, 4000))
+    writer = CheckpointWriter(checkpoint)
+
+    def work(rec: dict) -> tuple[str, str | None]:
+        rid = rec["id"]
+        snippet = rec.get("code", "") or rid
+        req_bucket.acquire()
+        tok_bucket.acquire(count_tokens(build_prompt(snippet)) + GPT_MAX_TOKENS)
+        try:
+            purpose = ask_gpt_purpose(snippet)
+        except Exception as e:
+            print(f"⚠️ GPT 失敗 ({rid}):", e, file=sys.stderr)
+            return rid, None
+        writer.write(rid, purpose)
+        return rid, purpose
+
     try:
-        rsp = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role":"user","content":prompt}],
-            temperature=0.2, max_tokens=60)
-        return rsp.choices[0].message.content.strip()
-    except Exception as e:
-        print("⚠️ GPT 失敗:", e, file=sys.stderr)
-        return default
-
-def main(mode: str):
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = [pool.submit(work, rec) for rec in todo]
+            for i, fut in enumerate(as_completed(futures), 1):
+                rid, purpose = fut.result()
+                if purpose is not None:
+                    results[rid] = purpose
+                if i % 10 == 0 or i == len(futures):
+                    print(f"  … {i}/{len(futures)} 件完了", flush=True)
+    finally:
+        writer.close()
+    return results
+
+def main(mode: str, concurrency: int = 4, rpm: float = 500, tpm: float = 200_000):
     dsl = dsl_engine.load_dsl()
+    targets = [rec for rec in dsl if rec.get("confidence", 1.0) < 0.6]
+
+    if mode == "gpt" and (OPENAI_KEY or llm_client.backend_name() == "fake"):
+        purposes = review_gpt_batch(targets, concurrency=concurrency, rpm=rpm, tpm=tpm)
+    else:
+        purposes = {rec["id"]: infer_purpose_heuristic(rec["id"]) for rec in targets}
+
     updated = 0
-    for rec in dsl:
-        if rec.get("confidence", 1.0) >= 0.6:
-            continue
+    for rec in targets:
         rid = rec["id"]
-        default_purp = infer_purpose_heuristic(rid)
-        if mode == "gpt" and OPENAI_KEY:
-            code = rec.get("code", "")
-            purpose = infer_purpose_gpt(code or rid, default_purp)
-        else:
-            purpose = default_purp
-        rec["inferred_purpose"] = purpose
+        if rid not in purposes:
+            continue   # 問い合わせ失敗: 次回も対象にするため低 confidence のまま残す
+        rec["inferred_purpose"] = purposes[rid]
         rec["confidence"] = 0.9
         rec["decision_id"] = f"auto-{mode}-{hashlib.sha1(rid.encode()).hexdigest()[:8]}"
         updated += 1
     dsl_engine.apply(dsl)
-    print(f"✅ auto-review 完了: {updated} 行を確定しました。")
+    CHECKPOINT_PATH.unlink(missing_ok=True)   # 確定分は DSL に反映済み
+    skipped = len(targets) - updated
+    print(f"✅ auto-review 完了: {updated} 行を確定しました。" + (f"（{skipped} 行は失敗のため未確定）" if skipped else ""))
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--mode", choices=["heuristic", "gpt"], default="heuristic")
+    ap.add_argument("--no-cache", action="store_true", help="LLM 応答キャッシュを読まずに再問い合わせする")
+    ap.add_argument("--concurrency", type=int, default=4, help="gpt モードの同時リクエスト数")
+    ap.add_argument("--rpm", type=float, default=500, help="1 分あたりの最大リクエスト数")
+    ap.add_argument("--tpm", type=float, default=200_000, help="1 分あたりの最大トークン数")
+    ap.add_argument("--restart", action="store_true", help="チェックポイントを破棄して最初からやり直す")
     args = ap.parse_args()
-    main(args.mode)
+    if args.no_cache:
+        os.environ["KAI_LLM_CACHE_BYPASS"] = "1"
+    if args.restart:
+        CHECKPOINT_PATH.unlink(missing_ok=True)
+    main(args.mode, concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+期間を指定して docs/minutes/<year>/minutes_YYYYMMDD.yaml をまとめて（再）生成する。
+
+    python scripts/backfill_minutes.py 2025-05-01 2025-05-21 [--workers 3] [--full] [--no-commit] [--no-push]
+
+* ログが前回の生成から変わっていない日は飛ばす（ハッシュは YAML の隣の .state.json）
+* 生成は上限付きのスレッドプールで並列に行い、最後に 1 回だけコミットする
+"""
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+import argparse
+from collections import Counter
+from datetime import date
+
+from core.minutes_utils import backfill_minutes, safe_push_minutes, BACKFILL_WORKERS
+
+ap = argparse.ArgumentParser()
+ap.add_argument("start", type=date.fromisoformat, help="開始日 (YYYY-MM-DD)")
+ap.add_argument("end", type=date.fromisoformat, nargs="?", help="終了日 (YYYY-MM-DD、省略時は開始日のみ)")
+ap.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="同時に生成する日数")
+ap.add_argument("--full", action="store_true", help="差分ではなくログ全体から作り直す")
+ap.add_argument("--no-commit", action="store_true", help="生成だけ行いコミットしない")
+ap.add_argument("--no-push", action="store_true", help="コミットはするが push しない")
+args = ap.parse_args()
+
+end = args.end or args.start
+results = backfill_minutes(args.start, end, full=args.full, workers=args.workers)
+for day, result in results.items():
+    print(f"{day:%Y-%m-%d}: {result}")
+
+counts = Counter(r if not r.startswith("error") else "error" for r in results.values())
+print("📝 " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())))
+
+generated = counts["incremental"] + counts["full"]
+if generated and not args.no_commit:
+    safe_push_minutes(f"docs: backfill minutes {args.start:%Y-%m-%d}..{end:%Y-%m-%d} ({generated} day(s))",
+                      push=not args.no_push)
+sys.exit(1 if counts["error"] else 0)
@@ -1,10 +1,14 @@
 # scripts/check_capability_overlap.py
 
+import sys
 import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 import json
-import ast
 from pathlib import Path
 
+from core import ast_index
+
 JSON_CAPABILITIES_PATH = "data/kai_capabilities.json"
 BASE_DIR = "."
 
@@ -29,16 +33,8 @@ def discover_functions_with_decorator():
     for file_path in targets:
         if not file_path.is_file():
             continue
-        with open(file_path, encoding="utf-8") as f:
-            tree = ast.parse(f.read(), filename=str(file_path))
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                name = node.name
-                has_decorator = any(
-                    isinstance(deco, ast.Call) and getattr(deco.func, "id", "") == "kai_capability"
-                    for deco in node.decorator_list or []
-                )
-                results[name] = has_decorator
+        for fn in ast_index.functions(file_path, strict=True):
+            results[fn["name"]] = fn["kai_capability"] is not None
     return results
 
 def main():
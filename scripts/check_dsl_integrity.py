@@ -1,26 +1,36 @@
 import sys, pathlib
 sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 
-import json
-import hashlib
+import argparse
 from core import dsl_engine
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 DSL_PATH = ROOT / "dsl" / "integrated_dsl.jsonl"
 SCHEMA_PATH = ROOT / "schemas" / "dsl_v0.1.json"
 
+ap = argparse.ArgumentParser()
+ap.add_argument("--full", action="store_true", help="applied_keys.json に記録済みのレコードも再検証する")
+args = ap.parse_args()
+
 # --- 1. Schema validation ---
+# 既定では applied_keys.json と内容ハッシュが一致しない（未検証の）レコードだけを検証
 try:
     dsl = dsl_engine.load_dsl()
-    dsl_engine.validate_dsl(dsl)
-    print("✓ Schema validation: PASSED")
+    applied = None if args.full else dsl_engine.load_applied_keys()
+    checked = dsl_engine.validate_dsl(dsl, applied_keys=applied)
+    print(f"✓ Schema validation: PASSED ({checked}/{len(dsl)} record(s) checked)")
+except dsl_engine.DSLValidationError as e:
+    print(f"❌ Schema validation FAILED: {len(e.errors)} error(s)")
+    for res, msg in e.errors:
+        print(" -", res, ":", msg)
+    sys.exit(1)
 except Exception as e:
     print(f"❌ Schema validation FAILED: {e}")
     sys.exit(1)
 
 # --- 2. Plan diff check (should be empty) ---
 try:
-    diff = dsl_engine.plan(dsl)
+    diff = dsl_engine.plan_changes(dsl_engine.plan(dsl))
     if diff:
         print(f"❌ Plan diff check FAILED: {len(diff)} unmatched resource(s):")
         for r in diff:
@@ -1,8 +1,20 @@
-import tiktoken
-from app import get_system_prompt
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
+from core.prompt_builder import get_system_prompt, section_stats, retrieval_stats
+from core.token_utils import count_tokens
 
-encoding = tiktoken.encoding_for_model("gpt-4")
 prompt = get_system_prompt()
-tokens = encoding.encode(prompt)
 
-print(f"🔢 プロンプトのトークン数: {len(tokens)}")
+print(f"🔢 プロンプトのトークン数: {count_tokens(prompt)}")
+for s in section_stats():
+    print(f"  - {s['section']:<24} {s['tokens']:>7} tokens  ({s['chars']} chars)")
+
+# 引数があればその発言に対する検索拡張プロンプトも計測する
+if len(sys.argv) > 1:
+    query = " ".join(sys.argv[1:])
+    retrieved = get_system_prompt(query)
+    print(f"🔎 「{query}」: {count_tokens(retrieved)} tokens")
+    for r in retrieval_stats():
+        score = "明示" if r["score"] is None else r["score"]   # 明示されたオンデマンド文書
+        print(f"  - {r['section']:<24} #{r['chunk']:<3} score {score:>7}  {r['tokens']:>5} tokens")
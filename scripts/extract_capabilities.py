@@ -1,38 +1,46 @@
-import ast
+import sys
 import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 import json
 
+from core import ast_index
+
 TARGET_DIRS = ["./app.py", "./core"]
 EXCLUDE_DIRS = {"venv", ".venv", ".git", ".streamlit", "__pycache__", "scripts", "tests"}
 OUTPUT_PATH = "kai_capabilities_generated.json"
 MAX_ENTRIES = 50
 
-def extract_functions_from_ast(tree, file_path):
+def _first_line(doc):
+    return doc.split("\n")[0] if doc else None
+
+
+def extract_functions_from_index(path, file_path):
     capabilities = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            docstring = ast.get_docstring(node)
+    defs = ast_index.definitions(path, strict=True)
+    for node in defs:
+        if node["kind"] == "function":
             capabilities.append({
                 "file": file_path,
                 "type": "function",
-                "name": node.name,
-                "args": [arg.arg for arg in node.args.args],
-                "doc": docstring.split("\n")[0] if docstring else None
+                "name": node["name"],
+                "args": node["args"],
+                "doc": _first_line(node["docstring"])
             })
-        elif isinstance(node, ast.ClassDef):
-            methods = []
-            for item in node.body:
-                if isinstance(item, ast.FunctionDef):
-                    docstring = ast.get_docstring(item)
-                    methods.append({
-                        "name": item.name,
-                        "args": [arg.arg for arg in item.args.args if arg.arg != "self"],
-                        "doc": docstring.split("\n")[0] if docstring else None
-                    })
+        else:
+            methods = [
+                {
+                    "name": fn["name"],
+                    "args": [a for a in fn["args"] if a != "self"],
+                    "doc": _first_line(fn["docstring"])
+                }
+                for fn in defs
+                if fn["kind"] == "function" and fn["class"] == node["name"]
+            ]
             capabilities.append({
                 "file": file_path,
                 "type": "class",
-                "name": node.name,
+                "name": node["name"],
                 "methods": methods
             })
     return capabilities
@@ -52,13 +60,11 @@ def scan_python_files():
                         paths_to_check.append(os.path.join(root, file))
 
         for file_path in paths_to_check:
-            with open(file_path, "r", encoding="utf-8") as f:
-                try:
-                    tree = ast.parse(f.read())
-                    capabilities = extract_functions_from_ast(tree, os.path.relpath(file_path))
-                    all_capabilities.extend(capabilities)
-                except Exception as e:
-                    print(f"Error parsing {file_path}: {e}")
+            try:
+                capabilities = extract_functions_from_index(file_path, os.path.relpath(file_path))
+                all_capabilities.extend(capabilities)
+            except Exception as e:
+                print(f"Error parsing {file_path}: {e}")
 
     return all_capabilities[:MAX_ENTRIES]
 
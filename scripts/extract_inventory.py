@@ -1,56 +1,132 @@
 #!/usr/bin/env python3
 """
 Walks core/**/*.py, docs/**/*.md, *.json (excluding .dslignore) and emits JSONLines:
-{"uri": "...", "type": "...", "path": "...", "name": "..."}
+{"uri": "...", "type": "...", "path": "...", "name": "...", "sha256": "..."}
+
+* 出力は 1 本のバッファ付きストリームに書き、最後に置き換える（途中で落ちても壊れない）
+* ハッシュは 1 ファイル 1 回（.py は AST インデックスのハッシュを流用）
+* --incremental: (mtime_ns, size) が前回と同じファイルは前回のレコードをそのまま使い、
+  変更されたファイルのレコードだけを作り直す（状態は .cache/inventory_state.json）
 """
-import ast, json, os, re, hashlib, pathlib
-import pathspec  # pip install pathspec
+import argparse, json, os, re, hashlib, pathlib, sys
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from core import ast_index
+from core.fs_walker import Walker
 OUT  = ROOT / "inventory.jsonl"
-IGNORE_FILE = ROOT / ".dslignore"
-
-# ── .dslignore ロード（あれば）
-ignore_spec = None
-if IGNORE_FILE.exists():
-    with open(IGNORE_FILE, "r", encoding="utf-8") as f:
-        ignore_spec = pathspec.PathSpec.from_lines("gitwildmatch", f)
-
-def should_ignore(path: pathlib.Path) -> bool:
-    if ignore_spec is None:
-        return False
-    rel_path = str(path.relative_to(ROOT)).replace(os.sep, "/")
-    return ignore_spec.match_file(rel_path)
-
-def py_items(path):
-    tree = ast.parse(path.read_text(encoding="utf-8"))
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            yield f"code://{path.relative_to(ROOT)}#{node.name}", "function", node.name
-        elif isinstance(node, ast.ClassDef):
-            yield f"code://{path.relative_to(ROOT)}#{node.name}", "class", node.name
-
-def emit(uri, rtype, path, name):
-    print(json.dumps({
-        "uri": uri,
-        "type": rtype,
-        "path": str(path),
-        "name": name,
-        "sha256": hashlib.sha256(open(path, "rb").read()).hexdigest()[:8]
-    }), file=OUT.open("a", encoding="utf-8"))
-
-if OUT.exists():
-    OUT.unlink()
-
-for path in ROOT.rglob("*"):
-    if path.is_dir() or should_ignore(path):
-        continue
-    if re.match(r".*\.py$", path.name):
-        for uri, tp, nm in py_items(path):
-            emit(uri, tp, path, nm)
-    elif re.match(r".*\.md$", path.name):
-        emit(f"doc://{path.relative_to(ROOT)}", "doc", path, path.name)
-    elif re.match(r".*\.json$", path.name):
-        emit(f"json://{path.relative_to(ROOT)}", "json", path, path.name)
-
-print(f"📝 inventory written to {OUT}")
+STATE_PATH = ROOT / ".cache" / "inventory_state.json"
+WRITE_BUFFER = 1024 * 1024
+
+KINDS = [(re.compile(r".*\.py$"), "code"), (re.compile(r".*\.md$"), "doc"), (re.compile(r".*\.json$"), "json")]
+
+
+def kind_of(name):
+    return next((kind for pattern, kind in KINDS if pattern.match(name)), None)
+
+
+def short_hash(path, kind):
+    if kind == "code":
+        return ast_index.get_index().sha256(path)[:8]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(WRITE_BUFFER):
+            h.update(chunk)
+    return h.hexdigest()[:8]
+
+
+def file_records(entry, kind):
+    """1 ファイル分のレコードを生成する（ハッシュは 1 回だけ計算）"""
+    path = entry.path
+    digest = short_hash(path, kind)
+    if kind == "code":
+        items = [(f"code://{entry.rel}#{n['name']}", n["kind"], n["name"])
+                 for n in ast_index.definitions(path, strict=True)]
+    elif kind == "doc":
+        items = [(f"doc://{entry.rel}", "doc", entry.name)]
+    else:
+        items = [(f"json://{entry.rel}", "json", entry.name)]
+    for uri, rtype, name in items:
+        yield {"uri": uri, "type": rtype, "path": path, "name": name, "sha256": digest}
+
+
+def load_previous(out=None):
+    """前回の inventory.jsonl を path ごとにまとめる"""
+    out = out or OUT
+    previous = {}
+    try:
+        with open(out, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    previous.setdefault(rec["path"], []).append(rec)
+    except FileNotFoundError:
+        pass
+    return previous
+
+
+def load_state():
+    try:
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def iter_inventory(previous=None, state=None, new_state=None, stats=None):
+    """inventory のレコードを走査順に生成する。
+
+    previous / state が与えられ、(mtime_ns, size) が state と一致するファイルは
+    previous のレコードを再利用する。new_state には今回の状態を書き込む。
+    """
+    previous = previous or {}
+    state = state or {}
+    stats = stats if stats is not None else {}
+    stats.setdefault("reused", 0)
+    stats.setdefault("rebuilt", 0)
+    # .dslignore 対象のディレクトリには降りない
+    for entry in Walker(ROOT, ignore_files=(".dslignore",)):
+        kind = kind_of(entry.name)
+        if kind is None:
+            continue
+        key = [entry.stat.st_mtime_ns, entry.stat.st_size]
+        if new_state is not None:
+            new_state[entry.path] = key
+        if state.get(entry.path) == key and entry.path in previous:
+            stats["reused"] += 1
+            yield from previous[entry.path]
+            continue
+        stats["rebuilt"] += 1
+        yield from file_records(entry, kind)
+
+
+def write_inventory(records, out=None):
+    """1 本のバッファ付きストリームに書き出し、件数を返す"""
+    out = out or OUT
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    count = 0
+    with open(tmp, "w", encoding="utf-8", buffering=WRITE_BUFFER) as f:
+        for rec in records:
+            f.write(json.dumps(rec))
+            f.write("\n")
+            count += 1
+    os.replace(tmp, out)
+    return count
+
+
+def main(incremental=False):
+    previous = load_previous() if incremental else None
+    state = load_state() if incremental else None
+    new_state, stats = {}, {}
+    count = write_inventory(iter_inventory(previous, state, new_state, stats))
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    STATE_PATH.write_text(json.dumps(new_state), encoding="utf-8")
+    ast_index.get_index().save()
+    print(f"📝 inventory written to {OUT} ({count} records, "
+          f"{stats['rebuilt']} files rebuilt, {stats['reused']} reused)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--incremental", action="store_true", help="変更されたファイルのエントリだけ作り直す")
+    args = ap.parse_args()
+    main(incremental=args.incremental)
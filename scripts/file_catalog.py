@@ -1,7 +1,12 @@
+import sys
 import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
 import json
 from datetime import datetime
 
+from core.fs_walker import Walker
+
 # ───────────────────────────────────────
 # file_catalog.py
 # Kaiプロジェクトの全ファイル構造を走査し、
@@ -54,23 +59,18 @@ def infer_purpose(path):
 
 def build_catalog():
     catalog = []
-    for root, dirs, files in os.walk(ROOT_DIR):
-        # スキップ対象除外
-        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
-        for file in files:
-            rel_path = os.path.relpath(os.path.join(root, file), ROOT_DIR)
-            entry = {
-                "path": rel_path.replace("\\", "/"),
-                "filename": file,
-                "type": infer_type(file),
-                "purpose": infer_purpose(rel_path),
-                "last_modified": datetime.fromtimestamp(
-                    os.path.getmtime(os.path.join(root, file))
-                ).isoformat(),
-                "size": os.path.getsize(os.path.join(root, file)),
-                "is_active": True  # 初期値。後で self_state_builder が判定補正
-            }
-            catalog.append(entry)
+    # スキップ対象・.gitignore 対象のディレクトリには降りない
+    for f in Walker(ROOT_DIR, skip_dirs=SKIP_DIRS, ignore_files=(".gitignore",), workers=4):
+        entry = {
+            "path": f.rel,
+            "filename": f.name,
+            "type": infer_type(f.name),
+            "purpose": infer_purpose(f.rel),
+            "last_modified": datetime.fromtimestamp(f.stat.st_mtime).isoformat(),
+            "size": f.stat.st_size,
+            "is_active": True  # 初期値。後で self_state_builder が判定補正
+        }
+        catalog.append(entry)
     return catalog
 
 
@@ -1,93 +1,25 @@
+import sys
 import os
-import json
-import hashlib
-import yaml
-import ast
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-REPO_ROOT = "."
-OUTPUT_PATH = "output/master_snapshot.json"
-DIR_WHITELIST = ["", "core/", "scripts/", "docs/"]  # これは data/dir_whitelist.json を読む形に変更可
+import argparse
 
+from core.master_snapshot import OUTPUT_PATH, build_snapshot, load_previous_snapshot, write_snapshot
 
-def md5_of_file(path):
-    hash_md5 = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
 
-
-def extract_ast_info(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            src = f.read()
-        tree = ast.parse(src)
-        functions = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                name = node.name
-                args = ast.unparse(node.args) if hasattr(ast, "unparse") else "(…)"
-                decorators = [d.id for d in node.decorator_list if isinstance(d, ast.Name)]
-                functions.append({
-                    "name": name,
-                    "signature": f"def {name}{args}",
-                    "capability": next((d for d in decorators if d.startswith("kai_")), None),
-                    "loc": len(src.splitlines())
-                })
-        return {"functions": functions}
-    except Exception as e:
-        return {"error": str(e)}
-
-
-def extract_frontmatter(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        if not lines or not lines[0].strip() == "---":
-            return None
-        end = next(i for i, line in enumerate(lines[1:], start=1) if line.strip() == "---")
-        yaml_block = "".join(lines[1:end])
-        return yaml.safe_load(yaml_block)
-    except Exception as e:
-        return {"error": str(e)}
-
-
-def is_in_whitelist(path):
-    return any(path.startswith(os.path.join(REPO_ROOT, d)) for d in DIR_WHITELIST)
-
-
-def gen_master_snapshot():
-    snapshot = []
-    for root, _, files in os.walk(REPO_ROOT):
-        for fname in files:
-            full_path = os.path.join(root, fname)
-            rel_path = os.path.relpath(full_path, REPO_ROOT)
-            if not is_in_whitelist(full_path):
-                continue
-            if ".git" in rel_path or ".venv" in rel_path:
-                continue
-
-            record = {
-                "path": rel_path,
-                "md5": md5_of_file(full_path),
-                "size": os.path.getsize(full_path),
-                "mtime": os.path.getmtime(full_path)
-            }
-
-            if fname.endswith(".py"):
-                record["ast"] = extract_ast_info(full_path)
-            elif fname.endswith(".md") or fname.endswith(".json"):
-                fm = extract_frontmatter(full_path)
-                if fm:
-                    record["frontmatter"] = fm
-
-            snapshot.append(record)
-
-    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(snapshot, f, indent=2, ensure_ascii=False)
-    print(f"✅ master_snapshot.json generated: {OUTPUT_PATH} ({len(snapshot)} files)")
+def gen_master_snapshot(incremental=True):
+    previous = load_previous_snapshot() if incremental else {}
+    snapshot, changed = build_snapshot(previous)
+    if incremental and changed == 0 and len(snapshot) == len(previous):
+        print(f"✅ master_snapshot.json is up to date: {OUTPUT_PATH} ({len(snapshot)} files)")
+        return snapshot
+    write_snapshot(snapshot)
+    print(f"✅ master_snapshot.json generated: {OUTPUT_PATH} ({len(snapshot)} files, {changed} updated)")
+    return snapshot
 
 
 if __name__ == "__main__":
-    gen_master_snapshot()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--full", action="store_true", help="前回の結果を使わずに全ファイルを処理する")
+    args = ap.parse_args()
+    gen_master_snapshot(incremental=not args.full)
@@ -1,15 +1,16 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 import os
 import json
-from openai import OpenAI
+
+from core import llm_client
 
 # パス設定
 PRIORITY_PATH = "docs/capability_priorities.json"
 CORE_DIR = "core"
 PATCH_DIR = "patches"
 
-# APIクライアント
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # GPTプロンプト
 SYSTEM_PROMPT = """
 あなたはプロジェクトマネージャーAI Kaiの能力拡張を支援するAIエンジニアです。
@@ -35,15 +36,15 @@ def load_priorities():
 
 def request_skeleton(cap_id):
     user_prompt = f"機能ID: {cap_id}\nこの機能の目的を踏まえ、Kaiが使用するPythonスケルトン関数を1つ作成してください。"
-    response = client.chat.completions.create(
-        model="gpt-4-1106-preview",
-        messages=[
+    return llm_client.chat(
+        [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=0.3
-    )
-    return response.choices[0].message.content.strip()
+        model="gpt-4-1106-preview",
+        temperature=0.3,
+        tag="capability_skeleton",
+    ).strip()
 
 def save_skeleton_file(cap_id, code_text):
     os.makedirs(CORE_DIR, exist_ok=True)
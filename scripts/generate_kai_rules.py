@@ -1,6 +1,8 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 import os
 import json
-import openai
 from dotenv import load_dotenv
 
 DOCS_DIR = "docs"
@@ -8,7 +10,7 @@ OUTPUT_PATH = "data/kai_rules.json"
 MODEL = "gpt-4.1"
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from core import llm_client
 
 
 def load_docs():
@@ -28,6 +30,9 @@ Kaiが「プロジェクトマネージャーAI」として活動する際に従
 - Kaiが自分自身に対して適用すべき制約や判断基準
 - 実行許可条件、禁止事項、承認要否などを含む
 - `id`, `description`, `scope`, `severity`を含む構造
+- 機械的に判定できるルールには `applies_to`（対象 action 名の配列）と `when`（action_context に対する条件）を付ける
+  - `when` の書式: {{"フィールド": 値}} は一致、{{"フィールド": {{"gt": 1, "default": 0}}}} のように
+    eq / ne / in / not_in / gt / gte / lt / lte / truthy / exists を指定できる。any / all / not で組み合わせ可
 
 # ドキュメント内容:
 {doc_text}
@@ -40,21 +45,23 @@ Kaiが「プロジェクトマネージャーAI」として活動する際に従
       "id": "rule_id",
       "description": "説明文",
       "scope": "対象領域（例：self_modification, document_update, git_ops など）",
-      "severity": "low / medium / high"
+      "severity": "low / medium / high",
+      "applies_to": ["apply_update"],
+      "when": {{"approved": {{"truthy": false}}}}
     }},
     ...
   ]
 }}
 """
 
-    response = openai.chat.completions.create(
-        model=MODEL,
-        messages=[
+    return llm_client.chat(
+        [
             {"role": "system", "content": "あなたはプロジェクトマネジメントAI Kaiの監査ルールを定義する支援者です。"},
             {"role": "user", "content": prompt.strip()}
-        ]
+        ],
+        model=MODEL,
+        tag="generate_kai_rules",
     )
-    return response.choices[0].message.content
 
 
 def parse_json_response(text):
@@ -69,6 +76,23 @@ def parse_json_response(text):
         return {}
 
 
+def merge_with_existing(parsed, path=OUTPUT_PATH):
+    """既存ファイルの parameters と、同じ id のルールの applies_to / when を引き継ぐ"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            existing = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return parsed
+    parsed.setdefault("parameters", existing.get("parameters", {}))
+    old = {r.get("id"): r for r in existing.get("rules", [])}
+    for rule in parsed.get("rules", []):
+        prev = old.get(rule.get("id"), {})
+        for key in ("applies_to", "when"):
+            if key not in rule and key in prev:
+                rule[key] = prev[key]
+    return parsed
+
+
 def main():
     doc_text = load_docs()
     gpt_output = call_gpt_for_rules(doc_text)
@@ -77,6 +101,7 @@ def main():
     print("\n=======================\n")
     parsed = parse_json_response(gpt_output)
     if parsed:
+        parsed = merge_with_existing(parsed)
         os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
         with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
             json.dump(parsed, f, ensure_ascii=False, indent=2)
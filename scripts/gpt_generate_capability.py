@@ -1,10 +1,11 @@
-import openai
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-
-openai.api_key = os.getenv("OPENAI_API_KEY")  # .env に保存されていること前提
+from core import llm_client  # OPENAI_API_KEY は .env に保存されていること前提
 
 SYSTEM_PROMPT = """あなたはPython開発に精通したアシスタントです。
 以下の機能IDが示す Kai に必要な機能について、日本語でその役割・目的を説明し、
@@ -20,18 +21,15 @@ def request_capability_skeleton(capability_id):
     user_prompt = f"必要な機能ID: {capability_id}"
     print(f"🧠 GPTへ問い合わせ中: {capability_id}")
 
-    client = openai.OpenAI()
-
-    response = client.chat.completions.create(
-        model="gpt-4-1106-preview",  # または "gpt-4.1"（動作すればOK）
-        messages=[
+    reply = llm_client.chat(
+        [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=0.3
-    )
-
-    reply = response.choices[0].message.content.strip()
+        model="gpt-4-1106-preview",  # または "gpt-4.1"（動作すればOK）
+        temperature=0.3,
+        tag="capability_skeleton",
+    ).strip()
     print("\n📄 提案されたスケルトン:\n")
     print(reply)
 
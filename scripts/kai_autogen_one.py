@@ -1,16 +1,16 @@
 import os
 import sys
 import json
-from openai import OpenAI
+import pathlib
 
-# パス設定修正：scripts/配下をimportできるように
+# パス設定修正：scripts/配下・リポジトリルートをimportできるように
 sys.path.append("scripts")
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
 from next_task_selector import select_next_task
+from core import llm_client
 
 CORE_DIR = "core"
 PATCH_DIR = "patches"
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 SYSTEM_PROMPT = """
 あなたはプロジェクトマネージャーAI Kai の機能拡張エンジニアです。
@@ -31,15 +31,15 @@ def extract_python_code_block(text):
 
 def request_skeleton(cap_id):
     prompt = f"機能ID: {cap_id} に対応する Kai の関数スケルトンを作ってください。"
-    response = client.chat.completions.create(
-        model="gpt-4-1106-preview",
-        messages=[
+    return llm_client.chat(
+        [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
-        temperature=0.3
-    )
-    return response.choices[0].message.content.strip()
+        model="gpt-4-1106-preview",
+        temperature=0.3,
+        tag="capability_skeleton",
+    ).strip()
 
 def write_stub_file(cap_id, code_text):
     os.makedirs(CORE_DIR, exist_ok=True)
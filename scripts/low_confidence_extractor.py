@@ -5,19 +5,20 @@
 出力: low_confidence_functions.jsonl
 """
 
-import json, pathlib, ast
+import json, pathlib, sys
 from typing import List, Dict
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+from core import ast_index
 INPUT = ROOT / "draft_dsl_filtered_v2_inferred.jsonl"
 OUTPUT = ROOT / "low_confidence_functions.jsonl"
 
 def extract_function_code(file_path: pathlib.Path, name: str) -> str:
     try:
-        tree = ast.parse(file_path.read_text(encoding="utf-8"))
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
-                return ast.get_source_segment(file_path.read_text(encoding="utf-8"), node)
+        node = ast_index.find_function(file_path, name, include_async=True)
+        if node is not None:
+            return ast_index.source_segment(file_path.read_text(encoding="utf-8"), node)
     except Exception as e:
         return f"# コード抽出エラー: {e}"
     return "# 関数が見つかりません"
@@ -1,12 +1,12 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 import os
 import json
 import datetime
-from openai import OpenAI
 from capability_diff import find_missing_capabilities
 
-# ✅ APIキー取得
-openai_api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=openai_api_key)
+from core import llm_client  # ✅ APIキーは OPENAI_API_KEY から取得
 
 # ✅ GPT用プロンプト（日本語・堅め）
 SYSTEM_PROMPT = """
@@ -29,15 +29,15 @@ SYSTEM_PROMPT = """
 
 def propose_priorities(capability_ids):
     user_prompt = f"不足能力一覧: {capability_ids}"
-    response = client.chat.completions.create(
-        model="gpt-4-1106-preview",
-        messages=[
+    return llm_client.chat(
+        [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ],
-        temperature=0.4
-    )
-    return response.choices[0].message.content.strip()
+        model="gpt-4-1106-preview",
+        temperature=0.4,
+        tag="priority_proposer",
+    ).strip()
 
 def save_outputs(json_obj):
     os.makedirs("docs", exist_ok=True)
@@ -1,8 +1,12 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 import json
 import os
-import openai
 from dotenv import load_dotenv
 
+from core import llm_client
+
 PATCH_PATH = "kai_capabilities_patch.json"
 OUTPUT_PATH = "kai_capabilities_completion.json"
 MODEL = "gpt-4"
@@ -28,14 +32,14 @@ def call_gpt_capability_completion(item):
 - name: Kaiの能力名（日本語）
 - description: 具体的な機能説明（日本語、1文〜2文）
 """
-    response = openai.chat.completions.create(
-        model=MODEL,
-        messages=[
+    content = llm_client.chat(
+        [
             {"role": "system", "content": "あなたはKaiというAIエージェントの能力管理支援AIです。"},
             {"role": "user", "content": prompt.strip()}
-        ]
+        ],
+        model=MODEL,
+        tag="capability_completion",
     )
-    content = response.choices[0].message.content
     return parse_completion_response(content, item)
 
 def parse_completion_response(text, item):
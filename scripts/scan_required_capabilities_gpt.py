@@ -1,6 +1,8 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+
 import os
 import json
-import openai
 import re
 from dotenv import load_dotenv
 
@@ -15,7 +17,7 @@ OUTPUT_PATH = "data/needed_capabilities_gpt.json"
 MODEL = "gpt-4.1"
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from core import llm_client
 
 
 def load_docs():
@@ -52,14 +54,14 @@ JSON形式で以下のように出力してください：
 }}
 """
 
-    response = openai.chat.completions.create(
-        model=MODEL,
-        messages=[
+    result = llm_client.chat(
+        [
             {"role": "system", "content": "あなたはプロジェクトマネージャー支援AIです。Kaiに必要な能力を提案してください。"},
             {"role": "user", "content": prompt.strip()}
-        ]
+        ],
+        model=MODEL,
+        tag="scan_required_capabilities",
     )
-    result = response.choices[0].message.content
     print("\n===== GPT OUTPUT =====\n")
     print(result)
     print("\n=======================\n")
@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ast_index import ASTIndex, source_segment
+
+SOURCE = '''LIMIT = 3
+
+@kai_capability(id="greet", name="Greet", description="挨拶", requires_confirm=False)
+def greet(name, polite=True):
+    """挨拶する"""
+    return name
+
+class Box:
+    def put(self, item):
+        pass
+'''
+
+def test_parses_once_and_reuses_by_content_hash(tmp_path):
+    src = tmp_path / "mod.py"
+    src.write_text(SOURCE, encoding="utf-8")
+    index = ASTIndex(tmp_path / "idx.json")
+    info = index.get(src)
+    greet = info["functions"][0]
+    assert greet["signature"] == "def greet(name, polite=True)"
+    assert greet["kai_capability"]["id"] == "greet"
+    assert [f["class"] for f in info["functions"]] == [None, "Box"]
+    assert info["classes"][0]["methods"] == ["put"]
+    assert info["constants"] == [{"name": "LIMIT", "lineno": 1, "value": 3, "type": "int"}]
+    assert source_segment(SOURCE, greet).startswith("def greet(")
+    index.save()
+
+    copy = tmp_path / "copy.py"                     # 別パスでも内容が同じなら再解析しない
+    copy.write_text(SOURCE, encoding="utf-8")
+    reloaded = ASTIndex(tmp_path / "idx.json")
+    assert reloaded.get(src) == info and reloaded.get(copy) == info
+    assert reloaded.parsed == 0
+
+    src.write_text(SOURCE + "\ndef extra():\n    pass\n", encoding="utf-8")
+    assert "extra" in [f["name"] for f in reloaded.get(src)["functions"]]
+    assert reloaded.parsed == 1
+
+def test_syntax_error_is_recorded(tmp_path):
+    src = tmp_path / "broken.py"
+    src.write_text("def oops(:\n", encoding="utf-8")
+    index = ASTIndex(tmp_path / "idx.json")
+    assert index.get(src)["error"].startswith("SyntaxError")
+    try:
+        index.get(src, strict=True)
+    except SyntaxError:
+        pass
+    else:
+        raise AssertionError("strict=True should raise")
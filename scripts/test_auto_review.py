@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import json
+import threading
+import time
+
+import pytest
+
+import auto_review_low_confidence as review
+from core import llm_client
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    monkeypatch.setenv("KAI_LLM_CACHE_BYPASS", "1")
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF", 0)
+    yield
+    llm_client.set_backend(None)
+
+def _targets(n):
+    return [{"id": f"fn_{i}", "code": f"def fn_{i}(): pass", "confidence": 0.3} for i in range(n)]
+
+def test_review_runs_concurrently_and_checkpoints(tmp_path, fake_llm):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def responder(msgs, model):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "目的 " + msgs[0]["content"].split("def ")[1].split("(")[0]
+
+    backend = llm_client.FakeLLMBackend(delay=0, responder=responder)
+    llm_client.set_backend(backend)
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    results = review.review_gpt_batch(_targets(8), concurrency=4, rpm=10_000, checkpoint=checkpoint)
+
+    assert results == {f"fn_{i}": f"目的 fn_{i}" for i in range(8)}
+    assert peak[0] > 1
+    assert len(checkpoint.read_text(encoding="utf-8").splitlines()) == 8
+
+def test_resume_from_checkpoint_skips_done_and_retries_failures(tmp_path, fake_llm):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text("\n".join(json.dumps({"id": f"fn_{i}", "purpose": "済"}) for i in range(3))
+                          + '\n{"id": "fn_3", "pur', encoding="utf-8")   # 書きかけの末尾行は無視
+    asked = []
+
+    def responder(msgs, model):
+        rid = msgs[0]["content"].split("def ")[1].split("(")[0]
+        asked.append(rid)
+        if rid == "fn_4":
+            raise ValueError("bad response")
+        return "新規"
+
+    llm_client.set_backend(llm_client.FakeLLMBackend(delay=0, responder=responder))
+    results = review.review_gpt_batch(_targets(6), concurrency=2, rpm=10_000, checkpoint=checkpoint)
+
+    assert sorted(asked) == ["fn_3", "fn_4", "fn_5"]
+    assert results == {"fn_0": "済", "fn_1": "済", "fn_2": "済", "fn_3": "新規", "fn_5": "新規"}
+    assert "fn_4" not in review.load_checkpoint(checkpoint)   # 失敗分は次回また問い合わせる
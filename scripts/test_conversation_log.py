@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from core import conversation_log
+
+def test_append_and_read_jsonl():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = conversation_log.log_path_for("20250601", conv_dir=Path(tmp))
+        conversation_log.append_message("user", "こんにちは", path=path)
+        conversation_log.append_message("assistant", "はい", path=path)
+        conversation_log.flush(path)
+
+        lines = path.read_text(encoding="utf-8").splitlines()
+        assert len(lines) == 2
+        msgs = conversation_log.load_messages(path)
+        assert [m["role"] for m in msgs] == ["user", "assistant"]
+        assert msgs[0]["content"] == "こんにちは"
+
+def test_legacy_json_and_jsonl_same_day():
+    with tempfile.TemporaryDirectory() as tmp:
+        conv_dir = Path(tmp)
+        legacy = conv_dir / "conversation_20250601.json"
+        legacy.write_text(json.dumps({
+            "log_id": "20250601",
+            "messages": [{"role": "user", "content": "old", "ts": "2025-06-01T09:00:00+09:00"}],
+        }), encoding="utf-8")
+        path = conversation_log.log_path_for("2025-06-01", conv_dir=conv_dir)
+        conversation_log.append_message("user", "new", path=path)
+
+        msgs = conversation_log.load_day_messages("20250601", conv_dir=conv_dir)
+        assert [m["content"] for m in msgs] == ["old", "new"]
+        names = [p.name for p in conversation_log.list_log_files(conv_dir)]
+        assert names == ["conversation_20250601.json", "conversation_20250601.jsonl"]
+
+def test_truncated_line_is_skipped():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "conversation_20250601.jsonl"
+        conversation_log.append_message("user", "ok", path=path)
+        with path.open("a", encoding="utf-8") as fp:
+            fp.write('{"role": "user", "cont')
+        assert [m["content"] for m in conversation_log.iter_messages(path)] == ["ok"]
+
+        # 書きかけの行の後に追記しても新しいメッセージは失われない
+        conversation_log.append_message("assistant", "next", path=path)
+        assert [m["content"] for m in conversation_log.iter_messages(path)] == ["ok", "next"]
+        assert path.read_text(encoding="utf-8").endswith("\n")
+
+def test_concurrent_appends_are_not_lost():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "conversation_20250601.jsonl"
+
+        def worker(n):
+            for i in range(50):
+                conversation_log.append_message("user", f"{n}-{i}", path=path)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(conversation_log.load_messages(path)) == 200
+
+if __name__ == "__main__":
+    test_append_and_read_jsonl()
+    test_legacy_json_and_jsonl_same_day()
+    test_truncated_line_is_skipped()
+    test_concurrent_appends_are_not_lost()
+    print("✅ All conversation_log tests passed.")
@@ -0,0 +1,130 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+
+from core import dsl_engine
+from core.dsl_store import DSLStore, DuplicateResourceError
+
+def _seed(tmp_path):
+    path = tmp_path / "integrated_dsl.jsonl"
+    recs = [{"id": "cap", "resource": "a.py::f", "confidence": 0.3},
+            {"id": "cap", "resource": "b.py::g", "confidence": 0.9}]
+    path.write_text("\n".join(json.dumps(r) for r in recs), encoding="utf-8")
+    return path, tmp_path / "journal.jsonl"
+
+def test_upsert_journals_and_other_instance_sees_it(tmp_path):
+    path, journal = _seed(tmp_path)
+    before = path.read_text(encoding="utf-8")
+    store = DSLStore(path, journal, compact_every=0)
+    store.upsert({"id": "cap", "resource": "a.py::f", "confidence": 0.8})
+    assert path.read_text(encoding="utf-8") == before       # スナップショットは書き換えない
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 1
+
+    other = DSLStore(path, journal)
+    assert other.get("a.py::f")["confidence"] == 0.8
+    assert len(other.find_by_id("cap")) == 2                 # id 重複も保持
+    store.delete("b.py::g")
+    assert [r["resource"] for r in other.records()] == ["a.py::f"]
+
+def test_compaction_folds_journal(tmp_path):
+    path, journal = _seed(tmp_path)
+    compacted = []
+    store = DSLStore(path, journal, compact_every=2, on_compact=compacted.append)
+    store.upsert({"id": "x", "resource": "c.py::h"})
+    store.upsert({"id": "y", "resource": "d.py::i"})
+    assert not journal.exists() and len(compacted) == 1
+    lines = [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["resource"] for r in lines] == ["a.py::f", "b.py::g", "c.py::h", "d.py::i"]
+    assert len(DSLStore(path, journal)) == 4
+
+def test_pending_journal_is_compacted_at_exit(tmp_path):
+    path, journal = _seed(tmp_path)
+    store = DSLStore(path, journal, compact_every=0)
+    store.upsert({"id": "cap", "resource": "a.py::f", "confidence": 0.8})
+    store._compact_at_exit()
+    assert not journal.exists()
+    assert json.loads(path.read_text(encoding="utf-8").splitlines()[0])["confidence"] == 0.8
+
+def test_replace_all_reports_duplicates(tmp_path):
+    path, journal = _seed(tmp_path)
+    before = path.read_text(encoding="utf-8")
+    store = DSLStore(path, journal)
+    try:
+        store.replace_all([{"id": "a", "resource": "x"}, {"id": "b", "resource": "x"}, {"id": "c", "resource": "y"}])
+        assert False, "expected DuplicateResourceError"
+    except DuplicateResourceError as e:
+        assert e.resources == ["x"]
+    assert path.read_text(encoding="utf-8") == before
+    assert len(store) == 2
+
+def test_hash_index_is_persisted_per_snapshot(tmp_path):
+    path, journal = _seed(tmp_path)
+    first = DSLStore(path, journal).hash_index()
+    index_file = tmp_path / "dsl_hash_index.json"
+    assert json.loads(index_file.read_text(encoding="utf-8"))["hashes"] == first
+
+    store = DSLStore(path, journal)
+    store.refresh()
+    assert store._hashes == first                           # 再計算せずに読み込む
+    store.upsert({"id": "cap", "resource": "a.py::f", "confidence": 1.0})
+    assert store.hash_index()["a.py::f"] != first["a.py::f"]
+
+def test_plan_after_apply_removed_resource(tmp_path, monkeypatch):
+    path, journal = _seed(tmp_path)
+    schema = tmp_path / "schema.json"
+    schema.write_text(json.dumps({"type": "object"}), encoding="utf-8")
+    store = DSLStore(path, journal)
+    store.hash_index()
+    monkeypatch.setattr(dsl_engine, "_store", store)
+    monkeypatch.setattr(dsl_engine, "SCHEMA_PATH", schema)
+    monkeypatch.setattr(dsl_engine, "IDEMP_FILE", tmp_path / "applied_keys.json")
+
+    # b.py::g を消して apply した後は、ハッシュインデックスにも残らない
+    dsl_engine.apply([{"id": "cap", "resource": "a.py::f", "confidence": 0.3}])
+    assert list(store.hash_index()) == ["a.py::f"]
+
+    result = dsl_engine.plan([{"id": "cap", "resource": "a.py::f", "confidence": 0.3},
+                              {"id": "cap", "resource": "b.py::g", "confidence": 0.5}])
+    assert result["add"] == ["b.py::g"] and result["delete"] == [] and result["modify"] == {}
+
+def test_plan_classifies_and_diffs_fields(tmp_path):
+    base = [{"id": "cap", "resource": "a.py::f", "confidence": 0.3},
+            {"id": "cap", "resource": "b.py::g", "confidence": 0.9},
+            {"id": "old", "resource": "z.py::gone"}]
+    new = [{"id": "cap", "resource": "a.py::f", "confidence": 0.7},
+           {"id": "cap", "resource": "b.py::g", "confidence": 0.9},
+           {"id": "new", "resource": "c.py::h"}]
+    result = dsl_engine.plan(new, base=base)
+    assert result["add"] == ["c.py::h"]
+    assert result["delete"] == ["z.py::gone"]
+    assert result["unchanged"] == 1
+    assert result["modify"] == {"a.py::f": {"confidence": {"old": 0.3, "new": 0.7}}}
+    assert dsl_engine.plan_changes(result) == ["c.py::h", "a.py::f", "z.py::gone"]
+
+def test_schema_change_revalidates_applied_records(tmp_path, monkeypatch):
+    schema = tmp_path / "schema.json"
+    schema.write_text(json.dumps({"type": "object", "required": ["id"]}), encoding="utf-8")
+    monkeypatch.setattr(dsl_engine, "SCHEMA_PATH", schema)
+    monkeypatch.setattr(dsl_engine, "IDEMP_FILE", tmp_path / "applied_keys.json")
+    recs = [{"id": "cap", "resource": "a.py::f"}, {"id": "cap", "resource": "b.py::g", "confidence": 0.9}]
+
+    dsl_engine._record_applied_keys(recs)
+    applied = dsl_engine.load_applied_keys()
+    assert dsl_engine.validate_dsl(recs, applied_keys=applied) == 0   # 記録済みはスキップ
+
+    # スキーマを変えると記録済みのレコードも全件検証し直す
+    schema.write_text(json.dumps({"type": "object", "required": ["id", "confidence"]}), encoding="utf-8")
+    try:
+        dsl_engine.validate_dsl(recs, applied_keys=applied)
+        assert False, "expected DSLValidationError"
+    except dsl_engine.DSLValidationError as e:
+        assert [res for res, _ in e.errors] == ["a.py::f"]
+
+    # 新しいスキーマで記録し直すと古い記録は捨てられる
+    dsl_engine._record_applied_keys(recs[1:])
+    applied = dsl_engine.load_applied_keys()
+    assert applied[dsl_engine.SCHEMA_KEY] == dsl_engine.schema_hash()
+    assert len(applied) == 2
+    assert dsl_engine.validate_dsl(recs[1:], applied_keys=applied) == 0
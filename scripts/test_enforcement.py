@@ -2,6 +2,9 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import tempfile
+from pathlib import Path
+
 from core.enforcement import enforce_rules
 
 def test_on_demand_doc_block():
@@ -36,9 +39,33 @@ def test_valid_action():
     violations = enforce_rules(context)
     assert len(violations) == 0, "Unexpected violations detected"
 
+def test_rules_hot_reload_with_declarative_conditions(tmp_path):
+    import json
+    from core.enforcement import RuleEngine
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [
+        {"id": "r1", "applies_to": ["deploy"], "when": {"env": {"in": ["prod"]}, "approved": {"truthy": False}}},
+        {"id": "note", "description": "説明のみ（判定対象外）"},
+    ]}), encoding="utf-8")
+    engine = RuleEngine(str(path), check_interval=0)
+    assert [r["id"] for r in engine.check({"action": "deploy", "env": "prod"})] == ["r1"]
+    assert engine.check({"action": "deploy", "env": "prod", "approved": True}) == []
+    assert engine.check({"action": "other", "env": "prod"}) == []
+    engine.check({"action": "deploy"})
+    assert engine.loads == 1                                   # 変更が無ければ読み直さない
+
+    path.write_text(json.dumps({"rules": [
+        {"id": "r2", "when": {"any": [{"size": {"gt": 10}}, {"not": {"owner": {"exists": True}}}]}},
+    ]}) + "\n", encoding="utf-8")
+    assert [r["id"] for r in engine.check({"action": "x", "size": 11, "owner": "a"})] == ["r2"]
+    assert engine.check({"action": "x", "size": 1, "owner": "a"}) == []
+    assert engine.loads == 2
+
 if __name__ == "__main__":
     test_on_demand_doc_block()
     test_update_without_approval()
     test_multi_doc_commit()
     test_valid_action()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_rules_hot_reload_with_declarative_conditions(Path(tmp))
     print("✅ All enforcement tests passed.")
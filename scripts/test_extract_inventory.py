@@ -0,0 +1,53 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import json
+
+import pytest
+
+import extract_inventory as inventory
+from core import ast_index
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    root = tmp_path / "repo"
+    (root / "core").mkdir(parents=True)
+    (root / "docs").mkdir()
+    (root / "ignored").mkdir()
+    (root / "core" / "a.py").write_text("def f():\n    pass\n\nclass C:\n    pass\n", encoding="utf-8")
+    (root / "core" / "b.py").write_text("def g():\n    pass\n", encoding="utf-8")
+    (root / "docs" / "guide.md").write_text("# guide\n", encoding="utf-8")
+    (root / "data.json").write_text("{}", encoding="utf-8")
+    (root / "ignored" / "skip.py").write_text("def h():\n    pass\n", encoding="utf-8")
+    (root / ".dslignore").write_text("ignored/\n", encoding="utf-8")
+    monkeypatch.setattr(inventory, "ROOT", root)
+    monkeypatch.setattr(inventory, "OUT", tmp_path / "inventory.jsonl")
+    monkeypatch.setattr(inventory, "STATE_PATH", tmp_path / ".cache" / "inventory_state.json")
+    monkeypatch.setattr(ast_index, "_default_index", ast_index.ASTIndex(tmp_path / "ast_index.json"))
+    return root
+
+def _uris(tmp_path):
+    lines = (tmp_path / "inventory.jsonl").read_text(encoding="utf-8").splitlines()
+    return sorted(json.loads(l)["uri"] for l in lines)
+
+def test_full_then_incremental_then_deleted(tree, tmp_path, capsys):
+    inventory.main()
+    assert _uris(tmp_path) == ["code://core/a.py#C", "code://core/a.py#f", "code://core/b.py#g",
+                               "doc://docs/guide.md", "json://data.json"]
+    assert "4 files rebuilt, 0 reused" in capsys.readouterr().out
+
+    # 1 ファイルだけ変更: そのファイルだけ作り直す
+    (tree / "core" / "b.py").write_text("def g():\n    pass\n\ndef g2():\n    pass\n", encoding="utf-8")
+    inventory.main(incremental=True)
+    assert "code://core/b.py#g2" in _uris(tmp_path)
+    assert "1 files rebuilt, 3 reused" in capsys.readouterr().out
+
+    # 削除されたファイルのレコードは残らない
+    (tree / "docs" / "guide.md").unlink()
+    inventory.main(incremental=True)
+    assert "doc://docs/guide.md" not in _uris(tmp_path)
+    assert "0 files rebuilt, 3 reused" in capsys.readouterr().out
+    state = json.loads(inventory.STATE_PATH.read_text(encoding="utf-8"))
+    assert not any(p.endswith("guide.md") for p in state)
@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.fs_walker import IgnoreMatcher, Walker
+
+def _tree(root):
+    for rel in ["app.py", "core/a.py", "core/__pycache__/a.pyc", "core/sub/b.py",
+                "docs/x.md", "docs/tag_cache/t.json", "venv/lib/site.py", ".git/HEAD", "run.log"]:
+        p = root / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(rel, encoding="utf-8")
+    (root / ".gitignore").write_text("venv/**\n**/__pycache__/**\n*.log\ndocs/tag_cache/\n!keep.log\n",
+                                     encoding="utf-8")
+
+def test_ignore_rules_prune_directories(tmp_path):
+    _tree(tmp_path)
+    rels = [e.rel for e in Walker(tmp_path, ignore_files=(".gitignore",))]
+    assert sorted(rels) == [".gitignore", "app.py", "core/a.py", "core/sub/b.py", "docs/x.md"]
+
+    m = IgnoreMatcher(["tests/**", "*.pyc", "build/"])
+    assert m.match("tests", is_dir=True) and not m.match("core/tests", is_dir=True)
+    assert m.match("core/x.pyc") and m.match("a/build", is_dir=True) and not m.match("build")
+
+def test_whitelist_and_parallel_order(tmp_path):
+    _tree(tmp_path)
+    walker = Walker(tmp_path, ignore_files=(".gitignore",), whitelist=["core/"], include_dirs=True)
+    assert [e.rel for e in walker] == ["core", "core/a.py", "core/sub", "core/sub/b.py"]
+
+    seq = [(e.rel, e.stat.st_size) for e in Walker(tmp_path, include_dirs=True)]
+    par = [(e.rel, e.stat.st_size) for e in Walker(tmp_path, include_dirs=True, workers=4)]
+    assert seq == par and ".git/HEAD" not in [r for r, _ in seq]
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.history_window import HistoryWindow
+
+def _history(turns: int) -> list[dict]:
+    hist = []
+    for i in range(turns):
+        hist.append({"role": "user", "content": f"question {i} " + "x " * 40})
+        hist.append({"role": "assistant", "content": f"answer {i} " + "y " * 40})
+    return hist
+
+def test_trim_keeps_history_within_budget():
+    window = HistoryWindow(budget=200, mode="trim")
+    history = _history(20)
+    messages, stats = window.build_messages("system", history, "next")
+    assert stats["history_tokens"] <= 200
+    assert stats["dropped_messages"] > 0
+    kept = messages[1:-1]
+    assert kept[0]["role"] == "user"
+    assert kept == history[-len(kept):]
+
+def test_trim_bound_does_not_grow_with_session():
+    window = HistoryWindow(budget=300, mode="trim")
+    _, short = window.build_messages("system", _history(5), "next")
+    _, long = window.build_messages("system", _history(200), "next")
+    assert long["total_tokens"] <= short["total_tokens"] + 300
+
+def test_summary_is_rolling_and_cached():
+    calls = []
+
+    def summarizer(msgs, previous):
+        calls.append(len(msgs))
+        return (previous + " " if previous else "") + f"summary of {len(msgs)}"
+
+    window = HistoryWindow(budget=250, mode="summary", summarizer=summarizer)
+    history = _history(10)
+    messages, stats = window.build_messages("system", history, "next")
+    assert stats["summarized"]
+    assert messages[1]["role"] == "system" and "summary of" in messages[1]["content"]
+    assert len(calls) == 1
+
+    # 変化が無ければ要約は再計算しない
+    window.build_messages("system", history, "next")
+    assert len(calls) == 1
+
+    # 新しく溢れた分だけ追加要約
+    history += _history(2)
+    window.build_messages("system", history, "next")
+    assert len(calls) == 2 and calls[1] < calls[0] + 4
+
+if __name__ == "__main__":
+    test_trim_keeps_history_within_budget()
+    test_trim_bound_does_not_grow_with_session()
+    test_summary_is_rolling_and_cached()
+    print("✅ All history window tests passed.")
@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from core import llm_cache, llm_client
+
+MESSAGES = [{"role": "user", "content": "議事録を要約してください"}]
+
+def _setup(tmp, **kw):
+    backend = llm_client.FakeLLMBackend(delay=0)
+    llm_client.set_backend(backend)
+    cache = llm_cache.LLMCache(Path(tmp) / "cache.sqlite3", **kw)
+    llm_cache.set_cache(cache)
+    return backend, cache
+
+def _reset():
+    llm_client.set_backend(None)
+    llm_cache.set_cache(None)
+
+@pytest.fixture(autouse=True)
+def isolated_cache():
+    """差し込んだバックエンドとキャッシュを後続のテストに残さない"""
+    yield
+    _reset()
+
+def test_second_call_is_served_from_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend, cache = _setup(tmp)
+        first = llm_client.chat(MESSAGES, temperature=0, cache=True)
+        second = llm_client.chat(MESSAGES, temperature=0, cache=True)
+        assert first == second
+        assert backend.calls == 1 and cache.hits == 1
+
+        # パラメータが違えば別キー
+        llm_client.chat(MESSAGES, temperature=0.2, cache=True)
+        assert backend.calls == 2
+
+def test_bypass_and_ttl(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        backend, cache = _setup(tmp, ttl=0.05)
+        llm_client.chat(MESSAGES, cache=True)
+        monkeypatch.setenv("KAI_LLM_CACHE_BYPASS", "1")
+        llm_client.chat(MESSAGES, cache=True)
+        monkeypatch.delenv("KAI_LLM_CACHE_BYPASS")
+        assert backend.calls == 2
+        time.sleep(0.1)
+        llm_client.chat(MESSAGES, cache=True)
+        assert backend.calls == 3
+
+def test_lru_eviction_keeps_recent_entries():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = llm_cache.LLMCache(Path(tmp) / "cache.sqlite3", max_bytes=1000)
+        for i in range(10):
+            cache.put(f"k{i}", "x" * 200)
+            cache.get("k0")  # k0 は常に最近アクセス
+        st = cache.stats()
+        assert st["bytes"] <= 1000
+        assert cache.get("k0") is not None
+        assert cache.get("k9") is not None
+        assert cache.get("k1") is None
+
+if __name__ == "__main__":
+    try:
+        test_second_call_is_served_from_cache()
+        with pytest.MonkeyPatch.context() as mp:
+            test_bypass_and_ttl(mp)
+        test_lru_eviction_keeps_recent_entries()
+    finally:
+        _reset()
+    print("✅ All llm_cache tests passed.")
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from core import llm_client
+
+def _use_fake(monkeypatch):
+    monkeypatch.setenv("KAI_LLM_BACKEND", "fake")
+    assert llm_client.get_backend().name == "fake"
+
+@pytest.fixture(autouse=True)
+def isolated_client(monkeypatch):
+    """バックエンドとバックオフ設定をテストごとに元へ戻す"""
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF", 0)
+    llm_client.set_backend(None)
+    yield
+    llm_client.set_backend(None)
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    _use_fake(monkeypatch)
+
+def test_fake_stream_matches_full_reply(fake_backend):
+    messages = [{"role": "system", "content": "rules"},
+                {"role": "user", "content": "進捗を教えてください。今週のタスクは？"}]
+    deltas = list(llm_client.stream_chat(messages, model="gpt-4.1"))
+    assert len(deltas) > 1
+    assert "".join(deltas) == llm_client.chat(messages, model="gpt-4.1")
+
+def test_stream_reply_reports_progress(fake_backend):
+    seen = []
+    reply = llm_client.stream_reply([{"role": "user", "content": "hello world"}], on_delta=seen.append)
+    assert seen[-1] == reply
+    assert all(reply.startswith(s) for s in seen)
+    assert len(seen) == len(set(seen))
+
+class _FlakyBackend(llm_client.FakeLLMBackend):
+    def __init__(self, failures):
+        super().__init__(delay=0)
+        self.failures = failures
+
+    def complete(self, messages, model, **params):
+        if self.failures:
+            self.failures -= 1
+            err = RuntimeError("rate limited")
+            err.status_code = 429
+            raise err
+        return super().complete(messages, model, **params)
+
+def test_retry_and_metrics():
+    llm_client.set_backend(_FlakyBackend(failures=2))
+    llm_client.reset_metrics()
+    reply = llm_client.chat([{"role": "user", "content": "ping"}], tag="unit")
+    assert reply.endswith("ping")
+    summary = llm_client.metrics_summary()["unit"]
+    assert summary["calls"] == 1 and summary["retries"] == 2 and summary["errors"] == 0
+    assert summary["prompt_tokens"] > 0 and summary["completion_tokens"] > 0
+
+def test_non_retryable_error_is_raised():
+    class _Broken(llm_client.FakeLLMBackend):
+        def complete(self, messages, model, **params):
+            raise ValueError("bad request")
+
+    llm_client.set_backend(_Broken())
+    llm_client.reset_metrics()
+    try:
+        llm_client.chat([{"role": "user", "content": "ping"}], tag="unit")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert llm_client.metrics_summary()["unit"]["errors"] == 1
+
+if __name__ == "__main__":
+    for test, fake in ((test_fake_stream_matches_full_reply, True),
+                       (test_stream_reply_reports_progress, True),
+                       (test_retry_and_metrics, False),
+                       (test_non_retryable_error_is_raised, False)):
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(llm_client, "LLM_BACKOFF", 0)
+            llm_client.set_backend(None)
+            try:
+                if fake:
+                    _use_fake(mp)
+                    test(None)
+                else:
+                    test()
+            finally:
+                llm_client.set_backend(None)
+    print("✅ All llm_client tests passed.")
@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.git_ops import LogCommitQueue
+
+def test_batches_by_message_count():
+    commits, pushes = [], []
+    q = LogCommitQueue(window=60, max_messages=4, backoff=0,
+                       commit_fn=lambda paths, msg: commits.append(paths) or True,
+                       push_fn=lambda: pushes.append(1))
+    for _ in range(2):
+        q.enqueue("conversations/conversation_20250601.jsonl", messages=2)
+    assert q.flush(timeout=5)
+    assert len(commits) == 1 and len(pushes) == 1
+    st = q.status()
+    assert st["queue_depth"] == 0 and st["last_push_ok"] is True
+    q.stop()
+
+def test_window_coalesces_until_flush():
+    commits = []
+    q = LogCommitQueue(window=60, max_messages=100, backoff=0,
+                       commit_fn=lambda paths, msg: commits.append(paths) or True,
+                       push_fn=lambda: None)
+    q.enqueue("a.jsonl")
+    q.enqueue("b.jsonl")
+    q.enqueue("a.jsonl")
+    assert q.status()["queue_depth"] == 3
+    assert commits == []
+    assert q.flush(timeout=5)
+    assert len(commits) == 1 and len(commits[0]) == 2
+    q.stop()
+
+def test_push_retries_with_backoff():
+    attempts = []
+
+    def flaky_push():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("network down")
+
+    q = LogCommitQueue(window=0, max_messages=1, max_retries=3, backoff=0,
+                       commit_fn=lambda paths, msg: True, push_fn=flaky_push)
+    q.enqueue("a.jsonl")
+    assert q.flush(timeout=5)
+    assert len(attempts) == 3
+    assert q.status()["last_push_ok"] is True
+    q.stop()
+
+def test_failed_push_is_retried_next_batch():
+    attempts = []
+
+    def push():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("network down")
+
+    q = LogCommitQueue(window=0, max_messages=1, max_retries=0, backoff=0,
+                       commit_fn=lambda paths, msg: True, push_fn=push)
+    q.enqueue("a.jsonl")
+    assert not q.flush(timeout=5)                    # commit できても push 失敗なら False
+    assert q.status()["last_push_ok"] is False and q.status()["unpushed"]
+    assert q.flush(timeout=5)
+    assert q.status()["last_push_ok"] is True
+    q.stop()
+
+def test_failed_commit_is_requeued():
+    commits = []
+
+    def commit(paths, msg):
+        commits.append(sorted(p.name for p in paths))
+        if len(commits) == 1:
+            raise RuntimeError("index.lock exists")
+        return True
+
+    q = LogCommitQueue(window=60, max_messages=100, backoff=0, commit_fn=commit, push_fn=lambda: None)
+    q.enqueue("a.jsonl", messages=2)
+    assert not q.flush(timeout=5)                    # 失敗は flush の戻り値で分かる
+    st = q.status()
+    assert st["queue_depth"] == 2 and st["pending_files"] == ["a.jsonl"]
+
+    q.enqueue("b.jsonl")
+    assert q.flush(timeout=5)
+    assert commits[-1] == ["a.jsonl", "b.jsonl"]
+    assert q.status()["queue_depth"] == 0 and q.status()["last_push_ok"] is True
+    q.stop()
+
+def test_git_lock_serialises_worker_and_other_git_calls():
+    import threading
+    from core import git_ops
+    started = threading.Event()
+
+    q = LogCommitQueue(window=0, max_messages=1, backoff=0,
+                       commit_fn=lambda paths, msg: started.set() or True, push_fn=lambda: None)
+    with git_ops.GIT_LOCK:
+        q.enqueue("a.jsonl")
+        assert not started.wait(0.2)                 # 他の git 操作中は commit しない
+    assert started.wait(5)
+    assert q.flush(timeout=5)
+    q.stop()
+
+if __name__ == "__main__":
+    test_batches_by_message_count()
+    test_window_coalesces_until_flush()
+    test_push_retries_with_backoff()
+    test_failed_push_is_retried_next_batch()
+    test_failed_commit_is_requeued()
+    test_git_lock_serialises_worker_and_other_git_calls()
+    print("✅ All log commit queue tests passed.")
@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import time
+
+from core import master_snapshot
+from core.master_snapshot import MasterSnapshot
+
+def _tree(tmp_path, monkeypatch):
+    repo = tmp_path / "repo"
+    (repo / "core").mkdir(parents=True)
+    (repo / "core" / "mod.py").write_text("def f(a):\n    return a\n", encoding="utf-8")
+    (repo / "README.md").write_text("# readme\n", encoding="utf-8")
+    monkeypatch.setattr(master_snapshot, "REPO_ROOT", str(repo))
+    return repo, tmp_path / "out" / "master_snapshot.json"
+
+def test_incremental_regenerate_reuses_unchanged(tmp_path, monkeypatch):
+    repo, out = _tree(tmp_path, monkeypatch)
+    gen = MasterSnapshot(out)
+    snap = gen.regenerate()
+    assert gen.last_changed == 2
+    assert {r["path"] for r in snap} == {"core/mod.py", "README.md"}
+    assert json.loads(out.read_text(encoding="utf-8")) == snap
+
+    mtime = out.stat().st_mtime_ns
+    gen.regenerate()
+    assert gen.last_changed == 0 and out.stat().st_mtime_ns == mtime   # 変更無しなら書き込まない
+
+    (repo / "README.md").write_text("# changed readme\n", encoding="utf-8")
+    gen.regenerate()
+    assert gen.last_changed == 1
+
+def test_background_requests_are_debounced(tmp_path, monkeypatch):
+    _, out = _tree(tmp_path, monkeypatch)
+    gen = MasterSnapshot(out, debounce=0.05)
+    for _ in range(5):
+        gen.request()
+    assert gen.status()["pending"]
+    assert gen.wait(timeout=5)
+    assert gen.runs == 1 and out.exists()
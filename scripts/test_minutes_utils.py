@@ -0,0 +1,174 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from datetime import date
+
+import yaml
+
+from core import llm_client, minutes_utils
+
+DAY = date(2025, 5, 21)
+
+def _setup(tmp_path, monkeypatch, messages, responder):
+    backend = llm_client.FakeLLMBackend(delay=0, responder=responder)
+    llm_client.set_backend(backend)
+    monkeypatch.setenv("KAI_LLM_CACHE_BYPASS", "1")
+    monkeypatch.setattr(minutes_utils, "load_day_messages", lambda day: list(messages))
+    kwargs = {"minutes_dir": tmp_path / "minutes"}
+    return backend, kwargs
+
+def _msg(i):
+    return {"role": "user", "content": f"message {i}", "ts": f"2025-05-21T10:00:{i:02d}+09:00"}
+
+def test_incremental_sends_only_new_messages(tmp_path, monkeypatch):
+    messages = [_msg(i) for i in range(5)]
+    prompts = []
+
+    def responder(msgs, model):
+        prompts.append(msgs[0]["content"])
+        if "<minutes>" in msgs[0]["content"]:
+            return "```yaml\ndecisions:\n- id: D2\n  title: new\n  status: AUTO\n- id: D1\n  title: renamed\n  status: AUTO\nthemes: [b]\n```"
+        return yaml.safe_dump({"themes": ["a"], "decisions": [{"id": "D1", "title": "first", "status": "CONFIRMED"}]})
+
+    backend, kwargs = _setup(tmp_path, monkeypatch, messages, responder)
+    out = minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    assert backend.calls == 1
+
+    # 新しいメッセージが無ければ LLM を呼ばない
+    minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    assert backend.calls == 1
+
+    messages.append(_msg(5))
+    minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    assert backend.calls == 2
+    assert "message 5" in prompts[-1] and "message 4" not in prompts[-1]
+
+    data = yaml.safe_load(out.read_text(encoding="utf-8"))
+    assert data["themes"] == ["a", "b"]
+    assert [(d["id"], d["title"], d["status"]) for d in data["decisions"]] == \
+        [("D1", "renamed", "CONFIRMED"), ("D2", "new", "AUTO")]
+    llm_client.set_backend(None)
+
+def test_rewritten_log_triggers_full_rebuild(tmp_path, monkeypatch):
+    messages = [_msg(i) for i in range(3)]
+    prompts = []
+
+    def responder(msgs, model):
+        prompts.append(msgs[0]["content"])
+        return "decisions: []\n"
+
+    backend, kwargs = _setup(tmp_path, monkeypatch, messages, responder)
+    minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    messages[2] = {**messages[2], "content": "edited"}
+    messages.append(_msg(3))
+    minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    assert backend.calls == 2
+    assert "<minutes>" not in prompts[-1] and "message 0" in prompts[-1]
+
+    minutes_utils.generate_daily_minutes(DAY, full=True, **kwargs)
+    assert backend.calls == 3
+    llm_client.set_backend(None)
+
+def test_unreadable_delta_keeps_confirmed_minutes(tmp_path, monkeypatch):
+    messages = [_msg(i) for i in range(3)]
+    replies = ["decisions:\n- id: D1\n  title: first\n  status: AUTO\n"]
+
+    def responder(msgs, model):
+        return replies[-1]
+
+    backend, kwargs = _setup(tmp_path, monkeypatch, messages, responder)
+    out = minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    confirmed = out.read_text(encoding="utf-8").replace("AUTO", "CONFIRMED")
+    out.write_text(confirmed, encoding="utf-8")   # 人が確定した
+    state = out.with_suffix(".state.json").read_text(encoding="utf-8")
+
+    messages.append(_msg(3))
+    for bad in ("decisions: [unclosed\n", "- just\n- a list\n"):
+        replies.append(bad)
+        try:
+            minutes_utils.generate_daily_minutes(DAY, **kwargs)
+            assert False, "expected MinutesDeltaError"
+        except minutes_utils.MinutesDeltaError:
+            pass
+        assert out.read_text(encoding="utf-8") == confirmed
+        assert out.with_suffix(".state.json").read_text(encoding="utf-8") == state
+    assert backend.calls == 3   # 全体の作り直しはしない
+    llm_client.set_backend(None)
+
+def test_chunk_messages_keeps_everything():
+    messages = [_msg(i) for i in range(20)] + [{"role": "user", "content": "長文" * 500, "ts": "x"}]
+    chunks = minutes_utils.chunk_messages(messages, max_tokens=60)
+    assert len(chunks) > 2
+    flat = [m for c in chunks for m in c]
+    assert [m["content"] for m in flat[:20]] == [m["content"] for m in messages[:20]]
+    assert "".join(m["content"] for m in flat[20:]) == "長文" * 500
+
+def test_long_day_is_map_reduced_concurrently(tmp_path, monkeypatch):
+    import threading, time
+    messages = [_msg(i) for i in range(12)]
+    active, peak, lock = [0], [0], threading.Lock()
+    parts = len(minutes_utils.chunk_messages(messages, max_tokens=100))
+    assert parts > 1
+
+    def responder(msgs, model):
+        prompt = msgs[0]["content"]
+        if "<partials>" in prompt:
+            assert prompt.count("part:") == parts
+            return yaml.safe_dump({"themes": ["merged"], "decisions": []})
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return f"part: {prompt.split('part ')[1].split(' ')[0]}\n"
+
+    backend, kwargs = _setup(tmp_path, monkeypatch, messages, responder)
+    monkeypatch.setattr(minutes_utils, "MINUTES_CHUNK_TOKENS", 100)
+    out = minutes_utils.generate_daily_minutes(DAY, **kwargs)
+    assert backend.calls == parts + 1   # map + reduce 1 回
+    assert peak[0] > 1
+    assert yaml.safe_load(out.read_text(encoding="utf-8"))["themes"] == ["merged"]
+    llm_client.set_backend(None)
+
+def test_reduce_terminates_when_partials_do_not_shrink(tmp_path, monkeypatch):
+    messages = [_msg(i) for i in range(12)]
+    big = "decision " * 80   # 1 件で上限を超える部分議事録
+
+    def responder(msgs, model):
+        return big
+
+    backend, kwargs = _setup(tmp_path, monkeypatch, messages, responder)
+    monkeypatch.setattr(minutes_utils, "MINUTES_CHUNK_TOKENS", 60)
+    monkeypatch.setattr(minutes_utils, "MAX_REDUCE_ROUNDS", 3)
+    parts = len(minutes_utils.chunk_messages(messages, max_tokens=60))
+    assert parts > 3
+    minutes_utils.generate_daily_minutes(DAY, **kwargs)
+
+    # 各ラウンドで 2 件以上ずつまとめるので、呼び出し回数は map + (parts - 1) 以下で必ず終わる
+    assert backend.calls <= parts + parts - 1
+    llm_client.set_backend(None)
+
+def test_pack_for_reduce_never_leaves_singletons():
+    groups = minutes_utils._pack_for_reduce(["x " * 100] * 5, max_tokens=10)
+    assert all(len(g) >= 2 for g in groups)
+    assert sum(len(g) for g in groups) == 5
+
+def test_backfill_skips_unchanged_days(tmp_path, monkeypatch):
+    logs = {date(2025, 5, 1): [_msg(1)], date(2025, 5, 2): [], date(2025, 5, 3): [_msg(3)]}
+
+    def responder(msgs, model):
+        return "decisions: []\n"
+
+    backend, kwargs = _setup(tmp_path, monkeypatch, [], responder)
+    monkeypatch.setattr(minutes_utils, "load_day_messages", lambda day: list(logs.get(day, [])))
+    results = minutes_utils.backfill_minutes(date(2025, 5, 1), date(2025, 5, 3), workers=2, **kwargs)
+    assert list(results.values()) == ["full", "no_logs", "full"]
+    assert (tmp_path / "minutes" / "2025" / "minutes_20250501.state.json").exists()
+
+    logs[date(2025, 5, 3)].append(_msg(4))
+    results = minutes_utils.backfill_minutes(date(2025, 5, 1), date(2025, 5, 3), workers=2, **kwargs)
+    assert list(results.values()) == ["skipped", "no_logs", "incremental"]
+    assert backend.calls == 3
+    llm_client.set_backend(None)
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+
+from core import patch_journal
+from core.patch_journal import PatchJournal
+
+def _journal(tmp_path, **kwargs):
+    return PatchJournal(tmp_path / "patch_history.jsonl",
+                        index_path=tmp_path / "index.sqlite3", **kwargs)
+
+def _rec(i, fn="f"):
+    return {"timestamp": f"2025-05-{i:02d}T00:00:00", "function": fn, "diff": "x" * i}
+
+def test_append_and_page_newest_first(tmp_path):
+    j = _journal(tmp_path)
+    for i in range(1, 8):
+        j.append(_rec(i))
+    assert j.count() == 7
+    assert [r["timestamp"][8:10] for r in j.page(0, 3)] == ["07", "06", "05"]
+    assert [r["timestamp"][8:10] for r in j.page(2, 3)] == ["01"]
+
+    # 追記分は索引に差分だけ取り込まれる
+    j.append(_rec(8))
+    assert j.count() == 8
+    assert j.page(0, 1)[0]["timestamp"].startswith("2025-05-08")
+
+def test_filters_without_index(tmp_path):
+    j = _journal(tmp_path, index=False)
+    for i in range(1, 6):
+        j.append(_rec(i, fn="a" if i % 2 else "b"))
+    assert [r["timestamp"][8:10] for r in j.page(0, 10, function="a")] == ["05", "03", "01"]
+    assert j.count(since="2025-05-02", until="2025-05-04") == 2
+    assert not (tmp_path / "index.sqlite3").exists()
+
+def test_index_filters(tmp_path):
+    j = _journal(tmp_path)
+    for i in range(1, 6):
+        j.append(_rec(i, fn="a" if i % 2 else "b"))
+    assert j.count(function="b") == 2
+    assert [r["timestamp"][8:10] for r in j.page(0, 10, function="a", since="2025-05-02")] == ["05", "03"]
+    assert [e["function"] for e in j.entries(0, 2)] == ["a", "b"]
+    assert j.distinct("function") == ["a", "b"]
+
+def test_legacy_migration(tmp_path):
+    legacy = tmp_path / "patch_history.json"
+    legacy.write_text(json.dumps([_rec(3), _rec(1), _rec(2)]), encoding="utf-8")
+    j = _journal(tmp_path, legacy_path=legacy)
+    assert [r["timestamp"][8:10] for r in j.page(0, 10)] == ["03", "02", "01"]
+    assert not legacy.exists()
+    lines = (tmp_path / "patch_history.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(l)["timestamp"][8:10] for l in lines] == ["01", "02", "03"]
+
+def test_reverse_read_across_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(patch_journal, "READ_BLOCK", 7)
+    j = _journal(tmp_path, index=False)
+    for i in range(1, 12):
+        j.append(_rec(i))
+    # 書きかけの末尾行は読み飛ばす
+    with open(j.path, "a", encoding="utf-8") as f:
+        f.write('{"timestamp": "2025')
+    got = list(j.iter_newest())
+    assert [r["timestamp"][8:10] for _, r in got] == [f"{i:02d}" for i in range(11, 0, -1)]
+    assert all(j.read_at(off) == rec for off, rec in got)
+
+def test_rewritten_history_rebuilds_index(tmp_path):
+    j = _journal(tmp_path)
+    for i in range(1, 4):
+        j.append(_rec(i))
+    assert j.count() == 3
+
+    # git pull などで途中の行が書き換わり、同時に伸びた場合
+    lines = j.path.read_text(encoding="utf-8").splitlines()
+    lines[0] = json.dumps({**_rec(1), "function": "rewritten", "diff": "y" * 50})
+    lines.append(json.dumps(_rec(4)))
+    j.path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    assert j.count() == 4
+    assert [e["function"] for e in j.entries(0, 10)] == ["f", "f", "f", "rewritten"]
+    assert all(j.read_at(e["offset"])["timestamp"] == e["ts"] for e in j.entries(0, 10))
+    assert j.count(function="rewritten") == 1
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import tempfile
+from pathlib import Path
+
+from core.prompt_builder import SystemPromptBuilder, default_sections
+
+def _make_tree(tmp: Path):
+    docs, dsl = tmp / "docs", tmp / "dsl"
+    docs.mkdir()
+    dsl.mkdir()
+    (docs / "base_os_rules.md").write_text("# rules", encoding="utf-8")
+    (docs / "project_definition.md").write_text("# project", encoding="utf-8")
+    (docs / "architecture_overview.md").write_text("# arch", encoding="utf-8")
+    (dsl / "integrated_dsl.jsonl").write_text(
+        json.dumps({"name": "plan", "description": "差分計算"}), encoding="utf-8")
+    return docs, dsl
+
+def test_only_changed_section_is_rebuilt():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, dsl = _make_tree(Path(tmp))
+        builder = SystemPromptBuilder(sections=default_sections(docs, dsl))
+        prompt = builder.build()
+        assert prompt == "# rules\n\n- **plan**: 差分計算\n\n# project\n\n# arch"
+
+        builder.build()
+        assert [s.builds for s in builder.sections] == [1, 1, 1, 1]
+
+        (docs / "project_definition.md").write_text("# project v2!", encoding="utf-8")
+        assert "# project v2!" in builder.build()
+        assert [s.builds for s in builder.sections] == [1, 1, 2, 1]
+
+def test_section_stats_report_tokens():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, dsl = _make_tree(Path(tmp))
+        builder = SystemPromptBuilder(sections=default_sections(docs, dsl))
+        stats = {s["section"]: s for s in builder.section_stats()}
+        assert set(stats) == {"base_os_rules", "dsl", "project_definition", "architecture_overview"}
+        assert all(s["tokens"] > 0 for s in stats.values())
+
+def test_query_keeps_always_files_and_ranks_dsl():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, dsl = _make_tree(Path(tmp))
+        (docs / "project_definition.md").write_text(
+            "# project\n前書き\n## 1. 目的\nKai の目的\n", encoding="utf-8")
+        with open(dsl / "integrated_dsl.jsonl", "a", encoding="utf-8") as f:
+            f.write("\n" + json.dumps({"name": "deploy", "description": "マイルストーンごとに配布する"}))
+        ondemand = docs / "ondemand"
+        ondemand.mkdir()
+        (ondemand / "roadmap.md").write_text(
+            "# roadmap\n## マイルストーン\nQ2 に MVP を出す\n## 予算\n未定\n", encoding="utf-8")
+        (ondemand / "glossary.md").write_text("# glossary\n## 用語\nDSL とは\n", encoding="utf-8")
+        builder = SystemPromptBuilder(sections=default_sections(docs, dsl), ondemand_dir=ondemand)
+        full = builder.build()
+        assert "roadmap" not in full   # オンデマンド文書は query が無ければ含めない
+
+        prompt = builder.build("マイルストーンはいつ？")
+        assert prompt.startswith("# rules")
+        assert "Kai の目的" in prompt and "# arch" in prompt   # always_files.json の文書は全文
+        assert "**deploy**" in prompt and "**plan**" not in prompt
+        assert "Q2 に MVP" not in prompt                        # 明示されていないオンデマンド文書は使わない
+        assert [r["section"] for r in builder.last_retrieval] == ["dsl"]
+
+        prompt = builder.build("roadmap.md のマイルストーンは？")
+        assert "Q2 に MVP" in prompt and "未定" in prompt and "glossary" not in prompt
+        assert "**deploy**" not in builder.build("マイルストーン", token_budget=1)
+        assert builder.build() == full
+        assert [s.builds for s in builder.sections] == [1, 1, 1, 1, 1, 1]   # 問い合わせごとに再分割しない
+
+def test_docs_outside_always_files_are_ranked():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, dsl = _make_tree(Path(tmp))
+        (docs / "project_definition.md").write_text(
+            "# project\n前書き\n## 1. 目的\nKai の目的\n## 2. マイルストーン\nQ2 に MVP を出す\n", encoding="utf-8")
+        sections = default_sections(docs, dsl, always_files={"docs/base_os_rules.md", "docs/architecture_overview.md"})
+        builder = SystemPromptBuilder(sections=sections, ondemand_dir=None)
+        prompt = builder.build("マイルストーンはいつ？")
+        assert "# project\n前書き" in prompt and "Q2 に MVP" in prompt   # 前書きは常に含める
+        assert "Kai の目的" not in prompt and "# arch" in prompt
+
+def test_ondemand_limits_apply_per_file(monkeypatch):
+    from core import prompt_builder
+    with tempfile.TemporaryDirectory() as tmp:
+        docs, dsl = _make_tree(Path(tmp))
+        ondemand = docs / "ondemand"
+        ondemand.mkdir()
+        for name in ("a", "b", "c"):
+            (ondemand / f"{name}.md").write_text(
+                f"# {name}\n## 配布\n配布手順 {name}\n## 配布の注意\n配布前に確認 {name}\n", encoding="utf-8")
+        builder = SystemPromptBuilder(sections=default_sections(docs, dsl), ondemand_dir=ondemand)
+        query = "a.md と b.md と c.md の配布手順を見せて"
+
+        monkeypatch.setattr(prompt_builder, "load_parameters",
+                            lambda: {"ondemand": {"max_files_per_turn": 2, "size_limit": 10 ** 6}})
+        builder.build(query)
+        assert len({r["section"] for r in builder.last_retrieval}) == 2
+
+        size = len("# a".encode("utf-8")) + len("## 配布\n配布手順 a".encode("utf-8"))
+        monkeypatch.setattr(prompt_builder, "load_parameters",
+                            lambda: {"ondemand": {"max_files_per_turn": 3, "size_limit": size}})
+        prompt = builder.build(query)
+        assert [r["chunk"] for r in builder.last_retrieval] == [0, 1] * 3   # size_limit を超える分は入れない
+        assert "配布手順 c" in prompt and "配布前に確認" not in prompt
+
+if __name__ == "__main__":
+    test_only_changed_section_is_rebuilt()
+    test_section_stats_report_tokens()
+    test_query_keeps_always_files_and_ranks_dsl()
+    test_docs_outside_always_files_are_ranked()
+    print("✅ All prompt builder tests passed.")
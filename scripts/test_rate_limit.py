@@ -0,0 +1,24 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import time
+
+from core.rate_limit import TokenBucket
+
+def test_burst_then_throttle():
+    bucket = TokenBucket(rate=50, capacity=5)
+    assert all(bucket.try_acquire() for _ in range(5))
+    assert not bucket.try_acquire()
+    start = time.monotonic()
+    bucket.acquire(5)
+    assert time.monotonic() - start >= 0.08
+
+def test_oversized_request_is_capped():
+    bucket = TokenBucket.per_minute(6000, burst=10)
+    assert bucket.acquire(1000) < 0.5
+
+if __name__ == "__main__":
+    test_burst_then_throttle()
+    test_oversized_request_is_capped()
+    print("✅ All rate limit tests passed.")
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from types import SimpleNamespace
+
+import pytest
+import yaml
+
+from utils import render_minutes
+
+@pytest.fixture
+def counters(monkeypatch):
+    counts = {"parse": 0, "render": 0}
+    render_data = render_minutes.render_data
+
+    def safe_load(text):
+        counts["parse"] += 1
+        return yaml.safe_load(text)
+
+    def counting_render(data, day):
+        counts["render"] += 1
+        return render_data(data, day)
+
+    monkeypatch.setattr(render_minutes, "_entries", {})
+    monkeypatch.setattr(render_minutes, "yaml", SimpleNamespace(safe_load=safe_load))
+    monkeypatch.setattr(render_minutes, "render_data", counting_render)
+    return counts
+
+def _write(path, decisions):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(yaml.safe_dump({"themes": ["t"], "decisions": decisions}), encoding="utf-8")
+    return path
+
+def test_cache_hit_does_not_reparse_or_rerender(tmp_path, counters):
+    path = _write(tmp_path / "2025" / "minutes_20250521.yaml", [{"id": "D1", "title": "a"}])
+    md = render_minutes.render_md(path)
+    assert render_minutes.render_md(path) == md
+    render_minutes.load_minutes(path)
+    assert counters == {"parse": 1, "render": 1}
+
+    # 内容が同じなら mtime が変わっても再解析しない
+    os.utime(path, ns=(1, 1))
+    assert render_minutes.render_md(path) == md
+    assert counters == {"parse": 1, "render": 1}
+
+def test_change_invalidates(tmp_path, counters):
+    path = _write(tmp_path / "2025" / "minutes_20250521.yaml", [{"id": "D1", "title": "a"}])
+    render_minutes.render_md(path)
+    _write(path, [{"id": "D1", "title": "a"}, {"id": "D2", "title": "b"}])
+    assert [d["id"] for d in render_minutes.load_minutes(path)["decisions"]] == ["D1", "D2"]
+    render_minutes.render_md(path)
+    assert counters == {"parse": 2, "render": 2}
+    assert len(render_minutes._entries) == 1   # 古い内容は残さない
+
+def test_load_minutes_returns_a_copy(tmp_path, counters):
+    path = _write(tmp_path / "2025" / "minutes_20250521.yaml", [{"id": "D1", "title": "a"}])
+    data = render_minutes.load_minutes(path)
+    data["decisions"][0]["title"] = "edited"
+    data["themes"].append("x")
+    again = render_minutes.load_minutes(path)
+    assert again["decisions"][0]["title"] == "a" and again["themes"] == ["t"]
+    assert counters["parse"] == 1
+
+def test_year_index_is_newest_first(tmp_path, counters):
+    for day in ("20250102", "20250301", "20250215"):
+        _write(tmp_path / "2025" / f"minutes_{day}.yaml", [])
+    _write(tmp_path / "2024" / "minutes_20241231.yaml", [])
+    text = render_minutes.render_year_index(2025, tmp_path)
+    links = [l for l in text.splitlines() if l.startswith("* [")]
+    assert links == ["* [20250301](#20250301)", "* [20250215](#20250215)", "* [20250102](#20250102)"]
+    assert "20241231" not in text
+
+    out = render_minutes.write_year_index(2025, tmp_path)
+    mtime = out.stat().st_mtime_ns
+    assert render_minutes.write_year_index(2025, tmp_path).stat().st_mtime_ns == mtime   # 変化なしなら書かない
+
+def test_year_without_minutes_writes_nothing(tmp_path, counters):
+    assert render_minutes.write_year_index(2030, tmp_path) is None
+    assert not (tmp_path / "2030").exists()
+    (tmp_path / "2031").mkdir()
+    assert render_minutes.write_year_index(2031, tmp_path) is None
+    assert not (tmp_path / "2031" / "index.md").exists()
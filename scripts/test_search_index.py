@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+
+from core.search_index import SearchIndex, tokenize
+
+def _sources(tmp_path):
+    def sources():
+        for p in sorted(tmp_path.glob("conversation_*.jsonl")):
+            yield p, "conversation"
+        for p in sorted(tmp_path.glob("minutes_*.yaml")):
+            yield p, "minutes"
+        for p in sorted(tmp_path.glob("*.md")):
+            yield p, "doc"
+    return sources
+
+def _write_log(path, contents):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, c in enumerate(contents):
+            f.write(json.dumps({"role": "user", "content": c, "ts": f"t{i}"}, ensure_ascii=False) + "\n")
+
+def test_tokenize_mixes_words_and_bigrams():
+    assert tokenize("Kaiの議事録 API") == ["kai", "の議", "議事", "事録", "api"]
+    assert tokenize("ＡＰＩ") == ["api"]          # NFKC 正規化
+    assert tokenize("、。") == []
+    assert tokenize("会話", unigrams=True) == ["会話", "会", "話"]
+
+def test_single_character_query_matches(tmp_path):
+    _write_log(tmp_path / "conversation_20250501.jsonl", ["会話ログの保存", "天気の話", "議会の予定"])
+    ix = SearchIndex(tmp_path / "index.sqlite3", sources=_sources(tmp_path))
+    ix.update()
+    assert sorted(h["locator"] for h in ix.search("会")) == ["0", "2"]
+    assert [h["locator"] for h in ix.search("会話")] == ["0"]   # 2 文字以上は従来どおり bigram
+
+def test_ranked_search_and_incremental_update(tmp_path):
+    _write_log(tmp_path / "conversation_20250501.jsonl",
+               ["議事録の自動生成について", "天気の話", "議事録 議事録 議事録を検索したい"])
+    (tmp_path / "minutes_20250501.yaml").write_text(
+        "themes: [検索]\ndecisions:\n- id: D1\n  title: 全文検索を導入\n  status: AUTO\n", encoding="utf-8")
+    (tmp_path / "guide.md").write_text("# 概要\nKai の説明\n# 検索\n全文検索の使い方\n", encoding="utf-8")
+
+    ix = SearchIndex(tmp_path / "index.sqlite3", sources=_sources(tmp_path))
+    assert ix.update()["indexed"] == 3
+
+    hits = ix.search("議事録")
+    assert [h["locator"] for h in hits] == ["2", "0"]
+    assert ix.search("全文検索", source="minutes")[0]["title"].startswith("20250501 D1")
+    assert ix.search("全文検索", source="doc")[0]["title"] == "guide.md / 検索"
+    assert ix.search("存在しない") == []
+
+    # 変更されたファイルだけ索引し直し、消えたファイルは取り除く
+    _write_log(tmp_path / "conversation_20250501.jsonl", ["天気の話"])
+    (tmp_path / "guide.md").unlink()
+    assert ix.update() == {"indexed": 1, "removed": 1, "unchanged": 1}
+    assert ix.search("議事録") == []
+    assert ix.search("全文検索")[0]["source"] == "minutes"
@@ -1,8 +1,19 @@
 # utils/render_minutes.py
-import yaml, textwrap
+"""
+議事録 YAML → Markdown の描画。
+
+* load_minutes() / render_md() はファイルごとに解析結果と描画結果を保持する。
+  (mtime_ns, size) が前回と同じなら読み込みも省き、変わっていても内容ハッシュが同じなら
+  再解析しないので、Streamlit の rerun では YAML の再解析もテンプレートの再描画も起きない
+* render_data() は解析済みのデータをそのまま描画する
+* write_year_index() は 1 年分の議事録を docs/minutes/<year>/index.md にまとめる
+"""
+import copy, hashlib, os, threading, yaml, textwrap
 from pathlib import Path
 from jinja2 import Template
 
+MINUTES_DIR = Path(__file__).resolve().parents[1] / "docs" / "minutes"
+
 _MD_TEMPLATE = Template(textwrap.dedent("""
 ### {{ day }}
 
@@ -18,6 +29,71 @@ _MD_TEMPLATE = Template(textwrap.dedent("""
 {% endfor %}
 """))
 
+_lock = threading.Lock()
+# 絶対パス → {"stat": (mtime_ns, size), "sha1": ..., "data": 解析結果, "md": Markdown or None}
+# ファイルごとに最新の内容だけを持つので、ファイル数以上には増えない
+_entries: dict[str, dict] = {}
+
+
+def _entry(path: Path) -> dict:
+    """path のキャッシュエントリ。stat → 内容ハッシュの順に比べ、変わっていれば解析し直す"""
+    st = path.stat()
+    key = str(path.resolve())
+    stat_key = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        entry = _entries.get(key)
+    if entry and entry["stat"] == stat_key:
+        return entry
+    raw = path.read_bytes()
+    digest = hashlib.sha1(raw).hexdigest()
+    if entry and entry["sha1"] == digest:
+        entry = {**entry, "stat": stat_key}   # touch されただけ
+    else:
+        entry = {"stat": stat_key, "sha1": digest,
+                 "data": yaml.safe_load(raw.decode("utf-8")) or {}, "md": None}
+    with _lock:
+        _entries[key] = entry
+    return entry
+
+
+def load_minutes(yaml_path: Path) -> dict:
+    """議事録 YAML を読み込む（内容が変わっていなければ前回の解析結果のコピーを返す）"""
+    return copy.deepcopy(_entry(Path(yaml_path))["data"])
+
+
+def render_data(data: dict, day: str) -> str:
+    """解析済みの議事録データを Markdown に描画する"""
+    return _MD_TEMPLATE.render(day=day, data=data)
+
+
 def render_md(yaml_path: Path) -> str:
-    data = yaml.safe_load(yaml_path.read_text())
-    return _MD_TEMPLATE.render(day=yaml_path.stem[-8:], data=data)
+    yaml_path = Path(yaml_path)
+    entry = _entry(yaml_path)
+    if entry["md"] is None:
+        md = render_data(entry["data"], yaml_path.stem[-8:])
+        with _lock:
+            entry["md"] = md
+    return entry["md"]
+
+
+def render_year_index(year: int, minutes_dir: Path = MINUTES_DIR) -> str:
+    """1 年分の議事録を日付の新しい順に 1 つの Markdown にまとめる"""
+    files = sorted((Path(minutes_dir) / str(year)).glob("minutes_*.yaml"), reverse=True)
+    parts = [f"# Minutes {year}\n"]
+    parts += [f"* [{p.stem[-8:]}](#{p.stem[-8:]})" for p in files]
+    parts += [render_md(p) for p in files]
+    return "\n".join(parts) + "\n"
+
+
+def write_year_index(year: int, minutes_dir: Path = MINUTES_DIR) -> Path | None:
+    """render_year_index() の結果を docs/minutes/<year>/index.md に書き出す（議事録が無い年は None）"""
+    out = Path(minutes_dir) / str(year) / "index.md"
+    if not any(out.parent.glob("minutes_*.yaml")):
+        return None
+    text = render_year_index(year, minutes_dir)
+    if out.exists() and out.read_text(encoding="utf-8") == text:
+        return out
+    tmp = out.with_suffix(".md.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, out)
+    return out